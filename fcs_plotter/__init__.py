@@ -2,6 +2,14 @@
 
 __version__ = "0.1.0"
 
-from .main import main
-
 __all__ = ["main"]
+
+
+def __getattr__(name):
+    # Imported on first use so that Qt-free parts of the package (batch mode)
+    # never load PyQt6.
+    if name == "main":
+        from .main import main
+
+        return main
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
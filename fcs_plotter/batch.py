@@ -0,0 +1,306 @@
+"""
+Headless batch mode.
+
+Processes the configured input files (or the files given on the command line)
+in a process pool, without Qt: every file is loaded through the columnar
+cache, a PNG density plot is written for each requested channel pair, and the
+per-file channel statistics of all files are collected into one CSV or
+Parquet table.
+
+    python -m fcs_plotter.batch --output results --pair FSC-A SSC-A
+"""
+
+import argparse
+import multiprocessing
+import os
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import combinations
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .config import config
+from .logger_setup import logger
+from .path_utils import expand_input_patterns
+from .transforms import TRANSFORM_NAMES, make_transform
+
+STATISTICS_FILE = "channel_statistics"
+STATISTICS_FORMATS = ["csv", "parquet"]
+
+
+def channel_statistics(dataset, file_path: str) -> list[dict]:
+    """
+    One row of summary statistics per channel of a dataset, from the moments
+    and sketches computed while the file was cached.
+    """
+    rows = []
+    for channel in dataset.channels:
+        moments = dataset.moments(channel)
+        count = moments.finite
+        sketch = dataset.sketch(channel)
+        q05, median, q95 = sketch.quantile([0.05, 0.5, 0.95])
+        rows.append(
+            {
+                "file": file_path,
+                "channel": channel,
+                "events": dataset.n_events,
+                "finite": count,
+                "positive_fraction": moments.positive / count if count else np.nan,
+                "min": sketch.minimum if count else np.nan,
+                "max": sketch.maximum if count else np.nan,
+                "mean": moments.mean,
+                "std": moments.std,
+                "q05": float(q05),
+                "median": float(median),
+                "q95": float(q95),
+            }
+        )
+    return rows
+
+
+def _file_name(text: str) -> str:
+    """Makes a channel or file name safe to use in a file name."""
+    return re.sub(r"[^A-Za-z0-9._+-]+", "_", text)
+
+
+def render_density_png(prepared, title: str, path: Path, dpi: int = 100):
+    """Writes the density image of a prepared plot as a PNG, without Qt."""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    from matplotlib.ticker import FuncFormatter, MaxNLocator
+
+    from .transforms import LogTransform
+
+    figure = Figure(figsize=(5, 4), dpi=dpi)
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot(111)
+    density = prepared.density
+    if density is not None:
+        n_rows, n_cols = density.shape
+        mesh = ax.pcolormesh(
+            np.linspace(*density.x_log_range, n_cols + 1),
+            np.linspace(*density.y_log_range, n_rows + 1),
+            np.ma.masked_invalid(density.display_image()),
+            cmap="viridis",
+            shading="flat",
+        )
+        figure.colorbar(mesh, ax=ax, label="log10(events + 1)")
+    ax.set_xlim(*prepared.x_range)
+    ax.set_ylim(*prepared.y_range)
+
+    transform = prepared.transform
+    for axis in (ax.xaxis, ax.yaxis):
+        if isinstance(transform, LogTransform):
+            axis.set_major_locator(MaxNLocator(integer=True))
+            axis.set_major_formatter(FuncFormatter(lambda v, _: f"$10^{{{v:g}}}$"))
+        else:
+            axis.set_major_formatter(FuncFormatter(lambda v, _: transform.tick_label(v)))
+    ax.set_xlabel(prepared.x_channel)
+    ax.set_ylabel(prepared.y_channel)
+    ax.set_title(title)
+    figure.tight_layout()
+    figure.savefig(path)
+
+
+def process_file(file_path: str, name: str, output_dir: str, options: dict) -> list[dict]:
+    """
+    Worker entry point: loads one file, writes its density plots and returns
+    its channel statistics (an empty list if the file could not be read).
+    """
+    # Imported here so the parent process does not need readfcs and friends
+    from .data_processing import load_fcs_file
+    from .derived import derived_columns
+    from .event_store import EventStore
+    from .preparation import DENSITY, PlotRequest, prepare_plot
+
+    # Each pair is binned once, so nothing is written to the cache entry
+    # beyond what loading writes: no pyramid per pair, no derived columns
+    derived_columns.persist = False
+    dataset, metadata = load_fcs_file(file_path)
+    if dataset is None:
+        return []
+
+    store = EventStore()
+    store.add(file_path, dataset, metadata)
+    pairs = options["pairs"]
+    if options["all_pairs"]:
+        pairs = list(combinations(dataset.channels, 2))
+
+    plot_dir = Path(output_dir) / "plots" / name
+    plot_dir.mkdir(parents=True, exist_ok=True)
+    transform = make_transform(options["transform"], options["transform_params"])
+    for x_channel, y_channel in pairs:
+        if x_channel not in dataset.channels or y_channel not in dataset.channels:
+            logger.warning(f"{file_path} has no {x_channel}/{y_channel} pair, skipped")
+            continue
+        request = PlotRequest(
+            x_channel=x_channel,
+            y_channel=y_channel,
+            quantile=options["quantile"],
+            range_margin=options["range_margin"],
+            ratio=1.0,
+            mode=DENSITY,
+            density_bins=options["bins"],
+            transform=transform,
+            pyramids=False,
+        )
+        render_density_png(
+            prepare_plot(store, request),
+            name,
+            plot_dir / f"{_file_name(x_channel)}_vs_{_file_name(y_channel)}.png",
+        )
+    return channel_statistics(dataset, file_path)
+
+
+def unique_names(file_paths: list[str]) -> list[str]:
+    """File stems, numbered where several inputs share a stem."""
+    stems = [_file_name(Path(path).stem) for path in file_paths]
+    counts = Counter(stems)
+    seen = Counter()
+    names = []
+    for stem in stems:
+        if counts[stem] > 1:
+            seen[stem] += 1
+            stem = f"{stem}_{seen[stem]}"
+        names.append(stem)
+    return names
+
+
+def write_statistics(rows: list[dict], output_dir: Path, fmt: str) -> Path:
+    frame = pd.DataFrame(rows)
+    path = output_dir / f"{STATISTICS_FILE}.{fmt}"
+    if fmt == "parquet":
+        frame.to_parquet(path, index=False)
+    else:
+        frame.to_csv(path, index=False)
+    return path
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    batch_config = config.get("batch", {})
+    plotting_config = config["plotting"]
+    parser = argparse.ArgumentParser(
+        prog="fcs-plotter-batch",
+        description="Render density plots and channel statistics without a GUI.",
+    )
+    parser.add_argument(
+        "inputs",
+        nargs="*",
+        help="FCS files or glob patterns (default: input_files from config.yaml)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default=batch_config.get("output_dir", "batch_output"),
+        help="output directory",
+    )
+    parser.add_argument(
+        "--pair",
+        nargs=2,
+        action="append",
+        metavar=("X", "Y"),
+        dest="pairs",
+        help="channel pair to plot; may be repeated",
+    )
+    parser.add_argument(
+        "--all-pairs", action="store_true", help="plot every pair of channels of each file"
+    )
+    parser.add_argument(
+        "--format",
+        choices=STATISTICS_FORMATS,
+        default=batch_config.get("format", "csv"),
+        help="statistics table format",
+    )
+    parser.add_argument(
+        "--transform",
+        choices=TRANSFORM_NAMES,
+        default=plotting_config.get("transform", "log"),
+        help="display transform of the density plots",
+    )
+    parser.add_argument(
+        "--bins",
+        type=int,
+        default=plotting_config.get("density_bins", 256),
+        help="density bins per axis",
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=config.get("loading", {}).get("max_workers") or os.cpu_count(),
+        help="worker processes",
+    )
+    args = parser.parse_args(argv)
+    if args.pairs is None:
+        args.pairs = batch_config.get("pairs") or [
+            (plotting_config["default_x_channel"], plotting_config["default_y_channel"])
+        ]
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    file_paths = expand_input_patterns(args.inputs or config.get("input_files"))
+    if not file_paths:
+        logger.error("No input files")
+        return 1
+    if args.format == "parquet":
+        try:
+            pd.io.parquet.get_engine("auto")
+        except ImportError:
+            logger.error("Parquet output needs pyarrow or fastparquet")
+            return 1
+
+    output_dir = Path(args.output)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    plotting_config = config["plotting"]
+    options = {
+        "pairs": [tuple(pair) for pair in args.pairs],
+        "all_pairs": args.all_pairs,
+        "transform": args.transform,
+        "transform_params": plotting_config.get("transform_params", {}).get(args.transform),
+        "quantile": plotting_config["quantile"],
+        "range_margin": plotting_config["range_margin"],
+        "bins": args.bins,
+    }
+
+    start = time.perf_counter()
+    logger.info(f"Processing {len(file_paths)} files with {args.workers} workers")
+    rows, failed = [], []
+    # spawn: workers must not inherit locks or caches of this process
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=context) as executor:
+        futures = {
+            executor.submit(process_file, path, name, str(output_dir), options): path
+            for path, name in zip(file_paths, unique_names(file_paths))
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            path = futures[future]
+            try:
+                file_rows = future.result()
+            except Exception as e:
+                logger.error(f"Failed to process {path}: {e}")
+                file_rows = []
+            if file_rows:
+                rows.extend(file_rows)
+            else:
+                failed.append(path)
+            logger.info(f"[{done}/{len(futures)}] {path}")
+
+    statistics_path = write_statistics(rows, output_dir, args.format)
+    logger.info(
+        f"Processed {len(file_paths) - len(failed)} files in {time.perf_counter() - start:.1f} s; "
+        f"statistics written to {statistics_path}"
+    )
+    if failed:
+        logger.warning(f"{len(failed)} files failed: {', '.join(failed)}")
+    return 0 if not failed else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,368 @@
+"""
+Benchmark suite.
+
+Writes synthetic FCS 3.1 files (see synthetic) of the requested sizes and
+times the load path and every plotting backend on them:
+
+- load: load_fcs_file into an empty cache (parse, write columns, sketches)
+- cache_hit: load_fcs_file of files that are already cached
+- merge: load_and_merge_fcs_files of all channels of the cached files
+- prepare: prepare_plot of the default channel pair, per render mode
+- plot: BasePlotter.plot_data plus a forced repaint, per backend and render
+  mode, alternating between two channel pairs so every draw uploads new data
+
+Every benchmark case runs in a fresh process, so its peak RSS is its own and
+one case cannot warm caches for the next. Qt runs offscreen unless
+QT_QPA_PLATFORM is set. Results are written as JSON so runs can be compared.
+
+    python -m fcs_plotter.benchmark --events 100000 1000000 --files 1 4
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from .config import config
+from .logger_setup import logger
+from .plotting.factory import PLOTTER_NAMES
+from .synthetic import DATATYPES, DEFAULT_BITS, SCATTER_CHANNELS, write_fcs
+
+BENCHMARKS = ["load", "cache_hit", "merge", "prepare", "plot"]
+MODES = ["scatter", "density"]
+RESULTS_VERSION = 1
+
+# Size of the plot widget in the plot benchmarks
+WIDGET_SIZE = (800, 600)
+
+
+def _peak_rss_mb() -> float:
+    """Peak resident set size of this process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _load_all(file_paths: list) -> dict:
+    from .data_processing import load_fcs_file
+
+    datasets = {}
+    for path in file_paths:
+        dataset, metadata = load_fcs_file(path)
+        if dataset is None:
+            raise RuntimeError(f"Could not load {path}")
+        datasets[path] = (dataset, metadata)
+    return datasets
+
+
+def _use_cache(root: Path):
+    # Each case runs in its own process, so the module-level cache can simply
+    # be pointed at a scratch directory.
+    from . import data_processing
+    from .cache import ColumnarCache
+
+    data_processing.cache = ColumnarCache(root)
+
+
+def _request(mode: str, x_channel: str, y_channel: str):
+    from .preparation import PlotRequest
+    from .transforms import make_transform
+
+    plotting = config["plotting"]
+    name = plotting.get("transform", "log")
+    return PlotRequest(
+        x_channel=x_channel,
+        y_channel=y_channel,
+        quantile=plotting["quantile"],
+        range_margin=plotting["range_margin"],
+        ratio=plotting["ratio"],
+        mode=mode,
+        density_bins=plotting.get("density_bins", 256),
+        outlier_threshold=plotting.get("outlier_threshold", 0),
+        transform=make_transform(name, plotting.get("transform_params", {}).get(name)),
+    )
+
+
+def _store(datasets: dict):
+    from .event_store import EventStore
+
+    store = EventStore()
+    for path, (dataset, metadata) in datasets.items():
+        store.add(path, dataset, metadata)
+    return store
+
+
+def _time_load(case, scratch):
+    seconds = []
+    for i in range(case["repeat"]):
+        _use_cache(scratch / f"cache{i}")
+        start = time.perf_counter()
+        _load_all(case["file_paths"])
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def _time_cache_hit(case, scratch):
+    _use_cache(scratch / "cache")
+    _load_all(case["file_paths"])
+    seconds = []
+    for _ in range(case["repeat"]):
+        start = time.perf_counter()
+        _load_all(case["file_paths"])
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def _time_merge(case, scratch):
+    from .data_processing import load_and_merge_fcs_files
+
+    _use_cache(scratch / "cache")
+    datasets = _load_all(case["file_paths"])
+    seconds = []
+    for _ in range(case["repeat"]):
+        start = time.perf_counter()
+        merged = load_and_merge_fcs_files(datasets)
+        seconds.append(time.perf_counter() - start)
+        del merged
+    return seconds
+
+
+def _time_prepare(case, scratch):
+    from .preparation import prepare_plot
+
+    _use_cache(scratch / "cache")
+    store = _store(_load_all(case["file_paths"]))
+    request = _request(case["mode"], *SCATTER_CHANNELS)
+    seconds = []
+    for _ in range(case["repeat"]):
+        start = time.perf_counter()
+        prepare_plot(store, request)
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def _time_plot(case, scratch):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication
+
+    from .plotting.factory import get_plotter
+    from .preparation import prepare_plot
+
+    _use_cache(scratch / "cache")
+    store = _store(_load_all(case["file_paths"]))
+    x_channel, y_channel = SCATTER_CHANNELS
+    prepared = [
+        prepare_plot(store, _request(case["mode"], x_channel, y_channel)),
+        prepare_plot(store, _request(case["mode"], y_channel, x_channel)),
+    ]
+
+    app = QApplication.instance() or QApplication([])
+    plotter = get_plotter(case["backend"])
+    widget = plotter.get_widget()
+    widget.resize(*WIDGET_SIZE)
+    widget.show()
+    app.processEvents()
+
+    spot_size = config["plotting"]["spot_size"]
+    spot_alpha = config["plotting"]["spot_alpha"]
+    seconds = []
+    for i in range(case["repeat"]):
+        start = time.perf_counter()
+        plotter.plot_data(prepared[i % 2], spot_size, spot_alpha)
+        app.processEvents()
+        widget.grab()  # paints synchronously
+        seconds.append(time.perf_counter() - start)
+    plotter.clear()
+    widget.close()
+    return seconds
+
+
+_TIMERS = {
+    "load": _time_load,
+    "cache_hit": _time_cache_hit,
+    "merge": _time_merge,
+    "prepare": _time_prepare,
+    "plot": _time_plot,
+}
+
+
+def run_case(case: dict) -> dict:
+    """
+    Worker entry point: runs one benchmark case in this (fresh) process and
+    returns its timings in seconds and the process's peak RSS.
+    """
+    scratch = Path(tempfile.mkdtemp(prefix="fcs-benchmark-", dir=case.get("scratch_dir")))
+    try:
+        seconds = _TIMERS[case["benchmark"]](case, scratch)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return {
+        "seconds": seconds,
+        "best": min(seconds),
+        "median": float(np.median(seconds)),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _run_isolated(case: dict) -> dict:
+    """Runs a case in a new process; failures are recorded, not raised."""
+    context = multiprocessing.get_context("spawn")
+    try:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            return executor.submit(run_case, case).result()
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+
+
+def generate_files(data_dir: Path, events: int, n_files: int, args) -> list[str]:
+    """Writes (or reuses) the synthetic files of one size."""
+    paths = []
+    for i in range(n_files):
+        path = data_dir / f"synthetic_{events}_{args.channels}ch_{args.datatype}{args.bits}_{i}.fcs"
+        if not path.exists():
+            write_fcs(path, events, args.channels, args.datatype, args.bits, seed=i)
+        paths.append(str(path))
+    return paths
+
+
+def cases(args, file_paths: list) -> list[dict]:
+    """The benchmark cases for one set of files, in run order."""
+    common = {"file_paths": file_paths, "repeat": args.repeat, "scratch_dir": args.scratch_dir}
+    result = []
+    for benchmark in args.benchmarks:
+        if benchmark in ("load", "cache_hit", "merge"):
+            result.append({"benchmark": benchmark, **common})
+        elif benchmark == "prepare":
+            result.extend({"benchmark": benchmark, "mode": mode, **common} for mode in args.modes)
+        else:
+            result.extend(
+                {"benchmark": benchmark, "backend": backend, "mode": mode, **common}
+                for backend in args.backends
+                for mode in args.modes
+            )
+    return result
+
+
+def _describe(case: dict) -> str:
+    return ":".join(case[key] for key in ("benchmark", "backend", "mode") if key in case)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="fcs-plotter-benchmark",
+        description="Time loading, merging and plotting of synthetic FCS files.",
+    )
+    parser.add_argument(
+        "--events", type=int, nargs="+", default=[100_000, 1_000_000], help="events per file"
+    )
+    parser.add_argument(
+        "--files", type=int, nargs="+", default=[1, 4], help="numbers of files to load together"
+    )
+    parser.add_argument("--channels", type=int, default=8, help="channels per file")
+    parser.add_argument(
+        "--datatype", choices=list(DATATYPES), default="F", help="$DATATYPE of the files"
+    )
+    parser.add_argument(
+        "--bits", type=int, default=None, help="bits per value (default: 32, 64 for D, 16 for I)"
+    )
+    parser.add_argument(
+        "--benchmarks", nargs="+", choices=BENCHMARKS, default=BENCHMARKS, help="what to time"
+    )
+    parser.add_argument(
+        "--backends", nargs="+", choices=PLOTTER_NAMES, default=PLOTTER_NAMES, help="plotters"
+    )
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES, help="render modes")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case")
+    parser.add_argument(
+        "-o", "--output", default="benchmark_results", help="directory for the JSON results"
+    )
+    parser.add_argument(
+        "--data-dir",
+        default=None,
+        help="where to keep the synthetic files (default: a temporary directory)",
+    )
+    parser.add_argument(
+        "--scratch-dir", default=None, help="where cases put their caches (default: system temp)"
+    )
+    args = parser.parse_args(argv)
+    if args.bits is None:
+        args.bits = DEFAULT_BITS[args.datatype]
+    if args.bits not in DATATYPES[args.datatype]:
+        parser.error(f"--datatype {args.datatype} supports {sorted(DATATYPES[args.datatype])} bits")
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    data_dir = Path(args.data_dir or tempfile.mkdtemp(prefix="fcs-benchmark-data-"))
+    data_dir.mkdir(parents=True, exist_ok=True)
+    output_dir = Path(args.output)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    started = datetime.now(timezone.utc)
+    results = []
+    try:
+        for events in args.events:
+            all_paths = generate_files(data_dir, events, max(args.files), args)
+            for n_files in args.files:
+                for case in cases(args, all_paths[:n_files]):
+                    result = _run_isolated(case)
+                    results.append(
+                        {
+                            "benchmark": case["benchmark"],
+                            "backend": case.get("backend"),
+                            "mode": case.get("mode"),
+                            "events": events,
+                            "files": n_files,
+                            **result,
+                        }
+                    )
+                    if "error" in result:
+                        first_line = result["error"].splitlines()[0]
+                        logger.warning(f"{_describe(case)} {events} x {n_files}: {first_line}")
+                    else:
+                        logger.info(
+                            f"{_describe(case)} {events} x {n_files}: "
+                            f"best {result['best'] * 1000:.1f} ms, "
+                            f"median {result['median'] * 1000:.1f} ms, "
+                            f"peak RSS {result['peak_rss_mb']:.0f} MB"
+                        )
+    finally:
+        if args.data_dir is None:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    report = {
+        "version": RESULTS_VERSION,
+        "started": started.isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "parameters": {
+            "channels": args.channels,
+            "datatype": args.datatype,
+            "bits": args.bits,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    path = output_dir / f"benchmark-{started:%Y%m%dT%H%M%SZ}.json"
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Benchmark results written to {path}")
+    return 0 if all("error" not in result for result in results) else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,319 @@
+"""
+Columnar on-disk cache for parsed FCS files.
+
+Each file gets its own directory under the cache root holding one raw ``.npy``
+file per channel, the per-channel quantile sketches and moments, the start of
+a fixed random permutation of the events for subsampling and a ``meta.json``
+sidecar. Entries are written from a stream of event blocks in a single pass,
+so files larger than memory can be cached. Channels are memory-mapped on
+first access, so a cache hit only touches the columns that are actually used.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .config import config
+from .path_utils import get_cache_dir
+from .pyramid import PyramidBuilder, build_pyramid
+from .sketch import QuantileSketch
+from .streaming import ChannelMoments, SubsampleReservoir
+
+CACHE_VERSION = 5
+META_FILE = "meta.json"
+SKETCH_FILE = "sketches.npy"
+SUBSAMPLE_FILE = "subsample.npy"
+
+# Bytes hashed from the start and the end of each file for the content hash
+HASH_SAMPLE_BYTES = 1024 * 1024
+
+# Events copied per block when writing in-memory columns
+WRITE_CHUNK_EVENTS = 1 << 20
+
+# Length of the stored subsample permutation; larger ratios are capped to it
+SUBSAMPLE_MAX_EVENTS = int(config.get("cache", {}).get("subsample_max_events", 1 << 22))
+
+
+def cache_key(file_path: str, compensate: bool = False) -> str:
+    """
+    Returns the cache key for a file, built from its absolute path, size,
+    mtime and a hash of its content. Only the first and last megabyte are
+    hashed: they cover HEADER, TEXT and both ends of DATA, which is enough to
+    notice a rewritten file without reading gigabytes on every start.
+    Entries with compensated channels get their own key.
+    """
+    path = os.path.abspath(file_path)
+    stat = os.stat(path)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{CACHE_VERSION}|{path}|{stat.st_size}|{stat.st_mtime_ns}".encode())
+    if compensate:
+        digest.update(b"|compensated")
+    with open(path, "rb") as f:
+        digest.update(f.read(HASH_SAMPLE_BYTES))
+        if stat.st_size > 2 * HASH_SAMPLE_BYTES:
+            f.seek(-HASH_SAMPLE_BYTES, os.SEEK_END)
+            digest.update(f.read(HASH_SAMPLE_BYTES))
+    return digest.hexdigest()
+
+
+def _json_default(value):
+    # readfcs metadata may contain DataFrames (parsed spill matrix) and numpy
+    # scalars; the sidecar only needs a readable representation of those.
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def iter_column_blocks(columns: dict, chunk_events: int = WRITE_CHUNK_EVENTS):
+    """Yields (start, {channel: block}) over equally long in-memory columns."""
+    n_events = len(next(iter(columns.values()))) if columns else 0
+    for start in range(0, n_events, chunk_events):
+        stop = start + chunk_events
+        yield start, {channel: column[start:stop] for channel, column in columns.items()}
+
+
+def pyramid_name(channels: list, x_channel: str, y_channel: str) -> str:
+    """The directory name of a channel pair's pyramid within a cache entry."""
+    return f"{channels.index(x_channel):03d}_{channels.index(y_channel):03d}"
+
+
+def derived_name(channels: list, channel: str, transform) -> str:
+    """The directory name of a channel's derived column within a cache entry."""
+    digest = hashlib.blake2b(repr(transform).encode(), digest_size=4).hexdigest()
+    return f"{channels.index(channel):03d}_{transform.name}_{digest}"
+
+
+class CachedDataset:
+    """A cached FCS file whose channels are memory-mapped on demand."""
+
+    supports_pyramids = True
+
+    def __init__(self, directory: Path, meta: dict):
+        self.directory = Path(directory)
+        self.file_path = meta["file_path"]
+        self.channels = list(meta["channels"])
+        self.n_events = int(meta["n_events"])
+        self.metadata = meta.get("metadata", {})
+        self._files = meta["files"]
+        self._sketch_ranges = meta["sketches"]  # {channel: [min, max]}
+        self._moments = meta["moments"]  # {channel: ChannelMoments.to_list()}
+        self._columns = {}
+        self._sketch_counts = None
+        self._permutation = None
+
+    def __len__(self):
+        return self.n_events
+
+    def column(self, channel: str) -> np.ndarray:
+        """Returns a read-only memmap of a single channel."""
+        if channel not in self._columns:
+            if channel not in self._files:
+                raise KeyError(channel)
+            self._columns[channel] = np.load(
+                self.directory / self._files[channel], mmap_mode="r"
+            )
+        return self._columns[channel]
+
+    def sketch(self, channel: str) -> QuantileSketch:
+        """Returns the quantile sketch computed for a channel at load time."""
+        if self._sketch_counts is None:
+            self._sketch_counts = np.load(self.directory / SKETCH_FILE, mmap_mode="r")
+        minimum, maximum = self._sketch_ranges[channel]
+        return QuantileSketch(
+            self._sketch_counts[self.channels.index(channel)], minimum, maximum
+        )
+
+    def moments(self, channel: str) -> ChannelMoments:
+        """Returns the count, sum and sum of squares computed at load time."""
+        return ChannelMoments(*self._moments[channel])
+
+    def subsample(self, ratio: float) -> np.ndarray:
+        """
+        Returns the indices of a random `ratio` of the events, at most
+        SUBSAMPLE_MAX_EVENTS of them (as configured when the entry was written).
+        This is a prefix of a permutation fixed at load time, so the same ratio
+        always selects the same events and a larger ratio only adds events.
+        """
+        permutation = self._subsample_permutation()
+        n_sample = min(int(round(self.n_events * ratio)), len(permutation))
+        return permutation[:n_sample]
+
+    @property
+    def max_ratio(self) -> float:
+        """
+        The largest ratio subsample() can honour: 1.0 unless the file has more
+        events than the stored permutation (SUBSAMPLE_MAX_EVENTS).
+        """
+        if not self.n_events:
+            return 1.0
+        return len(self._subsample_permutation()) / self.n_events
+
+    def _subsample_permutation(self) -> np.ndarray:
+        if self._permutation is None:
+            self._permutation = np.load(self.directory / SUBSAMPLE_FILE, mmap_mode="r")
+        return self._permutation
+
+    def pyramid(self, x_channel: str, y_channel: str) -> Path:
+        """
+        Returns the directory of the histogram pyramid of a channel pair,
+        building it from the cached columns the first time the pair is used.
+        """
+        directory = self.directory / "pyramids" / pyramid_name(self.channels, x_channel, y_channel)
+        if not directory.exists():
+            build_pyramid(directory, self.column(x_channel), self.column(y_channel))
+        return directory
+
+    def derived_directory(self, channel: str, transform) -> Path:
+        """The directory that holds a channel's derived column (see derived)."""
+        return self.directory / "derived" / derived_name(self.channels, channel, transform)
+
+    def to_df(self, channels=None) -> pd.DataFrame:
+        """
+        Returns a DataFrame of the requested channels (all by default).
+        Channels this file does not have are skipped.
+        """
+        if channels is None:
+            channels = self.channels
+        return pd.DataFrame(
+            {ch: self.column(ch) for ch in channels if ch in self._files},
+            copy=False,
+        )
+
+
+class ColumnarCache:
+    """Stores and opens per-file columnar caches below a root directory."""
+
+    def __init__(self, root=None):
+        self.root = Path(root) if root is not None else get_cache_dir()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def directory_for(self, key: str) -> Path:
+        return self.root / key
+
+    def open(self, key: str):
+        """Returns the cached dataset for a key, or None on a cache miss."""
+        meta_path = self.directory_for(key) / META_FILE
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("version") != CACHE_VERSION:
+            return None
+        return CachedDataset(self.directory_for(key), meta)
+
+    def write(
+        self,
+        key: str,
+        file_path: str,
+        blocks,
+        dtypes: dict,
+        n_events: int,
+        metadata: dict,
+        compensation=None,
+        pyramid_pairs=(),
+    ):
+        """
+        Writes one ``.npy`` file per channel, the quantile sketches, moments,
+        subsample permutation and the metadata sidecar in a single pass over
+        ``blocks``: (start, {channel: block}) pairs as yielded by
+        iter_column_blocks, or built from FCSFile.iter_chunks. ``dtypes`` maps
+        every channel to its dtype. Only one block is held at a time.
+        With a `compensation`, its compensated float32 channels are computed
+        block by block and stored after the raw ones. The pyramids of the
+        channel pairs in `pyramid_pairs` are binned in the same pass.
+        The entry is built in a temporary directory and renamed into place so
+        concurrent writers never expose a half-written cache.
+        """
+        dtypes = {channel: np.dtype(dtype).newbyteorder("=") for channel, dtype in dtypes.items()}
+        if compensation is not None:
+            existing = [name for name in compensation.names if name in dtypes]
+            if existing:
+                raise ValueError(f"compensated channels {existing} would replace raw channels")
+            dtypes.update({name: np.dtype(np.float32) for name in compensation.names})
+        channels = list(dtypes)
+        pyramid_pairs = [
+            (x, y) for x, y in dict.fromkeys(pyramid_pairs) if x in dtypes and y in dtypes
+        ]
+        tmp_dir = Path(tempfile.mkdtemp(prefix=f".{key}-", dir=self.root))
+        try:
+            files = {channel: f"ch{i:03d}.npy" for i, channel in enumerate(channels)}
+            targets = {
+                channel: np.lib.format.open_memmap(
+                    tmp_dir / files[channel],
+                    mode="w+",
+                    dtype=dtypes[channel],
+                    shape=(n_events,),
+                )
+                for channel in channels
+            }
+            sketches = {channel: QuantileSketch() for channel in channels}
+            moments = {channel: ChannelMoments() for channel in channels}
+            pyramids = {pair: PyramidBuilder() for pair in pyramid_pairs}
+            # Seeded from the key so rebuilding an entry gives the same sample
+            index_dtype = np.uint32 if n_events < 2**32 else np.int64
+            reservoir = SubsampleReservoir(
+                min(n_events, SUBSAMPLE_MAX_EVENTS), int(key[:16], 16), index_dtype
+            )
+            for start, block in blocks:
+                if compensation is not None:
+                    block = dict(block)
+                    compensated = compensation.apply(block)
+                    for i, name in enumerate(compensation.names):
+                        block[name] = compensated[:, i]
+                n_block = 0
+                for channel, values in block.items():
+                    n_block = len(values)
+                    targets[channel][start : start + n_block] = values
+                    sketches[channel].update(values)
+                    moments[channel].update(values)
+                for (x_channel, y_channel), builder in pyramids.items():
+                    builder.update(block[x_channel], block[y_channel])
+                reservoir.update(start, n_block)
+            for target in targets.values():
+                target.flush()
+            del targets
+            np.save(tmp_dir / SUBSAMPLE_FILE, reservoir.permutation())
+            np.save(
+                tmp_dir / SKETCH_FILE,
+                np.stack([sketches[channel].counts for channel in channels])
+                if channels
+                else np.empty((0, 0), dtype=np.int64),
+            )
+            for (x_channel, y_channel), builder in pyramids.items():
+                directory = tmp_dir / "pyramids" / pyramid_name(channels, x_channel, y_channel)
+                directory.mkdir(parents=True)
+                builder.write_levels(directory)
+
+            meta = {
+                "version": CACHE_VERSION,
+                "file_path": str(file_path),
+                "n_events": n_events,
+                "channels": channels,
+                "files": files,
+                "sketches": {
+                    channel: [sketch.minimum, sketch.maximum]
+                    for channel, sketch in sketches.items()
+                },
+                "moments": {channel: moment.to_list() for channel, moment in moments.items()},
+                "metadata": metadata or {},
+            }
+            with open(tmp_dir / META_FILE, "w") as f:
+                json.dump(meta, f, default=_json_default)
+
+            target_dir = self.directory_for(key)
+            try:
+                os.rename(tmp_dir, target_dir)
+            except OSError:
+                # Another process finished the same entry first
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        return self.open(key)
@@ -0,0 +1,124 @@
+"""
+Spillover compensation.
+
+The spillover matrix is read from the $SPILLOVER (or SPILL / $COMP) keyword of
+the TEXT segment. The FCS 3.0 $COMP keyword names no parameters; its matrix
+applies to the fluorescence parameters (all but scatter and time), in $PnN
+order. Compensated values are the raw fluorescence values times the inverse of
+that matrix, applied block by block while a file is written to the columnar
+cache. The results are stored as extra channels named ``Comp-<name>`` next to
+the raw ones, so they are computed once per file. Files that already have such
+channels (exported compensated) are not compensated again.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .fcs_reader import channel_labels
+
+COMPENSATED_PREFIX = "Comp-"
+
+# Normalized TEXT keywords that may hold the spillover matrix, by preference
+SPILLOVER_KEYS = ("spillover", "spill", "comp")
+
+# $PnN prefixes of the parameters a nameless $COMP matrix does not cover
+NON_FLUORESCENCE_PREFIXES = ("fsc", "ssc", "time")
+
+
+def fluorescence_parameters(text: dict) -> list[str]:
+    """The $PnN names of the parameters that are neither scatter nor time."""
+    names = [text[f"p{n}n"].strip() for n in range(1, int(text["par"]) + 1)]
+    return [name for name in names if not name.lower().startswith(NON_FLUORESCENCE_PREFIXES)]
+
+
+def parse_spillover(value, parameters=None) -> tuple[list[str], np.ndarray]:
+    """
+    Parses a spillover keyword ("n,name_1,...,name_n,s_11,s_12,...,s_nn", row
+    major) into the parameter names and the n x n matrix. A DataFrame, as
+    parsed by readfcs, is accepted as well. With `parameters`, the nameless
+    form "n,s_11,...,s_nn" is accepted too and applies to those parameters.
+    """
+    if isinstance(value, pd.DataFrame):
+        return [str(name) for name in value.columns], value.to_numpy(dtype=np.float64)
+
+    fields = [field.strip() for field in str(value).split(",")]
+    n = int(fields[0])
+    if len(fields) == 1 + n + n * n:
+        names = fields[1 : n + 1]
+    elif parameters is not None and len(fields) == 1 + n * n:
+        if len(parameters) != n:
+            raise ValueError(
+                f"nameless matrix is {n} x {n}, but there are "
+                f"{len(parameters)} fluorescence parameters"
+            )
+        names = list(parameters)
+    else:
+        raise ValueError(f"spillover has {len(fields)} fields, expected {1 + n + n * n}")
+    matrix = np.array(fields[len(fields) - n * n :], dtype=np.float64).reshape(n, n)
+    return names, matrix
+
+
+@dataclass
+class Compensation:
+    """The inverse spillover matrix and the raw columns it applies to."""
+
+    channels: list  # raw column names, in spillover matrix order
+    inverse: np.ndarray  # float32 (n, n) inverse of the spillover matrix
+
+    @property
+    def names(self) -> list:
+        """The names of the compensated columns."""
+        return [COMPENSATED_PREFIX + channel for channel in self.channels]
+
+    @classmethod
+    def from_metadata(cls, metadata: dict):
+        """
+        Returns the compensation described by a file's TEXT keywords, or None
+        if the file has no spillover matrix. Raises ValueError if the matrix
+        is malformed, singular or names unknown parameters, or if the file
+        already has the compensated channels.
+        """
+        text = (metadata or {}).get("meta", {})
+        key = next((key for key in SPILLOVER_KEYS if key in text), None)
+        value = text.get(key)
+        if value is None or (isinstance(value, str) and not value.strip()):
+            return None
+
+        parameters = fluorescence_parameters(text) if key == "comp" else None
+        names, matrix = parse_spillover(value, parameters)
+        # The matrix names parameters by $PnN; columns may be named by $PnS
+        labels = channel_labels(text)
+        by_name = {text[f"p{n}n"].strip(): label for n, label in enumerate(labels, start=1)}
+        channels = []
+        for name in names:
+            if name in by_name:
+                channels.append(by_name[name])
+            elif name in labels:
+                channels.append(name)
+            else:
+                raise ValueError(f"spillover names unknown parameter {name!r}")
+        existing = [
+            COMPENSATED_PREFIX + channel
+            for channel in channels
+            if COMPENSATED_PREFIX + channel in labels
+        ]
+        if existing:
+            raise ValueError(f"the file already has compensated channels {existing}")
+        try:
+            inverse = np.linalg.inv(matrix)
+        except np.linalg.LinAlgError as e:
+            raise ValueError(f"spillover matrix is singular: {e}") from e
+        return cls(channels, inverse.astype(np.float32))
+
+    def apply(self, columns: dict) -> np.ndarray:
+        """
+        Compensates a block of events: ``columns`` maps raw channel names to
+        equally long arrays. Returns a float32 (events, n) array whose columns
+        match `names`.
+        """
+        raw = np.column_stack(
+            [np.asarray(columns[channel], dtype=np.float32) for channel in self.channels]
+        )
+        return raw @ self.inverse
@@ -1,50 +1,138 @@
+import time
+
 import pandas as pd
-import readfcs
-from joblib import Memory
-from .path_utils import get_cache_dir
+from .cache import CachedDataset, ColumnarCache, cache_key, iter_column_blocks
+from .compensation import Compensation
+from .config import config
+from .event_store import EventStore
+from .fcs_reader import FCSFile, UnsupportedLayoutError
+from .instrumentation import tracer
 from .logger_setup import logger
+from .preview import PreviewDataset
 
 # Setup caching
-cache_dir = get_cache_dir()
-memory = Memory(cache_dir, verbose=0)
+cache = ColumnarCache()
 
 
-@memory.cache
-def load_fcs_file(file_path: str) -> tuple[pd.DataFrame, dict]:
+def load_fcs_file(file_path: str) -> tuple[CachedDataset, dict]:
     """
     Reads an FCS file and returns the data and metadata.
-    Results are cached to disk.
+    The DATA segment is streamed in blocks by the native reader, so memory use
+    does not depend on the file size; readfcs is only used (and holds the
+    whole file) for layouts the native reader does not support.
+    Results are cached to disk as one file per channel, and channels are only
+    memory-mapped when they are accessed. The default channel pair's density
+    pyramid is binned while the file is read. If compensation is enabled, files
+    with a spillover matrix also get compensated ``Comp-`` channels.
     """
+    compensate = config.get("compensation", {}).get("enabled", False)
     try:
+        with tracer.span("cache lookup"):
+            key = cache_key(file_path, compensate)
+            dataset = cache.open(key)
+        if dataset is not None:
+            logger.info(f"Loaded {file_path} from cache")
+            return dataset, dataset.metadata
+
         logger.info(f"Reading FCS file: {file_path}")
-        adata = readfcs.read(str(file_path))
-        df = adata.to_df()
-        # Extract metadata if available
-        metadata = getattr(adata, "uns", {}) if hasattr(adata, "uns") else {}
+        parse_start = time.perf_counter_ns()
+        try:
+            fcs = FCSFile(file_path)
+            blocks = (
+                (start, {name: chunk[name] for name in fcs.channels})
+                for start, chunk in fcs.iter_chunks()
+            )
+            dtypes = {name: fcs.dtype.fields[name][0] for name in fcs.channels}
+            n_events = fcs.n_events
+            metadata = fcs.metadata
+        except UnsupportedLayoutError as e:
+            logger.info(f"Falling back to readfcs for {file_path}: {e}")
+            df, metadata = _read_with_readfcs(file_path)
+            columns = {str(col): df[col].to_numpy() for col in df.columns}
+            blocks = iter_column_blocks(columns)
+            dtypes = {name: column.dtype for name, column in columns.items()}
+            n_events = len(df)
+        compensation = _compensation_for(file_path, metadata) if compensate else None
+        plotting = config["plotting"]
+        dataset = cache.write(
+            key,
+            file_path,
+            blocks,
+            dtypes,
+            n_events,
+            metadata,
+            compensation,
+            pyramid_pairs=[(plotting["default_x_channel"], plotting["default_y_channel"])],
+        )
+        tracer.record("parse", parse_start, time.perf_counter_ns(), n_events)
         logger.info(f"Successfully read {file_path}")
-        return df, metadata
+        return dataset, dataset.metadata
     except Exception as e:
         logger.error(f"Failed to read FCS file {file_path}: {e}")
         return None, None
 
 
-def load_and_merge_fcs_files(datasets: dict) -> pd.DataFrame:
+def load_preview(file_path: str, n_events: int) -> tuple[PreviewDataset, dict]:
     """
-    Merges multiple FCS file dataframes into a single dataframe.
-    Adds a 'file_path' column to identify the source file.
+    Reads the header and the first `n_events` events of a file, without
+    touching the cache. Returns (None, None) if the native reader cannot read
+    the file; such files are only shown once they are fully loaded.
     """
-    if not datasets:
-        return pd.DataFrame()
+    try:
+        fcs = FCSFile(file_path)
+        if not fcs.n_events:
+            return None, None
+        _, chunk = next(fcs.iter_chunks(min(n_events, fcs.n_events)))
+    except (OSError, ValueError) as e:
+        logger.info(f"No preview of {file_path}: {e}")
+        return None, None
+
+    metadata = fcs.metadata
+    columns = {
+        name: chunk[name].astype(chunk.dtype[name].newbyteorder("=")) for name in fcs.channels
+    }
+    if config.get("compensation", {}).get("enabled", False):
+        compensation = _compensation_for(file_path, metadata)
+        if compensation is not None:
+            compensated = compensation.apply(columns)
+            for i, name in enumerate(compensation.names):
+                columns[name] = compensated[:, i]
+    return PreviewDataset(file_path, columns, fcs.n_events, metadata), metadata
+
 
-    dfs_to_merge = []
-    for file_path, (data, _) in datasets.items():
-        df = data.copy()
-        df["file_path"] = file_path
-        dfs_to_merge.append(df)
+def _compensation_for(file_path: str, metadata: dict):
+    """The file's compensation, or None if it has none or it cannot be used."""
+    try:
+        return Compensation.from_metadata(metadata)
+    except (KeyError, ValueError) as e:
+        logger.warning(f"Not compensating {file_path}: {e}")
+        return None
+
+
+def _read_with_readfcs(file_path: str) -> tuple[pd.DataFrame, dict]:
+    # readfcs pulls in anndata; only files the native reader rejects need it
+    import readfcs
+
+    adata = readfcs.read(str(file_path))
+    df = adata.to_df()
+    # Extract metadata if available
+    metadata = getattr(adata, "uns", {}) if hasattr(adata, "uns") else {}
+    return df, metadata
 
-    if not dfs_to_merge:
+
+def load_and_merge_fcs_files(datasets: dict, channels=None) -> pd.DataFrame:
+    """
+    Merges multiple FCS file datasets into a single dataframe.
+    Only the requested channels are gathered (all channels by default), and a
+    categorical 'file_path' column identifies the source file.
+    Prefer keeping an EventStore around and calling gather() directly.
+    """
+    store = EventStore()
+    for file_path, (data, metadata) in datasets.items():
+        store.add(file_path, data, metadata)
+    if not store:
         return pd.DataFrame()
 
-    merged_df = pd.concat(dfs_to_merge, ignore_index=True)
+    merged_df = store.gather(store.channels if channels is None else channels)
     logger.info(f"Merged {len(datasets)} files into a single dataframe.")
     return merged_df
@@ -0,0 +1,272 @@
+"""
+Local dataset service shared by the windows of one experiment.
+
+Cached datasets are memory-mapped (see cache), so windows in different
+processes that open the same cache entry share its pages instead of holding
+copies. What they still duplicated was the loading itself, and a file opened
+in one window stayed unknown to the others. The first window started on a
+cache directory therefore becomes the server: it listens on a local socket
+named after the cache root and loads every file requested by any window with
+its ParallelLoader. Windows started later attach as clients; they send their
+load requests to the server and are notified of every file that finishes
+loading anywhere, which they open from the cache by its key, without parsing.
+The server loads the files its clients ask for into the cache only; its own
+window shows the files it asked for itself. Each window keeps its own
+channels, transforms and gates, and derived columns are shared through the
+cache as well (see derived).
+
+Messages are JSON objects, one per line:
+
+    {"op": "load", "paths": [...]}                      client -> server
+    {"op": "loaded", "file_path": ..., "key": ...}      server -> clients
+    {"op": "failed", "file_path": ...}                  server -> requesting client
+
+When the server window closes, its clients take over: the first one to
+notice listens in its place and the others attach to it, asking again for
+the files the old server had not delivered. The new server also takes over
+watching the input folders (see watcher). A client that can do neither loads
+on its own.
+"""
+
+import hashlib
+import json
+
+from PyQt6.QtCore import QObject, pyqtSignal
+from PyQt6.QtNetwork import QAbstractSocket, QLocalServer, QLocalSocket
+
+from . import data_processing
+from .config import config
+from .logger_setup import logger
+
+CONNECT_TIMEOUT_MS = 500
+
+
+def server_name(cache_root) -> str:
+    """The local socket name of the service for a cache directory."""
+    digest = hashlib.blake2b(str(cache_root).encode(), digest_size=6).hexdigest()
+    return f"fcs-plotter-{digest}"
+
+
+class DatasetService(QObject):
+    """
+    Routes load requests through the shared server, or the given loader when
+    this window is the server or runs on its own.
+
+    ``file_available(file_path, dataset, metadata)`` is emitted for the files
+    this window asked for and, on clients, for every file loaded by the
+    server, whichever window asked for it. ``file_previewed`` forwards the
+    loader's previews of this window's files, and ``file_failed(file_path)``
+    is emitted for files this window asked for that could not be read.
+    ``role_changed(role)`` follows a takeover after the server closed.
+    """
+
+    file_available = pyqtSignal(str, object, object)
+    file_previewed = pyqtSignal(str, object, object)
+    file_failed = pyqtSignal(str)
+    role_changed = pyqtSignal(str)
+
+    def __init__(self, loader, parent=None):
+        super().__init__(parent)
+        self.loader = loader
+        self.name = server_name(data_processing.cache.root)
+        self._server = None
+        self._clients = {}  # {socket: received bytes not yet parsed}
+        self._available = {}  # {file_path: cache key} of the files loaded so far
+        self._requested = {}  # server: {file_path: sockets that asked for it}
+        self._local = set()  # files this window asked its own loader for
+        self._remote = set()  # client: files asked of the server, not answered yet
+        self._socket = None
+        self._buffer = b""
+        loader.file_loaded.connect(self._on_loaded)
+        loader.file_previewed.connect(self._on_previewed)
+        loader.file_failed.connect(self._on_failed)
+        loader.finished.connect(self._on_loader_finished)
+
+    @property
+    def role(self) -> str:
+        if self._server is not None:
+            return "server"
+        return "client" if self._socket is not None else "standalone"
+
+    def start(self):
+        """Attaches to a running server, or becomes the server."""
+        if not config.get("sharing", {}).get("enabled", True):
+            return
+        if self._connect() or self._listen():
+            logger.info(f"Dataset service: {self.role} on {self.name}")
+
+    def _connect(self) -> bool:
+        socket = QLocalSocket(self)
+        socket.connectToServer(self.name)
+        if not socket.waitForConnected(CONNECT_TIMEOUT_MS):
+            socket.deleteLater()
+            return False
+        socket.readyRead.connect(self._on_server_data)
+        socket.disconnected.connect(self._on_server_lost)
+        self._socket = socket
+        return True
+
+    def _listen(self) -> bool:
+        server = QLocalServer(self)
+        if not server.listen(self.name):
+            if server.serverError() != QAbstractSocket.SocketError.AddressInUseError:
+                logger.warning(f"Dataset service unavailable: {server.errorString()}")
+                return False
+            # Someone else may have won the race; otherwise the name is stale
+            if self._connect():
+                return True
+            QLocalServer.removeServer(self.name)
+            if not server.listen(self.name):
+                logger.warning(f"Dataset service unavailable: {server.errorString()}")
+                return False
+        server.newConnection.connect(self._on_new_connection)
+        self._server = server
+        return True
+
+    def stop(self):
+        if self._socket is not None:
+            self._socket.disconnected.disconnect(self._on_server_lost)
+            self._socket.disconnectFromServer()
+            self._socket = None
+        if self._server is not None:
+            for socket in list(self._clients):
+                socket.disconnectFromServer()
+            self._server.close()
+            self._server = None
+
+    def load(self, file_paths):
+        """Loads files here, or has the server load them for every window."""
+        if self._socket is not None:
+            self._remote.update(file_paths)
+            self._send(self._socket, {"op": "load", "paths": list(file_paths)})
+        else:
+            self._load_here(file_paths)
+
+    def _load_here(self, file_paths):
+        self._local.update(file_paths)
+        self.loader.load(file_paths)
+
+    # Loader results
+
+    def _on_loaded(self, file_path, dataset, metadata):
+        key = dataset.directory.name
+        self._available[file_path] = key
+        if self._server is not None:
+            self._requested.pop(file_path, None)
+            for socket in self._clients:
+                self._send(socket, {"op": "loaded", "file_path": file_path, "key": key})
+        if file_path in self._local:
+            self._local.discard(file_path)
+            self.file_available.emit(file_path, dataset, metadata)
+
+    def _on_previewed(self, file_path, preview, metadata):
+        if file_path in self._local:
+            self.file_previewed.emit(file_path, preview, metadata)
+
+    def _on_failed(self, file_path):
+        for socket in self._requested.pop(file_path, ()):
+            if socket in self._clients:
+                self._send(socket, {"op": "failed", "file_path": file_path})
+        if file_path in self._local:
+            self._local.discard(file_path)
+            self.file_failed.emit(file_path)
+
+    def _on_loader_finished(self):
+        # Files of a cancelled load are not delivered any more
+        self._local = {path for path in self._local if self.loader.is_pending(path)}
+
+    # Server side
+
+    def _on_new_connection(self):
+        while self._server.hasPendingConnections():
+            socket = self._server.nextPendingConnection()
+            self._clients[socket] = b""
+            socket.readyRead.connect(lambda socket=socket: self._on_client_data(socket))
+            socket.disconnected.connect(lambda socket=socket: self._on_client_lost(socket))
+            # A new window starts with the files of the experiment so far
+            for file_path, key in self._available.items():
+                self._send(socket, {"op": "loaded", "file_path": file_path, "key": key})
+
+    def _on_client_data(self, socket):
+        self._clients[socket], messages = _split_messages(
+            self._clients[socket] + bytes(socket.readAll())
+        )
+        for message in messages:
+            if message.get("op") != "load":
+                continue
+            paths = []
+            for file_path in message.get("paths", []):
+                if file_path in self._available:
+                    key = self._available[file_path]
+                    self._send(socket, {"op": "loaded", "file_path": file_path, "key": key})
+                else:
+                    self._requested.setdefault(file_path, set()).add(socket)
+                    paths.append(file_path)
+            if paths:
+                self.loader.load(paths)
+
+    def _on_client_lost(self, socket):
+        self._clients.pop(socket, None)
+        for sockets in self._requested.values():
+            sockets.discard(socket)
+        socket.deleteLater()
+
+    # Client side
+
+    def _on_server_data(self):
+        self._buffer, messages = _split_messages(self._buffer + bytes(self._socket.readAll()))
+        for message in messages:
+            file_path = message.get("file_path")
+            self._remote.discard(file_path)
+            if message.get("op") == "loaded":
+                dataset = data_processing.cache.open(message["key"])
+                if dataset is None:
+                    # The entry is gone (cache cleared); load it ourselves
+                    self._load_here([file_path])
+                    continue
+                self._available[file_path] = message["key"]
+                logger.info(f"Attached to {file_path} loaded by another window")
+                self.file_available.emit(file_path, dataset, dataset.metadata)
+            elif message.get("op") == "failed":
+                self.file_failed.emit(file_path)
+
+    def _on_server_lost(self):
+        self._socket.deleteLater()
+        self._socket = None
+        self._buffer = b""
+        unanswered, self._remote = list(self._remote), set()
+        # The first client to get here becomes the server; the others attach
+        if self._listen():
+            logger.warning(f"Dataset service closed; this window is now a {self.role}")
+        else:
+            logger.warning("Dataset service closed; this window now loads files itself")
+        if unanswered:
+            self.load(unanswered)
+        self.role_changed.emit(self.role)
+
+    @staticmethod
+    def _send(socket, message: dict):
+        socket.write((json.dumps(message) + "\n").encode())
+        socket.flush()
+
+
+def _split_messages(buffer: bytes) -> tuple[bytes, list]:
+    """
+    Splits complete lines off `buffer`; returns the rest and the messages.
+    Lines that are not a JSON object are logged and skipped.
+    """
+    *lines, rest = buffer.split(b"\n")
+    messages = []
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            message = json.loads(line)
+        except ValueError as e:
+            logger.warning(f"Ignoring malformed dataset service message {line[:80]!r}: {e}")
+            continue
+        if isinstance(message, dict):
+            messages.append(message)
+        else:
+            logger.warning(f"Ignoring dataset service message {line[:80]!r}: not an object")
+    return rest, messages
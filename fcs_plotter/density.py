@@ -0,0 +1,101 @@
+"""
+2D density histograms for the density rendering mode.
+
+Events are binned on log10-scaled bins, or on the display coordinates of
+another transform, with integer arithmetic and a single bincount, so the cost
+is linear in the number of events and rendering only depends on the number of
+bins.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class DensityImage:
+    """Event counts on a regular grid in display (log10 for log axes) space."""
+
+    counts: np.ndarray  # (n_y_bins, n_x_bins), row-major, y first
+    x_log_range: tuple  # (min, max) display coordinates covered by the columns
+    y_log_range: tuple  # (min, max) display coordinates covered by the rows
+
+    @property
+    def shape(self) -> tuple:
+        return self.counts.shape
+
+    def display_image(self) -> np.ndarray:
+        """
+        Returns log-scaled float32 counts for display, with empty bins set to
+        NaN so backends can leave them transparent.
+        """
+        image = np.log10(self.counts.astype(np.float32) + 1.0)
+        image[self.counts == 0] = np.nan
+        return image
+
+
+def bin_indices(values: np.ndarray, log_range: tuple, n_bins: int) -> np.ndarray:
+    """
+    Returns the log10 bin of every value, or -1 for values that are not
+    positive or fall outside the range.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return display_bin_indices(np.log10(values, dtype=np.float32), log_range, n_bins)
+
+
+def display_bin_indices(display: np.ndarray, display_range: tuple, n_bins: int) -> np.ndarray:
+    """
+    Like bin_indices, for values that are already in display coordinates
+    (NaN for events that cannot be shown), binned linearly over the range.
+    """
+    low, high = display_range
+    scale = n_bins / (high - low)
+    with np.errstate(invalid="ignore"):
+        position = (display - np.float32(low)) * np.float32(scale)
+    inside = (position >= 0) & (position < n_bins)
+    index = np.full(len(display), -1, dtype=np.int32)
+    index[inside] = position[inside].astype(np.int32)
+    return index
+
+
+def pair_bins(
+    x: np.ndarray, y: np.ndarray, x_log_range: tuple, y_log_range: tuple, bins, display=False
+) -> np.ndarray:
+    """
+    Returns the flat bin (row * n_columns + column) of every event, or -1.
+    `bins` is the number of bins per axis or a (n_rows, n_columns) shape.
+    With `display`, x and y are display coordinates binned over the ranges
+    as given; otherwise they are data values binned in log10.
+    """
+    n_y, n_x = (bins, bins) if np.isscalar(bins) else bins
+    to_bins = display_bin_indices if display else bin_indices
+    ix = to_bins(x, x_log_range, n_x)
+    iy = to_bins(y, y_log_range, n_y)
+    flat = iy * n_x + ix
+    flat[(ix < 0) | (iy < 0)] = -1
+    return flat
+
+
+def density_histogram(
+    x: np.ndarray, y: np.ndarray, x_range: tuple, y_range: tuple, bins: int = 256
+) -> tuple[DensityImage, np.ndarray]:
+    """
+    Bins positive (x, y) pairs on a bins x bins grid spanning the given linear
+    ranges in log10 space.
+    Returns the image and the flat bin of every event (-1 when not binned),
+    which callers can use to look up per-event densities.
+    """
+    x_log_range = (float(np.log10(x_range[0])), float(np.log10(x_range[1])))
+    y_log_range = (float(np.log10(y_range[0])), float(np.log10(y_range[1])))
+    flat = pair_bins(x, y, x_log_range, y_log_range, bins)
+    counts = np.bincount(flat[flat >= 0], minlength=bins * bins).reshape(bins, bins)
+    return DensityImage(counts, x_log_range, y_log_range), flat
+
+
+def outlier_mask(image: DensityImage, flat_bins: np.ndarray, threshold: int) -> np.ndarray:
+    """Selects the events that fall into bins with fewer than `threshold` events."""
+    sparse = image.counts.ravel() < threshold
+    mask = np.zeros(len(flat_bins), dtype=bool)
+    binned = flat_bins >= 0
+    mask[binned] = sparse[flat_bins[binned]]
+    return mask
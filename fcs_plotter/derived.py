@@ -0,0 +1,157 @@
+"""
+Derived per-channel columns for display.
+
+Plots are drawn in the display coordinates of a transform (see transforms),
+and some transforms cannot show every event. The transformed values and the
+validity mask of a channel are computed once per transform and parameter set,
+the first time the channel is plotted, and kept in a process-wide LRU cache
+that is bounded in bytes. Switching back to a recently viewed channel pair
+then only indexes arrays that are already in memory.
+
+Derived columns of cached datasets are written next to the dataset's columns
+(see CachedDataset.derived_directory) and memory-mapped from there, like the
+pyramids. Windows in other processes, and later sessions, map the same pages
+instead of transforming the channel again; previews are kept in memory.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from .config import config
+from .instrumentation import tracer
+from .transforms import LOG, Transform
+
+# Events transformed per block, bounding the temporaries
+TRANSFORM_CHUNK_EVENTS = 1 << 20
+
+# Files of a derived column stored in a cache entry
+VALUES_FILE = "values.npy"
+VALID_FILE = "valid.npy"
+
+
+@dataclass
+class DerivedColumn:
+    """A transformed channel and the events it can display."""
+
+    values: np.ndarray  # float32 display values, NaN where not valid
+    valid: np.ndarray  # bool mask of the displayable events
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + self.valid.nbytes
+
+
+def derive_column(
+    column: np.ndarray, transform: Transform, values=None, valid=None
+) -> DerivedColumn:
+    """
+    Transforms a column block by block; invalid events become NaN.
+    The results are written to `values` and `valid` if given.
+    """
+    values = np.empty(len(column), dtype=np.float32) if values is None else values
+    valid = np.empty(len(column), dtype=bool) if valid is None else valid
+    for start in range(0, len(column), TRANSFORM_CHUNK_EVENTS):
+        stop = start + TRANSFORM_CHUNK_EVENTS
+        block = column[start:stop]
+        block_valid = transform.valid(block)
+        values[start:stop] = transform.forward(block)
+        values[start:stop][~block_valid] = np.nan
+        valid[start:stop] = block_valid
+    return DerivedColumn(values, valid)
+
+
+def load_derived_column(directory: Path, column: np.ndarray, transform: Transform) -> DerivedColumn:
+    """
+    Memory-maps the derived column stored in `directory`, deriving and
+    writing it first if it is not there yet. Built in a temporary directory
+    and renamed into place, so concurrent writers never expose a partial
+    column.
+    """
+    directory = Path(directory)
+    if not directory.exists():
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(prefix=f".{directory.name}-", dir=directory.parent))
+        try:
+            shape = (len(column),)
+            values = np.lib.format.open_memmap(
+                tmp_dir / VALUES_FILE, mode="w+", dtype=np.float32, shape=shape
+            )
+            valid = np.lib.format.open_memmap(
+                tmp_dir / VALID_FILE, mode="w+", dtype=bool, shape=shape
+            )
+            derive_column(column, transform, values, valid)
+            values.flush()
+            valid.flush()
+            del values, valid
+            try:
+                os.rename(tmp_dir, directory)
+            except OSError:
+                # Derived concurrently by someone else
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+    return DerivedColumn(
+        np.load(directory / VALUES_FILE, mmap_mode="r"),
+        np.load(directory / VALID_FILE, mmap_mode="r"),
+    )
+
+
+class DerivedColumnCache:
+    """
+    Least-recently-used cache of derived columns, keyed by dataset, channel
+    and transform, including its parameters. The least recently used columns
+    are dropped once the cache holds more than `max_bytes`; the column just
+    added is always kept. Columns of cached datasets are stored in their
+    cache entry unless `persist` is False.
+    Safe to use from the plot worker and the GUI thread at the same time.
+    """
+
+    def __init__(self, max_bytes: int, persist: bool = True):
+        self.max_bytes = max_bytes
+        self.persist = persist
+        self.nbytes = 0
+        self._columns = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, dataset, channel: str, transform: Transform = LOG) -> DerivedColumn:
+        key = (str(dataset.directory), channel, transform)
+        with self._lock:
+            if key in self._columns:
+                self._columns.move_to_end(key)
+                return self._columns[key]
+
+        # Computed outside the lock; a concurrent miss for the same key only
+        # costs a duplicate transform.
+        directory = dataset.derived_directory(channel, transform) if self.persist else None
+        with tracer.span("transform", events=dataset.n_events):
+            if directory is None:
+                derived = derive_column(dataset.column(channel), transform)
+            else:
+                derived = load_derived_column(directory, dataset.column(channel), transform)
+
+        with self._lock:
+            if key not in self._columns:
+                self._columns[key] = derived
+                self.nbytes += derived.nbytes
+                while self.nbytes > self.max_bytes and len(self._columns) > 1:
+                    _, evicted = self._columns.popitem(last=False)
+                    self.nbytes -= evicted.nbytes
+            return self._columns[key]
+
+    def clear(self):
+        with self._lock:
+            self._columns.clear()
+            self.nbytes = 0
+
+
+derived_columns = DerivedColumnCache(
+    int(config.get("cache", {}).get("derived_max_mb", 1024)) * 1024 * 1024
+)
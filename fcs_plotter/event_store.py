@@ -0,0 +1,114 @@
+"""
+Lazy multi-file event store.
+
+Keeps the per-file (memory-mapped) datasets as they are and exposes them as one
+virtual concatenation. Channels are only gathered into contiguous arrays when
+a plotter asks for them, and the source file of each event is tracked with a
+compact integer index instead of a per-row string.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .instrumentation import tracer
+
+
+class EventStore:
+    """A virtual concatenation of per-file datasets."""
+
+    def __init__(self):
+        self._datasets = {}  # {file_path: dataset}, in insertion order
+        self._metadata = {}  # {file_path: metadata}
+
+    def __contains__(self, file_path):
+        return file_path in self._datasets
+
+    def __len__(self):
+        return len(self._datasets)
+
+    def __bool__(self):
+        return bool(self._datasets)
+
+    def add(self, file_path: str, dataset, metadata=None):
+        """Adds (or replaces) one file; no other file is touched."""
+        self._datasets[file_path] = dataset
+        self._metadata[file_path] = metadata
+
+    def snapshot(self) -> "EventStore":
+        """A shallow copy that worker threads can read while this one changes."""
+        store = EventStore()
+        store._datasets = dict(self._datasets)
+        store._metadata = dict(self._metadata)
+        return store
+
+    def remove(self, file_path: str):
+        self._datasets.pop(file_path, None)
+        self._metadata.pop(file_path, None)
+
+    @property
+    def file_paths(self) -> list[str]:
+        return list(self._datasets)
+
+    @property
+    def n_events(self) -> int:
+        return sum(dataset.n_events for dataset in self._datasets.values())
+
+    @property
+    def loaded_fraction(self) -> float:
+        """
+        The share of the files' events that is available; below 1 while
+        previews (see preview) stand in for files that are still loading.
+        """
+        total = sum(
+            getattr(dataset, "total_events", dataset.n_events)
+            for dataset in self._datasets.values()
+        )
+        return self.n_events / total if total else 1.0
+
+    @property
+    def channels(self) -> list[str]:
+        """The union of all channels, in first-seen order."""
+        channels = {}
+        for dataset in self._datasets.values():
+            channels.update(dict.fromkeys(dataset.channels))
+        return list(channels)
+
+    def dataset(self, file_path: str):
+        return self._datasets[file_path]
+
+    def metadata(self, file_path: str):
+        return self._metadata[file_path]
+
+    def file_index(self) -> np.ndarray:
+        """The source file of every event as a uint32 index into file_paths."""
+        return np.repeat(
+            np.arange(len(self._datasets), dtype=np.uint32),
+            [dataset.n_events for dataset in self._datasets.values()],
+        )
+
+    def column(self, channel: str) -> np.ndarray:
+        """
+        Gathers one channel across all files into a contiguous array.
+        Files without the channel contribute NaNs.
+        """
+        parts = []
+        for dataset in self._datasets.values():
+            if channel in dataset.channels:
+                parts.append(dataset.column(channel))
+            else:
+                parts.append(np.full(dataset.n_events, np.nan, dtype=np.float32))
+        if not parts:
+            return np.empty(0, dtype=np.float32)
+        with tracer.span("merge", events=self.n_events):
+            return np.concatenate(parts)
+
+    def gather(self, channels) -> pd.DataFrame:
+        """
+        Returns a DataFrame with only the requested channels plus a categorical
+        'file_path' column backed by the file index.
+        """
+        columns = {channel: self.column(channel) for channel in channels}
+        columns["file_path"] = pd.Categorical.from_codes(
+            self.file_index(), categories=self.file_paths
+        )
+        return pd.DataFrame(columns, copy=False)
@@ -0,0 +1,227 @@
+"""
+Native reader for FCS 3.0/3.1 files.
+
+Parses the HEADER and TEXT segments and exposes the DATA segment as a read-only
+``numpy.memmap`` with a structured dtype built from the ``$PnB``, ``$DATATYPE``
+and ``$BYTEORD`` keywords, so no event data is copied until it is used.
+``FCSFile.iter_chunks`` streams the same events in fixed-size blocks with
+plain sequential reads, for files larger than memory.
+Layouts that cannot be mapped directly raise ``UnsupportedLayoutError`` and are
+left to ``readfcs``.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+HEADER_SIZE = 58
+SUPPORTED_VERSIONS = ("FCS3.0", "FCS3.1")
+
+# $DATATYPE -> numpy kind
+_DATATYPE_KINDS = {"I": "u", "F": "f", "D": "f"}
+
+# Events per block yielded by FCSFile.iter_chunks
+CHUNK_EVENTS = 1 << 20
+
+
+class UnsupportedLayoutError(ValueError):
+    """Raised when the DATA segment cannot be mapped as a structured array."""
+
+
+def parse_header(header: bytes) -> dict:
+    """Parses the fixed-size HEADER segment into version and segment offsets."""
+    if len(header) < HEADER_SIZE:
+        raise UnsupportedLayoutError("File is too short to contain an FCS header")
+
+    version = header[0:6].decode("ascii", errors="replace")
+    if version not in SUPPORTED_VERSIONS:
+        raise UnsupportedLayoutError(f"Unsupported FCS version: {version!r}")
+
+    def offset(start):
+        field = header[start : start + 8].strip()
+        return int(field) if field else 0
+
+    return {
+        "version": version,
+        "text_start": offset(10),
+        "text_end": offset(18),
+        "data_start": offset(26),
+        "data_end": offset(34),
+        "analysis_start": offset(42),
+        "analysis_end": offset(50),
+    }
+
+
+def parse_text(segment: bytes) -> dict:
+    """
+    Parses a TEXT segment into a dictionary.
+    Keys are normalised the way flowio/readfcs do it: lower case, without the
+    leading '$', so metadata looks the same regardless of which reader was used.
+    """
+    text = segment.decode("utf-8", errors="replace")
+    if not text:
+        return {}
+
+    delimiter = text[0]
+    body = text[1:]
+    if body.endswith(delimiter):
+        body = body[:-1]
+
+    # A doubled delimiter is an escaped delimiter inside a keyword or value
+    placeholder = "\0"
+    tokens = body.replace(delimiter * 2, placeholder).split(delimiter)
+    tokens = [token.replace(placeholder, delimiter) for token in tokens]
+
+    return {
+        key.strip().lstrip("$").lower(): value
+        for key, value in zip(tokens[0::2], tokens[1::2])
+    }
+
+
+def declared_size(file_path: str):
+    """
+    Returns the size in bytes the HEADER and TEXT segments give the file
+    (the end of its DATA segment), or None if they cannot be read (yet).
+    A file that is still being written is shorter than this.
+    """
+    try:
+        with open(file_path, "rb") as f:
+            header = parse_header(f.read(HEADER_SIZE))
+            f.seek(header["text_start"])
+            text = parse_text(f.read(header["text_end"] - header["text_start"] + 1))
+        data_end = header["data_end"] or int(text.get("enddata", 0))
+    except (OSError, ValueError):
+        return None
+    return data_end + 1 if data_end else None
+
+
+def _byte_order(byteord: str) -> str:
+    order = [part.strip() for part in byteord.split(",")]
+    ascending = [str(i) for i in range(1, len(order) + 1)]
+    if order == ascending:
+        return "<"
+    if order == ascending[::-1]:
+        return ">"
+    raise UnsupportedLayoutError(f"Unsupported $BYTEORD: {byteord!r}")
+
+
+def channel_labels(text: dict) -> list[str]:
+    """
+    Returns the column names for each parameter, matching readfcs: the marker
+    name ($PnS) when set, otherwise the channel name ($PnN).
+    """
+    labels = []
+    for n in range(1, int(text["par"]) + 1):
+        marker = text.get(f"p{n}s", "").strip()
+        labels.append(marker if marker else text[f"p{n}n"].strip())
+    return labels
+
+
+def build_dtype(text: dict) -> np.dtype:
+    """Builds the structured event dtype described by the TEXT keywords."""
+    mode = text.get("mode", "L").upper()
+    if mode != "L":
+        raise UnsupportedLayoutError(f"Unsupported $MODE: {mode!r}")
+
+    datatype = text.get("datatype", "").upper()
+    kind = _DATATYPE_KINDS.get(datatype)
+    if kind is None:
+        raise UnsupportedLayoutError(f"Unsupported $DATATYPE: {datatype!r}")
+
+    order = _byte_order(text.get("byteord", "1,2,3,4"))
+    names = channel_labels(text)
+    if len(set(names)) != len(names):
+        raise UnsupportedLayoutError("Duplicate channel names")
+
+    formats = []
+    for n in range(1, len(names) + 1):
+        bits = text.get(f"p{n}b", "").strip()
+        if not bits.isdigit() or int(bits) % 8:
+            raise UnsupportedLayoutError(f"Unsupported $P{n}B: {bits!r}")
+        width = int(bits) // 8
+        if datatype == "I" and width not in (1, 2, 4, 8):
+            raise UnsupportedLayoutError(f"Unsupported integer width: {bits} bits")
+        if datatype == "F" and width != 4:
+            raise UnsupportedLayoutError(f"$DATATYPE F with {bits} bits")
+        if datatype == "D" and width != 8:
+            raise UnsupportedLayoutError(f"$DATATYPE D with {bits} bits")
+        formats.append(f"{order if width > 1 else '|'}{kind}{width}")
+
+    return np.dtype({"names": names, "formats": formats})
+
+
+class FCSFile:
+    """
+    An FCS file whose DATA segment is memory-mapped.
+    Only the HEADER and TEXT segments are read eagerly.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = str(file_path)
+        file_size = os.path.getsize(self.file_path)
+
+        with open(self.file_path, "rb") as f:
+            self.header = parse_header(f.read(HEADER_SIZE))
+            f.seek(self.header["text_start"])
+            self.text = parse_text(
+                f.read(self.header["text_end"] - self.header["text_start"] + 1)
+            )
+
+        self.dtype = build_dtype(self.text)
+        self.channels = list(self.dtype.names)
+        self.n_events = int(self.text["tot"])
+
+        # Files larger than 99,999,999 bytes store the offsets in TEXT only
+        data_start = self.header["data_start"]
+        if not data_start:
+            data_start = int(self.text.get("begindata", 0))
+        if not data_start:
+            raise UnsupportedLayoutError("Missing DATA segment offset")
+        self.data_offset = data_start
+
+        if self.data_offset + self.n_events * self.dtype.itemsize > file_size:
+            raise UnsupportedLayoutError("DATA segment extends past end of file")
+
+        self._events = None
+
+    @property
+    def events(self) -> np.memmap:
+        """The DATA segment as a read-only structured memmap."""
+        if self._events is None:
+            self._events = np.memmap(
+                self.file_path,
+                dtype=self.dtype,
+                mode="r",
+                offset=self.data_offset,
+                shape=(self.n_events,),
+            )
+        return self._events
+
+    def iter_chunks(self, chunk_events: int = CHUNK_EVENTS):
+        """
+        Yields (start, block) pairs, where block is a structured array of up
+        to `chunk_events` consecutive events in file byte order. The DATA
+        segment is read front to back, one block at a time, so memory use
+        does not depend on the file size.
+        """
+        with open(self.file_path, "rb") as f:
+            f.seek(self.data_offset)
+            for start in range(0, self.n_events, chunk_events):
+                count = min(chunk_events, self.n_events - start)
+                block = np.fromfile(f, dtype=self.dtype, count=count)
+                if len(block) != count:
+                    raise UnsupportedLayoutError("DATA segment is truncated")
+                yield start, block
+
+    @property
+    def metadata(self) -> dict:
+        """Metadata in the same layout readfcs stores in ``adata.uns``."""
+        return {"meta": dict(self.text)}
+
+    def to_df(self) -> pd.DataFrame:
+        """
+        Returns a DataFrame whose columns are views onto the memmap.
+        copy=False keeps pandas from consolidating the columns into a new block.
+        """
+        events = self.events
+        return pd.DataFrame({name: events[name] for name in self.channels}, copy=False)
@@ -0,0 +1,329 @@
+"""
+Gates and gate hierarchies.
+
+A gate is drawn on a channel pair in the display coordinates of a transform
+and selects the events inside it. The events of a gate are those of its
+parent gate that it contains, so gates form a tree. Membership is tested with
+vectorized comparisons on the cached display values (see derived). Masks are
+kept per file until the gate or one of its ancestors is edited.
+"""
+
+import copy
+import itertools
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from .derived import derived_columns
+from .preparation import Cancelled
+from .transforms import LOG, Transform
+
+# Polygon tests on more candidate events than this go through a grid index
+GRID_INDEX_MIN_EVENTS = 1 << 16
+GRID_CELLS = 64  # grid index cells per axis over the polygon's bounding box
+
+QUADRANTS = ("++", "-+", "--", "+-")  # sign of x and y relative to the split
+
+
+def _crossings(x: np.ndarray, y: np.ndarray, vertices: np.ndarray) -> np.ndarray:
+    """
+    Even-odd rule: a point is inside if a ray to +x crosses an odd number of
+    edges. Points on an edge (collinear and within its extent) are inside.
+    """
+    inside = np.zeros(len(x), dtype=bool)
+    on_edge = np.zeros(len(x), dtype=bool)
+    x_prev, y_prev = vertices[-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for x_vertex, y_vertex in vertices:
+            spans = (y_vertex > y) != (y_prev > y)
+            x_edge = x_vertex + (y - y_vertex) * (x_prev - x_vertex) / (y_prev - y_vertex)
+            inside ^= spans & (x < x_edge)
+            cross = (x_vertex - x_prev) * (y - y_prev) - (y_vertex - y_prev) * (x - x_prev)
+            on_edge |= (
+                (cross == 0)
+                & (x >= min(x_prev, x_vertex))
+                & (x <= max(x_prev, x_vertex))
+                & (y >= min(y_prev, y_vertex))
+                & (y <= max(y_prev, y_vertex))
+            )
+            x_prev, y_prev = x_vertex, y_vertex
+    return inside | on_edge
+
+
+def _grid_crossings(x, y, vertices, bounds) -> np.ndarray:
+    """
+    Like _crossings, but only tests the points in grid cells that an edge
+    passes through (or next to). The other cells are entirely inside or
+    outside, which is decided once from their centers.
+    """
+    x0, x1, y0, y1 = bounds
+    width = (x1 - x0) / GRID_CELLS or 1.0
+    height = (y1 - y0) / GRID_CELLS or 1.0
+
+    # Mark the cells along every edge, sampled at a quarter cell, then grow
+    # the marks by one cell to cover edges clipping a cell corner.
+    edge = np.zeros((GRID_CELLS, GRID_CELLS), dtype=bool)
+    for start, stop in zip(vertices, np.roll(vertices, -1, axis=0)):
+        steps = int(4 * max(abs(stop[0] - start[0]) / width, abs(stop[1] - start[1]) / height)) + 2
+        t = np.linspace(0.0, 1.0, steps)
+        sx = ((start[0] + t * (stop[0] - start[0]) - x0) / width).astype(np.int64)
+        sy = ((start[1] + t * (stop[1] - start[1]) - y0) / height).astype(np.int64)
+        edge[np.clip(sy, 0, GRID_CELLS - 1), np.clip(sx, 0, GRID_CELLS - 1)] = True
+    boundary = edge.copy()
+    boundary[1:] |= edge[:-1]
+    boundary[:-1] |= edge[1:]
+    grown = boundary.copy()
+    boundary[:, 1:] |= grown[:, :-1]
+    boundary[:, :-1] |= grown[:, 1:]
+
+    centers_x, centers_y = np.meshgrid(
+        x0 + (np.arange(GRID_CELLS) + 0.5) * width, y0 + (np.arange(GRID_CELLS) + 0.5) * height
+    )
+    cell_inside = _crossings(centers_x.ravel(), centers_y.ravel(), vertices)
+    cell_inside = cell_inside.reshape(GRID_CELLS, GRID_CELLS) & ~boundary
+
+    ix = np.clip(((x - x0) / width).astype(np.int64), 0, GRID_CELLS - 1)
+    iy = np.clip(((y - y0) / height).astype(np.int64), 0, GRID_CELLS - 1)
+    inside = cell_inside[iy, ix]
+    exact = boundary[iy, ix]
+    inside[exact] = _crossings(x[exact], y[exact], vertices)
+    return inside
+
+
+def points_in_polygon(x: np.ndarray, y: np.ndarray, vertices: np.ndarray) -> np.ndarray:
+    """
+    Returns which points lie inside the polygon. Points outside its bounding
+    box are rejected first; large batches use a grid index so only points near
+    the outline need the exact test. Points on an edge or a vertex are inside,
+    as on the edges of a RectangleGate. NaN coordinates are never inside.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    (x0, y0), (x1, y1) = vertices.min(axis=0), vertices.max(axis=0)
+    with np.errstate(invalid="ignore"):
+        candidates = np.flatnonzero((x >= x0) & (x <= x1) & (y >= y0) & (y <= y1))
+    inside = np.zeros(len(x), dtype=bool)
+    cx, cy = x[candidates], y[candidates]
+    if len(candidates) >= GRID_INDEX_MIN_EVENTS:
+        inside[candidates] = _grid_crossings(cx, cy, vertices, (x0, x1, y0, y1))
+    else:
+        inside[candidates] = _crossings(cx, cy, vertices)
+    return inside
+
+
+@dataclass(eq=False)
+class Gate:
+    """Base class; coordinates are display coordinates of `transform`."""
+
+    name: str
+    x_channel: str
+    y_channel: str
+    transform: Transform = LOG
+    parent: str = None  # name of the parent gate, None for top-level gates
+
+    def contains(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+
+@dataclass(eq=False)
+class RectangleGate(Gate):
+    x_min: float = 0.0
+    x_max: float = 1.0
+    y_min: float = 0.0
+    y_max: float = 1.0
+
+    def contains(self, x, y):
+        with np.errstate(invalid="ignore"):
+            return (x >= self.x_min) & (x <= self.x_max) & (y >= self.y_min) & (y <= self.y_max)
+
+
+@dataclass(eq=False)
+class PolygonGate(Gate):
+    vertices: np.ndarray = field(default_factory=lambda: np.zeros((0, 2)))
+
+    def contains(self, x, y):
+        if len(self.vertices) < 3:
+            return np.zeros(len(x), dtype=bool)
+        return points_in_polygon(x, y, self.vertices)
+
+
+@dataclass(eq=False)
+class QuadrantGate(Gate):
+    """
+    One quadrant of a split at (x, y). The four quadrants of a split share
+    its `split` name and are moved together.
+    """
+
+    split: str = ""
+    x: float = 0.0
+    y: float = 0.0
+    quadrant: str = "++"  # one of QUADRANTS
+
+    def contains(self, x, y):
+        with np.errstate(invalid="ignore"):
+            in_x = x >= self.x if self.quadrant[0] == "+" else x < self.x
+            in_y = y >= self.y if self.quadrant[1] == "+" else y < self.y
+        # NaN compares False both ways; keep those events out of "-" quadrants
+        return in_x & in_y & ~np.isnan(x) & ~np.isnan(y)
+
+
+def quadrant_gates(split: str, x_channel, y_channel, transform, x, y, parent=None) -> list:
+    """The four quadrant gates of a split, named "<split> <quadrant>"."""
+    return [
+        QuadrantGate(
+            f"{split} {quadrant}",
+            x_channel,
+            y_channel,
+            transform,
+            parent,
+            split=split,
+            x=x,
+            y=y,
+            quadrant=quadrant,
+        )
+        for quadrant in QUADRANTS
+    ]
+
+
+@dataclass
+class GateStatistics:
+    """The events of one gate in one file."""
+
+    gate: str
+    file_path: str
+    count: int
+    parent_count: int
+    total: int
+    depth: int = 0  # of the gate in its tree, for indenting
+
+    @property
+    def percent_of_parent(self) -> float:
+        return 100.0 * self.count / self.parent_count if self.parent_count else 0.0
+
+    @property
+    def percent_of_total(self) -> float:
+        return 100.0 * self.count / self.total if self.total else 0.0
+
+
+class GateTree:
+    """
+    Named gates and their parent/child relations, with per-file masks
+    cached until a gate or one of its ancestors changes.
+    Every gate has a revision that changes with its geometry or an
+    ancestor's; a mask is only reused for the revision it was computed for.
+    Snapshots share the mask cache, so statistics can be counted on a
+    worker thread while the gates are being edited.
+    """
+
+    def __init__(self):
+        self.gates = {}  # {name: Gate}, parents before children
+        self._revisions = {}  # {name: revision}
+        self._masks = {}  # {(name, dataset directory): (revision, bool mask)}
+        self._counter = itertools.count()
+
+    def __contains__(self, name):
+        return name in self.gates
+
+    def __iter__(self):
+        return iter(self.gates.values())
+
+    def __len__(self):
+        return len(self.gates)
+
+    def add(self, gate: Gate):
+        if gate.name in self.gates:
+            raise ValueError(f"Gate {gate.name!r} already exists")
+        if gate.parent is not None and gate.parent not in self.gates:
+            raise ValueError(f"Unknown parent gate {gate.parent!r}")
+        self.gates[gate.name] = gate
+        self._revisions[gate.name] = next(self._counter)
+
+    def snapshot(self) -> "GateTree":
+        """A copy of the gates that a worker thread can read while this one changes."""
+        tree = GateTree()
+        tree.gates = {name: copy.copy(gate) for name, gate in self.gates.items()}
+        tree._revisions = dict(self._revisions)
+        tree._masks = self._masks
+        tree._counter = self._counter
+        return tree
+
+    def children(self, name: str) -> list:
+        return [gate for gate in self.gates.values() if gate.parent == name]
+
+    def descendants(self, name: str) -> list:
+        """The names of a gate's children, their children and so on."""
+        names = []
+        for child in self.children(name):
+            names.append(child.name)
+            names.extend(self.descendants(child.name))
+        return names
+
+    def depth(self, name: str) -> int:
+        parent = self.gates[name].parent
+        return 0 if parent is None else 1 + self.depth(parent)
+
+    def update(self, name: str, **geometry):
+        """Changes a gate's geometry, e.g. update("A", x_min=1.0)."""
+        gate = self.gates[name]
+        for attribute, value in geometry.items():
+            setattr(gate, attribute, value)
+        self.invalidate(name)
+
+    def remove(self, name: str):
+        """Removes a gate together with all of its descendants."""
+        removed = {name, *self.descendants(name)}
+        for key in [key for key in list(self._masks) if key[0] in removed]:
+            self._masks.pop(key, None)
+        for gate in removed:
+            self.gates.pop(gate, None)
+            self._revisions.pop(gate, None)
+
+    def invalidate(self, name: str):
+        """Outdates the cached masks of a gate and its descendants."""
+        for changed in [name] + self.descendants(name):
+            self._revisions[changed] = next(self._counter)
+
+    def mask(self, dataset, name: str) -> np.ndarray:
+        """Returns which events of a dataset are in a gate and all its ancestors."""
+        key = (name, str(dataset.directory))
+        revision = self._revisions[name]
+        cached = self._masks.get(key)
+        if cached is not None and cached[0] == revision:
+            return cached[1]
+
+        gate = self.gates[name]
+        mask = np.zeros(dataset.n_events, dtype=bool)
+        if gate.x_channel in dataset.channels and gate.y_channel in dataset.channels:
+            x = derived_columns.get(dataset, gate.x_channel, gate.transform).values
+            y = derived_columns.get(dataset, gate.y_channel, gate.transform).values
+            if gate.parent is None:
+                mask = gate.contains(x, y)
+            else:
+                # Only the parent's events need testing
+                index = np.flatnonzero(self.mask(dataset, gate.parent))
+                mask[index] = gate.contains(x[index], y[index])
+        self._masks[key] = (revision, mask)
+        return mask
+
+    def statistics(self, store, is_cancelled=lambda: False) -> list:
+        """
+        Returns the GateStatistics of every gate in every file of an EventStore.
+        Raises Cancelled as soon as `is_cancelled()` returns True.
+        """
+        rows = []
+        for gate in self.gates.values():
+            depth = self.depth(gate.name)
+            for file_path in store.file_paths:
+                if is_cancelled():
+                    raise Cancelled()
+                dataset = store.dataset(file_path)
+                count = int(np.count_nonzero(self.mask(dataset, gate.name)))
+                if gate.parent is None:
+                    parent_count = dataset.n_events
+                else:
+                    parent_count = int(np.count_nonzero(self.mask(dataset, gate.parent)))
+                rows.append(
+                    GateStatistics(
+                        gate.name, file_path, count, parent_count, dataset.n_events, depth
+                    )
+                )
+        return rows
@@ -0,0 +1,203 @@
+"""
+Channel-pair grids for panel QC.
+
+A grid shows every pair of a list of channels at once: the panel in row i
+and column j plots channel j against channel i, and the diagonal panels show
+the histogram of their channel. Panels hold no arrays of their own: the
+sampled display values of each channel are gathered once, with the cached
+subsample index of every file, and all panels in that channel's row and
+column read the same buffer. Scatter panels use the plot ratio; density
+panels count the whole stored sample, which is every event of files up to
+cache.subsample_max_events events and a uniform sample of larger ones.
+
+A panel is rasterised to an RGBA image of its size in pixels, and only when
+it is shown (see grid_view), so the cost of a grid depends on the panels on
+screen rather than on the number of channels. The layout of the panels in
+pixels is computed here as well. Like preparation, this module is free of Qt.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from .density import display_bin_indices, pair_bins
+from .derived import derive_column, derived_columns
+from .instrumentation import tracer
+from .preparation import SCATTER, Cancelled, axis_range, channel_sketch
+from .transforms import LOG, Transform
+
+# Colors of empty and full density pixels and of scatter points (RGB)
+DENSITY_COLORS = np.array(
+    [[68, 1, 84], [59, 82, 139], [33, 145, 140], [94, 201, 98], [253, 231, 37]],
+    dtype=np.float32,
+)
+POINT_COLOR = (20, 20, 20)
+HISTOGRAM_COLOR = (70, 110, 180)
+
+LABEL_SIZE = 18  # pixels for the channel names above and left of the panels
+PANEL_SPACING = 4
+
+
+@dataclass(frozen=True)
+class GridRequest:
+    """The parameters that change which events a grid draws and where."""
+
+    channels: tuple
+    quantile: float
+    range_margin: float
+    ratio: float
+    mode: str = SCATTER
+    transform: Transform = LOG
+
+
+@dataclass
+class PreparedGrid:
+    """The shared buffers and axis ranges of a grid; panels are drawn from these."""
+
+    request: GridRequest
+    ranges: dict  # {channel: (min, max)} in display coordinates
+    values: dict  # {channel: float32 sampled display values, NaN where not shown}
+    sources: tuple = ()
+
+    @property
+    def channels(self) -> tuple:
+        return self.request.channels
+
+    def panel_counts(self, x_channel: str, y_channel: str, shape: tuple) -> np.ndarray:
+        """Events per pixel of a (height, width) panel, row 0 at the bottom."""
+        height, width = shape
+        flat = pair_bins(
+            self.values[x_channel],
+            self.values[y_channel],
+            self.ranges[x_channel],
+            self.ranges[y_channel],
+            shape,
+            display=True,
+        )
+        return np.bincount(flat[flat >= 0], minlength=height * width).reshape(height, width)
+
+    def histogram(self, channel: str, n_bins: int) -> np.ndarray:
+        """Events per bin of one channel over its axis range."""
+        index = display_bin_indices(self.values[channel], self.ranges[channel], n_bins)
+        return np.bincount(index[index >= 0], minlength=n_bins)
+
+
+def prepare_grid(store, request: GridRequest, is_cancelled=lambda: False) -> PreparedGrid:
+    """
+    Computes the axis range of every channel from the sketches and gathers
+    each channel's sampled display values once.
+    Raises Cancelled as soon as `is_cancelled()` returns True.
+    """
+    with tracer.span("prepare grid", events=store.n_events):
+        ranges = {
+            channel: axis_range(
+                channel_sketch(store, channel),
+                request.quantile,
+                request.range_margin,
+                request.transform,
+            )
+            for channel in request.channels
+        }
+        ratio = request.ratio if request.mode == SCATTER else 1.0
+        parts = {channel: [] for channel in request.channels}
+        for file_path in store.file_paths:
+            dataset = store.dataset(file_path)
+            # One index per file, shared by every channel; sorted, as the order
+            # of the events does not matter when they are counted
+            sample = np.sort(dataset.subsample(ratio))
+            whole = len(sample) == dataset.n_events
+            for channel, channel_parts in parts.items():
+                if is_cancelled():
+                    raise Cancelled()
+                if channel not in dataset.channels:
+                    channel_parts.append(np.full(len(sample), np.nan, dtype=np.float32))
+                elif whole:
+                    # The derived column is shared with the main plot
+                    derived = derived_columns.get(dataset, channel, request.transform)
+                    channel_parts.append(derived.values)
+                else:
+                    # Only the sample is transformed, not the whole column
+                    column = dataset.column(channel)[sample]
+                    channel_parts.append(derive_column(column, request.transform).values)
+        values = {channel: _concat(channel_parts) for channel, channel_parts in parts.items()}
+        sources = tuple(str(store.dataset(path).directory) for path in store.file_paths)
+        return PreparedGrid(request, ranges, values, sources)
+
+
+def _concat(parts) -> np.ndarray:
+    if len(parts) == 1:
+        return parts[0]  # a single file's buffer is used as is
+    return np.concatenate(parts) if parts else np.empty(0, dtype=np.float32)
+
+
+def panel_offset(index: int, panel_size: int) -> int:
+    """The pixel offset of the panels in row or column `index` from the grid's edge."""
+    return LABEL_SIZE + index * (panel_size + PANEL_SPACING)
+
+
+def grid_side(n_channels: int, panel_size: int) -> int:
+    """The width and height in pixels of a grid of `n_channels` channels."""
+    return panel_offset(n_channels, panel_size)
+
+
+def panels_in(n_channels: int, panel_size: int, left, top, right, bottom) -> list:
+    """
+    The (row, column) of every panel of a grid of `n_channels` channels that
+    intersects the pixel rectangle from (left, top) to (right, bottom),
+    inclusive. The spacing after a panel counts as part of it.
+    """
+    size = panel_size + PANEL_SPACING
+
+    def span(start, stop):
+        first = max((start - LABEL_SIZE) // size, 0)
+        last = min((stop - LABEL_SIZE) // size, n_channels - 1)
+        return range(first, last + 1)
+
+    rows = span(top, bottom)
+    columns = span(left, right)
+    return [(row, column) for row in rows for column in columns]
+
+
+def panel_rgba(grid: PreparedGrid, row: int, column: int, shape: tuple, alpha: float) -> np.ndarray:
+    """
+    Rasterises the panel in `row` and `column` to a (height, width, 4) uint8
+    RGBA image, top row first. Scatter points are composited with `alpha`
+    per event; density panels use log-scaled counts.
+    """
+    height, width = shape
+    image = np.zeros((height, width, 4), dtype=np.uint8)
+    x_channel, y_channel = grid.channels[column], grid.channels[row]
+    with tracer.span("grid panel"):
+        if row == column:
+            _draw_histogram(image, grid.histogram(x_channel, width))
+            return image
+
+        counts = grid.panel_counts(x_channel, y_channel, shape)[::-1]
+        filled = counts > 0
+        if grid.request.mode == SCATTER:
+            image[..., :3] = POINT_COLOR
+            opacity = 1.0 - np.power(1.0 - alpha, counts[filled], dtype=np.float64)
+            image[..., 3][filled] = np.round(255 * opacity).astype(np.uint8)
+        else:
+            level = np.log1p(counts[filled].astype(np.float64))
+            level /= max(level.max(initial=0.0), 1e-12)
+            anchors = np.linspace(0.0, 1.0, len(DENSITY_COLORS))
+            for channel in range(3):
+                image[..., channel][filled] = np.interp(
+                    level, anchors, DENSITY_COLORS[:, channel]
+                ).astype(np.uint8)
+            image[..., 3][filled] = 255
+    return image
+
+
+def _draw_histogram(image: np.ndarray, counts: np.ndarray):
+    """Draws one bar per pixel column, scaled to the tallest bar."""
+    height = image.shape[0]
+    peak = counts.max(initial=0)
+    if peak == 0:
+        return
+    bar_heights = np.round(counts / peak * (height - 1)).astype(np.int64)
+    rows = np.arange(height)[::-1, None]  # distance from the bottom
+    bars = rows < bar_heights[None, :]
+    image[..., :3][bars] = HISTOGRAM_COLOR
+    image[..., 3][bars] = 255
@@ -0,0 +1,236 @@
+"""
+Scrollable, virtualised view of a channel-pair grid (see grid).
+
+The grid is painted by a single canvas widget inside a QScrollArea; panels
+are not widgets. A paint only draws the panels in the exposed rectangle, and
+a panel that has no image yet is rasterised on a background thread the first
+time it is on screen. Panel images are kept in a small LRU cache, so
+scrolling back is instant while a large grid never holds more than a few
+screens of images. Requests for panels that were scrolled away before their
+turn are skipped.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt6.QtCore import QRect, Qt, pyqtSignal
+from PyQt6.QtGui import QColor, QImage, QPainter
+from PyQt6.QtWidgets import QScrollArea, QVBoxLayout, QWidget
+
+from .grid import (
+    LABEL_SIZE,
+    GridRequest,
+    grid_side,
+    panel_offset,
+    panel_rgba,
+    panels_in,
+    prepare_grid,
+)
+from .logger_setup import logger
+from .preparation import SCATTER, Cancelled
+
+MIN_CACHED_PANELS = 64
+
+
+class _GridCanvas(QWidget):
+    """Paints the panels of the parent GridView that intersect the exposed area."""
+
+    def __init__(self, view):
+        super().__init__()
+        self.view = view
+
+    def paintEvent(self, event):
+        view = self.view
+        painter = QPainter(self)
+        painter.fillRect(event.rect(), QColor("white"))
+        grid = view.grid
+        if grid is None:
+            return
+        view.note_visible(self.visibleRegion().boundingRect())
+        for row, column in view.panels_in(event.rect()):
+            rect = view.panel_rect(row, column)
+            image = view.panel_image(row, column)
+            if image is not None:
+                painter.drawImage(rect.topLeft(), image)
+            else:
+                painter.fillRect(rect, QColor(240, 240, 240))
+            painter.setPen(QColor(180, 180, 180))
+            painter.drawRect(rect.adjusted(0, 0, -1, -1))
+
+        painter.setPen(QColor("black"))
+        for i, channel in enumerate(grid.channels):
+            offset = panel_offset(i, view.panel_size)
+            painter.drawText(
+                QRect(offset, 0, view.panel_size, LABEL_SIZE),
+                Qt.AlignmentFlag.AlignCenter,
+                channel,
+            )
+            painter.save()
+            painter.translate(0, offset + view.panel_size)
+            painter.rotate(-90)
+            painter.drawText(
+                QRect(0, 0, view.panel_size, LABEL_SIZE), Qt.AlignmentFlag.AlignCenter, channel
+            )
+            painter.restore()
+
+
+class GridView(QWidget):
+    """
+    Shows a PreparedGrid: the panel in row i and column j plots channel j
+    against channel i. Preparation and rasterisation run on one background
+    thread; results of superseded grids are dropped.
+    """
+
+    # Internal: carry results from the background thread to the GUI thread
+    _prepared = pyqtSignal(int, object)
+    _rendered = pyqtSignal(int, int, int, object)
+
+    def __init__(self, panel_size: int = 160, parent=None):
+        super().__init__(parent)
+        self.panel_size = panel_size
+        self.alpha = 0.06
+        self.grid = None
+        self._key = None  # (request, sources) of the grid shown or being prepared
+        self._generation = 0  # of the grid being prepared
+        self._epoch = 0  # of the panel images; bumped whenever they are dropped
+        self._images = OrderedDict()  # {(row, column): QImage}, least recently used first
+        self._in_flight = set()
+        self._visible = frozenset()  # panels on screen at the last paint
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._prepared.connect(self._on_prepared)
+        self._rendered.connect(self._on_rendered)
+
+        self.canvas = _GridCanvas(self)
+        self.scroll_area = QScrollArea()
+        self.scroll_area.setWidget(self.canvas)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.scroll_area)
+
+    def update_grid(self, store, request: GridRequest, alpha: float):
+        """Prepares and shows a new grid, unless it would equal the current one."""
+        key = (request, tuple(str(store.dataset(path).directory) for path in store.file_paths))
+        if key == self._key:
+            self.set_alpha(alpha)
+            return
+        self._key = key
+        self.alpha = alpha
+        self._generation += 1
+        self._executor.submit(self._prepare, self._generation, store, request)
+
+    def set_alpha(self, alpha: float):
+        """Redraws the scatter panels with a new point alpha."""
+        if alpha == self.alpha:
+            return
+        self.alpha = alpha
+        if self.grid is not None and self.grid.request.mode == SCATTER:
+            self._restart()
+
+    def set_panel_size(self, panel_size: int):
+        self.panel_size = panel_size
+        self._restart()
+
+    def clear(self):
+        self._key = None
+        self._generation += 1
+        self.grid = None
+        self._restart()
+
+    def shutdown(self):
+        self._generation += 1
+        self._epoch += 1
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _restart(self):
+        """Drops the panel images; the visible ones are drawn again."""
+        self._epoch += 1
+        self._images.clear()
+        self._in_flight.clear()
+        self._resize_canvas()
+
+    def _resize_canvas(self):
+        n = len(self.grid.channels) if self.grid is not None else 0
+        side = grid_side(n, self.panel_size)
+        self.canvas.resize(side, side)
+        self.canvas.update()
+
+    # Geometry, used by the canvas (see grid)
+
+    def panel_rect(self, row: int, column: int) -> QRect:
+        return QRect(
+            panel_offset(column, self.panel_size),
+            panel_offset(row, self.panel_size),
+            self.panel_size,
+            self.panel_size,
+        )
+
+    def panels_in(self, rect: QRect) -> list:
+        """The (row, column) of every panel that intersects `rect`."""
+        return panels_in(
+            len(self.grid.channels),
+            self.panel_size,
+            rect.left(),
+            rect.top(),
+            rect.right(),
+            rect.bottom(),
+        )
+
+    def note_visible(self, rect: QRect):
+        self._visible = frozenset(self.panels_in(rect))
+
+    def panel_image(self, row: int, column: int):
+        """The panel's image, or None after queueing it to be drawn."""
+        key = (row, column)
+        if key in self._images:
+            self._images.move_to_end(key)
+            return self._images[key]
+        if key not in self._in_flight:
+            self._in_flight.add(key)
+            shape = (self.panel_size, self.panel_size)
+            self._executor.submit(
+                self._render, self._epoch, self.grid, row, column, shape, self.alpha
+            )
+        return None
+
+    # Background thread
+
+    def _prepare(self, generation, store, request):
+        try:
+            grid = prepare_grid(store, request, lambda: generation != self._generation)
+        except Cancelled:
+            return
+        except Exception as e:
+            logger.error(f"Failed to prepare grid: {e}")
+            return
+        self._prepared.emit(generation, grid)
+
+    def _render(self, epoch, grid, row, column, shape, alpha):
+        rgba = None
+        if epoch == self._epoch and (row, column) in self._visible:
+            try:
+                rgba = panel_rgba(grid, row, column, shape, alpha)
+            except Exception as e:
+                logger.error(f"Failed to draw grid panel: {e}")
+        self._rendered.emit(epoch, row, column, rgba)
+
+    # GUI thread
+
+    def _on_prepared(self, generation, grid):
+        if generation != self._generation:
+            return
+        self.grid = grid
+        self._restart()
+
+    def _on_rendered(self, epoch, row, column, rgba):
+        if epoch != self._epoch:
+            return
+        self._in_flight.discard((row, column))
+        if rgba is None:
+            return  # scrolled away; drawn again when it is back on screen
+        height, width = rgba.shape[:2]
+        image = QImage(rgba.data, width, height, 4 * width, QImage.Format.Format_RGBA8888)
+        self._images[(row, column)] = image.copy()
+        limit = max(MIN_CACHED_PANELS, 2 * len(self._visible))
+        while len(self._images) > limit:
+            self._images.popitem(last=False)
+        self.canvas.update(self.panel_rect(row, column))
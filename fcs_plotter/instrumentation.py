@@ -0,0 +1,150 @@
+"""
+Timing spans for the hot paths.
+
+Stages such as loading, cache lookups, merging, subsampling, transforms,
+quantiles, uploads to the plot and painting are wrapped in spans:
+
+    with tracer.span("transform", events=len(column)):
+        ...
+
+Finished spans go into a fixed-size ring buffer, so recording costs two
+clock reads and an append and memory use stays constant. The buffer feeds
+the performance dock in the main window (latency per stage and events per
+second) and can be written as Chrome trace JSON, which chrome://tracing and
+Perfetto open for offline analysis.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+import numpy as np
+
+from .config import config
+
+
+@dataclass
+class Span:
+    name: str
+    start_ns: int  # time.perf_counter_ns() at the start
+    duration_ns: int
+    thread_id: int
+    events: int = None  # events processed, if the stage knows
+
+    @property
+    def seconds(self) -> float:
+        return self.duration_ns / 1e9
+
+
+@dataclass
+class StageSummary:
+    """The recorded spans of one stage."""
+
+    name: str
+    count: int
+    last_ms: float
+    mean_ms: float
+    max_ms: float
+    events_per_second: float  # NaN if the spans carry no event counts
+
+
+class Tracer:
+    """Records spans into a ring buffer; safe to use from any thread."""
+
+    def __init__(self, capacity: int = 10000, enabled: bool = True):
+        self.enabled = enabled
+        self._spans = deque(maxlen=capacity)
+        self._thread_names = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, start_ns: int, end_ns: int, events: int = None):
+        if not self.enabled:
+            return
+        thread = threading.current_thread()
+        with self._lock:
+            self._thread_names.setdefault(thread.ident, thread.name)
+            self._spans.append(Span(name, start_ns, end_ns - start_ns, thread.ident, events))
+
+    @contextmanager
+    def span(self, name: str, events: int = None):
+        """Times the body of a with block as one span of stage `name`."""
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter_ns(), events)
+
+    def spans(self) -> list:
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+
+    def summary(self) -> list:
+        """One StageSummary per stage in the buffer, in order of first appearance."""
+        stages = {}
+        for span in self.spans():
+            stages.setdefault(span.name, []).append(span)
+        summaries = []
+        for name, spans in stages.items():
+            durations = np.array([span.duration_ns for span in spans], dtype=np.float64) / 1e6
+            counted = [span for span in spans if span.events is not None]
+            seconds = sum(span.seconds for span in counted)
+            events = sum(span.events for span in counted)
+            summaries.append(
+                StageSummary(
+                    name,
+                    len(spans),
+                    float(durations[-1]),
+                    float(durations.mean()),
+                    float(durations.max()),
+                    events / seconds if seconds > 0 else np.nan,
+                )
+            )
+        return summaries
+
+    def chrome_trace(self) -> dict:
+        """
+        The buffer in the Chrome trace event format: thread names, then one
+        complete event per span in order of their start (the buffer holds
+        them in the order they finished, so nested spans come first there).
+        """
+        pid = os.getpid()
+        with self._lock:
+            spans = list(self._spans)
+            thread_names = dict(self._thread_names)
+        trace_events = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in thread_names.items()
+        ]
+        for span in sorted(spans, key=lambda span: span.start_ns):
+            event = {
+                "name": span.name,
+                "cat": "fcs_plotter",
+                "ph": "X",
+                "ts": span.start_ns / 1000,
+                "dur": span.duration_ns / 1000,
+                "pid": pid,
+                "tid": span.thread_id,
+            }
+            if span.events is not None:
+                event["args"] = {"events": span.events}
+            trace_events.append(event)
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def dump_chrome_trace(self, path):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+
+_instrumentation_config = config.get("instrumentation", {})
+tracer = Tracer(
+    _instrumentation_config.get("capacity", 10000),
+    _instrumentation_config.get("enabled", True),
+)
@@ -0,0 +1,191 @@
+"""
+Parallel FCS file loading.
+
+Files are parsed into the columnar cache by a process (or thread) pool. The
+finished datasets are then opened from the cache on the GUI thread by the key
+the worker returns, which only memory-maps them, and handed to the window
+through Qt signals.
+While the first file of a batch is parsed, previews of its first events are
+read on a separate thread, growing until the cached dataset arrives.
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from PyQt6.QtCore import QObject, Qt, pyqtSignal
+
+from . import data_processing
+from .config import config
+from .data_processing import load_fcs_file, load_preview
+from .instrumentation import tracer
+from .logger_setup import logger
+
+
+def _parse_into_cache(file_path: str):
+    """Worker entry point: parses a file into the cache, returns its cache key or None."""
+    data, _ = load_fcs_file(file_path)
+    return data.directory.name if data is not None else None
+
+
+class ParallelLoader(QObject):
+    """
+    Loads FCS files in a worker pool and streams the results back.
+
+    Signals are emitted on the thread that owns the loader (the GUI thread):
+    ``file_loaded(file_path, data, metadata)`` per finished file,
+    ``file_previewed(file_path, preview, metadata)`` for every preview of a
+    file that is still loading (never after its ``file_loaded``),
+    ``file_failed(file_path)`` for files that could not be read,
+    ``progress(done, total)`` after every file and ``finished()`` when the
+    current batch is complete or cancelled.
+    """
+
+    file_loaded = pyqtSignal(str, object, object)
+    file_previewed = pyqtSignal(str, object, object)
+    file_failed = pyqtSignal(str)
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal()
+
+    # Internal: carries results from pool callback threads to the GUI thread
+    _file_done = pyqtSignal(int, str, object)
+    _preview_done = pyqtSignal(int, str, object, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        loading_config = config.get("loading", {})
+        self.executor_kind = loading_config.get("executor", "process")
+        self.max_workers = loading_config.get("max_workers") or os.cpu_count()
+        self.preview_events = loading_config.get("preview_events", 50000)
+        self.preview_max_events = loading_config.get("preview_max_events", 4000000)
+        self._executor = None
+        self._preview_executor = None
+        self._futures = {}
+        self._started = {}  # {file_path: perf_counter_ns at submission}
+        self._generation = 0
+        self._done = 0
+        self._total = 0
+        # Queued even from the GUI thread: a future that is already done runs its
+        # callback inside load(), which must not see the file finish yet
+        self._file_done.connect(self._on_file_done, Qt.ConnectionType.QueuedConnection)
+        self._preview_done.connect(self._on_preview_done)
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.executor_kind == "thread":
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            else:
+                # spawn avoids forking a process that is running Qt threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+        return self._executor
+
+    def is_loading(self) -> bool:
+        return bool(self._futures)
+
+    def is_pending(self, file_path: str) -> bool:
+        return file_path in self._futures
+
+    def load(self, file_paths):
+        """
+        Queues files for loading; files already queued are skipped. The first
+        new file is previewed while it loads.
+        """
+        new_paths = [path for path in file_paths if path not in self._futures]
+        if not new_paths:
+            return
+
+        if not self._futures:
+            self._done = 0
+            self._total = 0
+        self._total += len(new_paths)
+        logger.info(f"Loading {len(new_paths)} file(s) with {self.max_workers} workers")
+
+        executor = self._get_executor()
+        generation = self._generation
+        for file_path in new_paths:
+            self._started[file_path] = time.perf_counter_ns()
+            future = executor.submit(_parse_into_cache, file_path)
+            self._futures[file_path] = future
+            future.add_done_callback(partial(self._report, generation, file_path))
+        if self.preview_events:
+            if self._preview_executor is None:
+                self._preview_executor = ThreadPoolExecutor(max_workers=1)
+            self._preview_executor.submit(self._read_previews, generation, new_paths[0])
+        self.progress.emit(self._done, self._total)
+
+    def _read_previews(self, generation, file_path):
+        """
+        Runs on the preview thread: reads ever larger previews of a file,
+        growing eightfold up to preview_max_events, until the file is loaded.
+        """
+        n_events = self.preview_events
+        while generation == self._generation and file_path in self._futures:
+            preview, metadata = load_preview(file_path, n_events)
+            if preview is None:
+                return
+            self._preview_done.emit(generation, file_path, preview, metadata)
+            if preview.n_events == preview.total_events or n_events >= self.preview_max_events:
+                return
+            n_events = min(8 * n_events, self.preview_max_events)
+
+    def _report(self, generation, file_path, future):
+        # Runs on a pool thread; the signal queues the result to the GUI thread
+        ok = not future.cancelled() and future.exception() is None
+        self._file_done.emit(generation, file_path, future.result() if ok else None)
+
+    def cancel(self):
+        """Cancels queued files and ignores results of files still running."""
+        if not self._futures:
+            return
+        # Bump the generation first so callbacks fired by cancel() are ignored
+        self._generation += 1
+        futures, self._futures = self._futures, {}
+        self._started.clear()
+        for future in futures.values():
+            future.cancel()
+        logger.info("Loading cancelled")
+        self.finished.emit()
+
+    def shutdown(self):
+        self.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._preview_executor is not None:
+            self._preview_executor.shutdown(wait=False, cancel_futures=True)
+            self._preview_executor = None
+
+    def _on_preview_done(self, generation, file_path, preview, metadata):
+        # Dropped once the file itself has arrived (or loading was cancelled)
+        if generation == self._generation and file_path in self._futures:
+            self.file_previewed.emit(file_path, preview, metadata)
+
+    def _on_file_done(self, generation, file_path, key):
+        if generation != self._generation or file_path not in self._futures:
+            return
+        del self._futures[file_path]
+        self._done += 1
+
+        # Opening by key skips hashing the file again
+        data = data_processing.cache.open(key) if key is not None else None
+        metadata = data.metadata if data is not None else None
+        # From submission to the opened dataset, including time in the queue
+        tracer.record(
+            "load",
+            self._started.pop(file_path),
+            time.perf_counter_ns(),
+            data.n_events if data is not None else None,
+        )
+        if data is not None:
+            self.file_loaded.emit(file_path, data, metadata)
+        else:
+            self.file_failed.emit(file_path)
+
+        self.progress.emit(self._done, self._total)
+        if not self._futures:
+            self.finished.emit()
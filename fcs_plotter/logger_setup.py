@@ -1,6 +1,8 @@
+import atexit
 import logging
+import queue
 import sys
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from .config import config
 from .path_utils import get_project_root
 
@@ -15,8 +17,38 @@ class UTCFormatter(logging.Formatter):
         return dt.isoformat()
 
 
+class _AttachedHandlers(logging.Handler):
+    """
+    Passes records on to the handlers added with attach_handler. Handler.handle
+    holds this handler's lock around emit, and attaching and detaching take
+    the same lock, so the listener thread never sees a half-made change.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._handlers = ()
+
+    def add(self, handler: logging.Handler):
+        with self.lock:
+            self._handlers = (*self._handlers, handler)
+
+    def remove(self, handler: logging.Handler):
+        with self.lock:
+            self._handlers = tuple(h for h in self._handlers if h is not handler)
+
+    def emit(self, record):
+        for handler in self._handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
 def setup_logger():
-    """Sets up the application logger."""
+    """
+    Sets up the application logger.
+    Records are only queued by the logging thread; a listener thread writes
+    them to the console, the log file and any handler added with
+    attach_handler, so logging never waits for I/O or the GUI.
+    """
     log_config = config["logging"]
     log_file_path = get_project_root() / log_config["log_file"]
     log_file_path.parent.mkdir(exist_ok=True)
@@ -31,16 +63,34 @@ def setup_logger():
     # Console handler
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
 
     # File handler
     file_handler = RotatingFileHandler(
         log_file_path, maxBytes=10 * 1024 * 1024, backupCount=5
     )
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
 
-    return logger
+    attached = _AttachedHandlers()
+
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(
+        log_queue, console_handler, file_handler, attached, respect_handler_level=True
+    )
+    listener.start()
+    # Stopping drains the queue, so no record is lost at exit
+    atexit.register(listener.stop)
+    logger.addHandler(QueueHandler(log_queue))
+
+    return logger, listener, attached
+
+
+def attach_handler(handler: logging.Handler):
+    """Adds a handler that runs on the listener thread; safe from any thread."""
+    attached.add(handler)
+
+
+def detach_handler(handler: logging.Handler):
+    attached.remove(handler)
 
 
-logger = setup_logger()
+logger, listener, attached = setup_logger()
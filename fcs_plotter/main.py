@@ -1,27 +1,43 @@
+from .startup import startup_timer
 import sys
-import glob
-from PyQt6.QtWidgets import QApplication
-from .main_window import MainWindow
+from .path_utils import expand_input_patterns
 from .logger_setup import logger
 from .config import config
 
+startup_timer.mark("config and logging")
+
 
 def main():
     """Main function to run the application."""
     logger.info("Starting FCS Plotter application")
+    # Qt and the window modules are imported here so that importing the
+    # package (e.g. for batch mode) stays cheap
+    from PyQt6.QtCore import QTimer
+    from PyQt6.QtWidgets import QApplication
+
+    startup_timer.mark("PyQt6 import")
     app = QApplication(sys.argv)
+    startup_timer.mark("QApplication")
+
+    from .main_window import MainWindow
 
-    input_files = []
-    if "input_files" in config and config["input_files"]:
-        patterns = config["input_files"]
-        if isinstance(patterns, str):
-            patterns = [patterns]
+    startup_timer.mark("main window import")
 
-        for pattern in patterns:
-            input_files.extend(glob.glob(pattern, recursive=True))
+    # The expanded globs go through the same parallel loader as the file dialog
+    input_files = expand_input_patterns(config.get("input_files"))
 
-    main_win = MainWindow(input_files=input_files)
+    # In watch mode the same patterns are followed for files written later
+    watch_patterns = config.get("input_files") if config.get("watch", {}).get("enabled") else None
+
+    main_win = MainWindow(input_files=input_files, watch_patterns=watch_patterns)
+    startup_timer.mark("main window")
     main_win.show()
+
+    def first_paint():
+        startup_timer.mark("first paint")
+        logger.info(startup_timer.report())
+
+    QTimer.singleShot(0, first_paint)
     sys.exit(app.exec())
 
 
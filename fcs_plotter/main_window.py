@@ -1,4 +1,6 @@
 import logging
+import time
+from collections import deque
 from PyQt6.QtWidgets import (
     QMainWindow,
     QVBoxLayout,
@@ -8,21 +10,44 @@ from PyQt6.QtWidgets import (
     QComboBox,
     QLabel,
     QSplitter,
-    QTextEdit,
+    QPlainTextEdit,
     QSpinBox,
     QDoubleSpinBox,
     QHBoxLayout,
+    QProgressBar,
+    QTableWidget,
+    QTableWidgetItem,
+    QAbstractItemView,
+    QDockWidget,
+    QListWidget,
+    QListWidgetItem,
 )
-from PyQt6.QtCore import Qt
-from .data_processing import load_fcs_file, load_and_merge_fcs_files
+from PyQt6.QtCore import Qt, QTimer
+import numpy as np
+from .cache import SUBSAMPLE_MAX_EVENTS
+from .dataset_service import DatasetService
+from .event_store import EventStore
+from .grid import GridRequest
+from .grid_view import GridView
+from .gating import GateTree, PolygonGate, QuadrantGate, RectangleGate, quadrant_gates
+from .instrumentation import tracer
+from .logger_setup import attach_handler, detach_handler
+from .loader import ParallelLoader
+from .plot_worker import GateStatisticsWorker, PlotWorker
+from .preparation import PlotRequest, RENDER_MODES
+from .preview import PreviewDataset
+from .transforms import TRANSFORM_NAMES, make_transform
+from .watcher import FolderWatcher
 from .config import config
 from .plotting.factory import get_plotter, PLOTTER_NAMES
 
 logger = logging.getLogger("fcs_plotter")
 
+LOG_FLUSH_MS = 100  # interval of the batched appends to the log pane
+
 
 class MainWindow(QMainWindow):
-    def __init__(self, input_files=None):
+    def __init__(self, input_files=None, watch_patterns=None):
         super().__init__()
         self.setWindowTitle("FCS Plotter")
         self.setGeometry(100, 100, 1200, 800)
@@ -31,11 +56,47 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(self.central_widget)
         self.layout = QVBoxLayout(self.central_widget)
 
-        self.datasets = {}  # {file_path: (data, metadata)}
-        self.merged_df = None
+        self.event_store = EventStore()
+        self.prepared_plot = None
         self.current_file = None
         self.plotter = None
         self.plot_widget = None
+        self.gate_tree = GateTree()
+        self._shown_gates = None  # (view, gate names) last passed to the plotter
+
+        self.loader = ParallelLoader(self)
+        self.loader.progress.connect(self._on_load_progress)
+        self.loader.finished.connect(self._on_load_finished)
+
+        # Files arrive through the service: this window's own files, and the
+        # files loaded by other windows on the same cache
+        self.dataset_service = DatasetService(self.loader, self)
+        self.dataset_service.file_available.connect(self._on_file_loaded)
+        self.dataset_service.file_previewed.connect(self._on_file_previewed)
+        self.dataset_service.file_failed.connect(self._on_file_failed)
+        self.dataset_service.role_changed.connect(lambda role: self._start_watching())
+        self.dataset_service.start()
+
+        # New or rewritten files in the watched folders are loaded as they are
+        # completed; clients get them from the server window
+        self.watch_patterns = watch_patterns
+        self.folder_watcher = None
+        self._start_watching()
+
+        self.plot_worker = PlotWorker(self)
+        self.plot_worker.prepared.connect(self._on_plot_prepared)
+        self.plot_worker.start()
+
+        # Gate statistics are counted off the GUI thread. Edits that arrive
+        # together (the four quadrants of a moved split, a burst of loaded
+        # files) are submitted once, when the event loop is next idle.
+        self.statistics_worker = GateStatisticsWorker(self)
+        self.statistics_worker.prepared.connect(self._on_gate_statistics)
+        self.statistics_worker.start()
+        self._statistics_timer = QTimer(self)
+        self._statistics_timer.setSingleShot(True)
+        self._statistics_timer.setInterval(0)
+        self._statistics_timer.timeout.connect(self._submit_gate_statistics)
 
         self._setup_ui()
 
@@ -51,6 +112,24 @@ class MainWindow(QMainWindow):
         self.load_button.clicked.connect(self.load_file)
         control_layout.addWidget(self.load_button)
 
+        # Load progress
+        load_progress_layout = QHBoxLayout()
+        self.load_progress = QProgressBar()
+        self.load_progress.setFormat("Loaded %v/%m files")
+        self.load_progress.setVisible(False)
+        self.cancel_load_button = QPushButton("Cancel")
+        self.cancel_load_button.clicked.connect(self.loader.cancel)
+        self.cancel_load_button.setVisible(False)
+        # Share of the events behind the current plot while previews are shown
+        self.render_progress = QProgressBar()
+        self.render_progress.setRange(0, 1000)
+        self.render_progress.setFormat("Preview: %p% of events")
+        self.render_progress.setVisible(False)
+        load_progress_layout.addWidget(self.load_progress)
+        load_progress_layout.addWidget(self.render_progress)
+        load_progress_layout.addWidget(self.cancel_load_button)
+        control_layout.addLayout(load_progress_layout)
+
         self.x_channel_label = QLabel("X-Axis Channel:")
         self.x_channel_combo = QComboBox()
         self.x_channel_combo.currentTextChanged.connect(self.plot_data)
@@ -74,12 +153,34 @@ class MainWindow(QMainWindow):
         plot_params_layout.addWidget(self.plotter_label)
         plot_params_layout.addWidget(self.plotter_combo)
 
+        # Render mode
+        self.render_mode_label = QLabel("Render Mode:")
+        self.render_mode_combo = QComboBox()
+        self.render_mode_combo.addItems(RENDER_MODES)
+        render_mode = config["plotting"].get("render_mode", "scatter")
+        if render_mode in RENDER_MODES:
+            self.render_mode_combo.setCurrentText(render_mode)
+        self.render_mode_combo.currentTextChanged.connect(self.plot_data)
+        plot_params_layout.addWidget(self.render_mode_label)
+        plot_params_layout.addWidget(self.render_mode_combo)
+
+        # Display transform
+        self.transform_label = QLabel("Transform:")
+        self.transform_combo = QComboBox()
+        self.transform_combo.addItems(TRANSFORM_NAMES)
+        transform = config["plotting"].get("transform", "log")
+        if transform in TRANSFORM_NAMES:
+            self.transform_combo.setCurrentText(transform)
+        self.transform_combo.currentTextChanged.connect(self.plot_data)
+        plot_params_layout.addWidget(self.transform_label)
+        plot_params_layout.addWidget(self.transform_combo)
+
         # Spot size
         self.spot_size_label = QLabel("Spot Size:")
         self.spot_size_spinbox = QSpinBox()
         self.spot_size_spinbox.setRange(1, 100)
         self.spot_size_spinbox.setValue(config["plotting"]["spot_size"])
-        self.spot_size_spinbox.valueChanged.connect(self.plot_data)
+        self.spot_size_spinbox.valueChanged.connect(self.render_plot)
         plot_params_layout.addWidget(self.spot_size_label)
         plot_params_layout.addWidget(self.spot_size_spinbox)
 
@@ -89,7 +190,7 @@ class MainWindow(QMainWindow):
         self.spot_alpha_spinbox.setRange(0.01, 1.0)
         self.spot_alpha_spinbox.setSingleStep(0.05)
         self.spot_alpha_spinbox.setValue(config["plotting"]["spot_alpha"])
-        self.spot_alpha_spinbox.valueChanged.connect(self.plot_data)
+        self.spot_alpha_spinbox.valueChanged.connect(self.render_plot)
         plot_params_layout.addWidget(self.spot_alpha_label)
         plot_params_layout.addWidget(self.spot_alpha_spinbox)
 
@@ -115,6 +216,7 @@ class MainWindow(QMainWindow):
 
         # Ratio
         self.ratio_label = QLabel("Ratio:")
+        self._ratio_limit = 1.0  # of the shown plot; see _show_ratio_limit
         self.ratio_spinbox = QDoubleSpinBox()
         self.ratio_spinbox.setRange(0.01, 1.0)
         self.ratio_spinbox.setSingleStep(0.05)
@@ -125,25 +227,232 @@ class MainWindow(QMainWindow):
 
         control_layout.addLayout(plot_params_layout)
 
-        # Main splitter for plot and logs
+        # Gates: new gates are drawn on the current view, below the selected gate
+        gate_layout = QHBoxLayout()
+        gate_layout.addWidget(QLabel("Gates:"))
+        self.rectangle_gate_button = QPushButton("Rectangle")
+        self.rectangle_gate_button.clicked.connect(self.add_rectangle_gate)
+        self.polygon_gate_button = QPushButton("Polygon")
+        self.polygon_gate_button.clicked.connect(self.add_polygon_gate)
+        self.quadrant_gate_button = QPushButton("Quadrants")
+        self.quadrant_gate_button.clicked.connect(self.add_quadrant_gates)
+        self.remove_gate_button = QPushButton("Remove Gate")
+        self.remove_gate_button.clicked.connect(self.remove_selected_gate)
+        for button in (
+            self.rectangle_gate_button,
+            self.polygon_gate_button,
+            self.quadrant_gate_button,
+            self.remove_gate_button,
+        ):
+            gate_layout.addWidget(button)
+        gate_layout.addStretch()
+        self.grid_button = QPushButton("Channel Grid")
+        self.grid_button.setCheckable(True)
+        gate_layout.addWidget(self.grid_button)
+        self.performance_button = QPushButton("Performance")
+        self.performance_button.setCheckable(True)
+        gate_layout.addWidget(self.performance_button)
+        control_layout.addLayout(gate_layout)
+
+        # Main splitter for plot, gate statistics and logs
         self.main_splitter = QSplitter(Qt.Orientation.Vertical)
 
-        # Log display
-        self.log_display = QTextEdit()
+        # Gate statistics, one row per gate and file
+        self.gate_table = QTableWidget(0, 5)
+        self.gate_table.setHorizontalHeaderLabels(
+            ["Gate", "File", "Events", "% of Parent", "% of Total"]
+        )
+        self.gate_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.gate_table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.gate_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.gate_table.horizontalHeader().setStretchLastSection(True)
+        self.main_splitter.addWidget(self.gate_table)
+
+        # Log display; records are collected on the logging listener thread
+        # and appended in batches, keeping only the latest lines
+        max_lines = config["logging"].get("gui_max_lines", 5000)
+        self.log_display = QPlainTextEdit()
         self.log_display.setReadOnly(True)
+        self.log_display.setMaximumBlockCount(max_lines)
         self.main_splitter.addWidget(self.log_display)
-        self.log_handler = QtLogHandler(self.log_display)
-        logger.addHandler(self.log_handler)
+        self.log_handler = BufferedLogHandler(max_lines)
+        attach_handler(self.log_handler)
+        self.log_timer = QTimer(self)
+        self.log_timer.setInterval(LOG_FLUSH_MS)
+        self.log_timer.timeout.connect(self._flush_log)
+        self.log_timer.start()
 
         self.layout.addWidget(control_widget)
         self.layout.addWidget(self.main_splitter)
 
+        self._setup_grid_dock()
+        self._setup_performance_dock()
+
         # Initialize plotter
         plotter_backend = config["plotting"]["backend"]
         if plotter_backend in PLOTTER_NAMES:
             self.plotter_combo.setCurrentText(plotter_backend)
         self.change_plotter(self.plotter_combo.currentText())
 
+    def _setup_grid_dock(self):
+        """A dock with the grid of all pairs of the checked channels, hidden by default."""
+        grid_config = config.get("grid", {})
+        self.grid_channel_list = QListWidget()
+        self.grid_channel_list.setMaximumWidth(180)
+        self.grid_channel_list.itemChanged.connect(self._update_grid)
+        self.grid_panel_spinbox = QSpinBox()
+        self.grid_panel_spinbox.setRange(64, 512)
+        self.grid_panel_spinbox.setSingleStep(16)
+        self.grid_panel_spinbox.setValue(grid_config.get("panel_size", 160))
+        self.grid_view = GridView(self.grid_panel_spinbox.value())
+        self.grid_panel_spinbox.valueChanged.connect(self.grid_view.set_panel_size)
+        self.spot_alpha_spinbox.valueChanged.connect(self.grid_view.set_alpha)
+
+        channel_layout = QVBoxLayout()
+        channel_layout.addWidget(QLabel("Channels:"))
+        channel_layout.addWidget(self.grid_channel_list)
+        channel_layout.addWidget(QLabel("Panel Size:"))
+        channel_layout.addWidget(self.grid_panel_spinbox)
+        dock_widget = QWidget()
+        dock_layout = QHBoxLayout(dock_widget)
+        dock_layout.addLayout(channel_layout)
+        dock_layout.addWidget(self.grid_view, 1)
+        self.grid_dock = QDockWidget("Channel Grid", self)
+        self.grid_dock.setWidget(dock_widget)
+        self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.grid_dock)
+        # The controls leave little room beside the plot; the grid starts as
+        # its own window and can be docked from there
+        self.grid_dock.setFloating(True)
+        self.grid_dock.resize(900, 800)
+        self.grid_dock.hide()
+
+        self.grid_button.toggled.connect(self.grid_dock.setVisible)
+        self.grid_dock.visibilityChanged.connect(self._on_grid_visibility)
+
+    def _on_grid_visibility(self, visible):
+        self.grid_button.setChecked(visible)
+        if visible:
+            self._update_grid()
+
+    def _grid_channels(self) -> tuple:
+        return tuple(
+            self.grid_channel_list.item(i).text()
+            for i in range(self.grid_channel_list.count())
+            if self.grid_channel_list.item(i).checkState() == Qt.CheckState.Checked
+        )
+
+    def _update_grid(self):
+        """Shows the grid of the checked channels with the current parameters."""
+        if not self.grid_dock.isVisible():
+            return
+        channels = self._grid_channels()
+        if not self.event_store or not channels:
+            self.grid_view.clear()
+            return
+        request = GridRequest(
+            channels=channels,
+            quantile=self.quantile_spinbox.value(),
+            range_margin=self.range_margin_spinbox.value(),
+            ratio=self.ratio_spinbox.value(),
+            mode=self.render_mode_combo.currentText(),
+            transform=self._transform(),
+        )
+        self.grid_view.update_grid(
+            self.event_store.snapshot(), request, self.spot_alpha_spinbox.value()
+        )
+
+    def _update_grid_channels(self, channels):
+        """Lists the channels; new ones are checked up to grid.max_channels."""
+        max_channels = config.get("grid", {}).get("max_channels", 8)
+        checked = set(self._grid_channels())
+        listed = {
+            self.grid_channel_list.item(i).text() for i in range(self.grid_channel_list.count())
+        }
+        self.grid_channel_list.blockSignals(True)
+        self.grid_channel_list.clear()
+        for channel in channels:
+            item = QListWidgetItem(channel)
+            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+            if channel in checked or (channel not in listed and len(checked) < max_channels):
+                checked.add(channel)
+                item.setCheckState(Qt.CheckState.Checked)
+            else:
+                item.setCheckState(Qt.CheckState.Unchecked)
+            self.grid_channel_list.addItem(item)
+        self.grid_channel_list.blockSignals(False)
+
+    def _setup_performance_dock(self):
+        """A dock with the latency of every instrumented stage, hidden by default."""
+        self.performance_table = QTableWidget(0, 6)
+        self.performance_table.setHorizontalHeaderLabels(
+            ["Stage", "Count", "Last ms", "Mean ms", "Max ms", "Events/s"]
+        )
+        self.performance_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.performance_table.horizontalHeader().setStretchLastSection(True)
+        clear_button = QPushButton("Clear")
+        clear_button.clicked.connect(self._clear_performance)
+        save_trace_button = QPushButton("Save Trace...")
+        save_trace_button.clicked.connect(self.save_trace)
+        buttons = QHBoxLayout()
+        buttons.addWidget(clear_button)
+        buttons.addWidget(save_trace_button)
+        buttons.addStretch()
+
+        dock_widget = QWidget()
+        dock_layout = QVBoxLayout(dock_widget)
+        dock_layout.addWidget(self.performance_table)
+        dock_layout.addLayout(buttons)
+        self.performance_dock = QDockWidget("Performance", self)
+        self.performance_dock.setWidget(dock_widget)
+        self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.performance_dock)
+        self.performance_dock.hide()
+
+        # Refreshed only while visible
+        self.performance_timer = QTimer(self)
+        self.performance_timer.setInterval(500)
+        self.performance_timer.timeout.connect(self._update_performance)
+        self.performance_button.toggled.connect(self.performance_dock.setVisible)
+        self.performance_dock.visibilityChanged.connect(self._on_performance_visibility)
+
+    def _on_performance_visibility(self, visible):
+        self.performance_button.setChecked(visible)
+        if visible:
+            self._update_performance()
+            self.performance_timer.start()
+        else:
+            self.performance_timer.stop()
+
+    def _update_performance(self):
+        summaries = tracer.summary()
+        self.performance_table.setRowCount(len(summaries))
+        for row, stage in enumerate(summaries):
+            events_per_second = (
+                "" if np.isnan(stage.events_per_second) else f"{stage.events_per_second:,.0f}"
+            )
+            cells = [
+                stage.name,
+                str(stage.count),
+                f"{stage.last_ms:.1f}",
+                f"{stage.mean_ms:.1f}",
+                f"{stage.max_ms:.1f}",
+                events_per_second,
+            ]
+            for column, text in enumerate(cells):
+                self.performance_table.setItem(row, column, QTableWidgetItem(text))
+
+    def _clear_performance(self):
+        tracer.clear()
+        self._update_performance()
+
+    def save_trace(self):
+        """Writes the recorded spans as Chrome trace JSON (chrome://tracing, Perfetto)."""
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Save Trace", "fcs_plotter_trace.json", "Chrome Trace (*.json)"
+        )
+        if path:
+            tracer.dump_chrome_trace(path)
+            logger.info(f"Trace written to {path}")
+
     def change_plotter(self, plotter_name):
         if self.plot_widget:
             self.plot_widget.setParent(None)
@@ -152,7 +461,15 @@ class MainWindow(QMainWindow):
         self.plotter = get_plotter(plotter_name)
         self.plot_widget = self.plotter.get_widget()
         self.main_splitter.insertWidget(0, self.plot_widget)
-        self.plot_data()
+        for button in (
+            self.rectangle_gate_button,
+            self.polygon_gate_button,
+            self.quadrant_gate_button,
+        ):
+            button.setEnabled(self.plotter.supports_gates)
+        self._shown_gates = None
+        # The prepared data does not depend on the backend
+        self.render_plot()
 
     def load_file(self):
         file_paths, _ = QFileDialog.getOpenFileNames(
@@ -162,21 +479,94 @@ class MainWindow(QMainWindow):
             self.load_files(file_paths)
 
     def load_files(self, file_paths):
-        for file_path in file_paths:
-            if file_path not in self.datasets:
-                data, metadata = load_fcs_file(file_path)
-                if data is not None:
-                    self.datasets[file_path] = (data, metadata)
-
-        if self.datasets:
-            self.merged_df = load_and_merge_fcs_files(self.datasets)
+        """Loads files in the background; each one is plotted as it arrives."""
+        new_paths = [path for path in file_paths if path not in self.event_store]
+        if new_paths:
+            self.dataset_service.load(new_paths)
+
+    def _on_file_loaded(self, file_path, data, metadata):
+        self.event_store.add(file_path, data, metadata)
+        self._update_channel_selectors()
+        self.plot_data()
+        self._update_gate_statistics()
+
+    def _on_file_previewed(self, file_path, preview, metadata):
+        """Shows the first events of a file that is still loading."""
+        self.event_store.add(file_path, preview, metadata)
+        self._update_channel_selectors()
+        self.plot_data()
+
+    def _on_file_failed(self, file_path):
+        logger.warning(f"Skipping {file_path}: could not be loaded")
+        if file_path in self.event_store:
+            # Drop its preview
+            self.event_store.remove(file_path)
+            self._update_channel_selectors()
+            self.plot_data()
+
+    def _on_load_progress(self, done, total):
+        self.load_progress.setRange(0, total)
+        self.load_progress.setValue(done)
+        self.load_progress.setVisible(True)
+        self.cancel_load_button.setVisible(True)
+
+    def _on_load_finished(self):
+        self.load_progress.setVisible(False)
+        self.cancel_load_button.setVisible(False)
+        # Previews left over from a cancelled load
+        previews = [
+            path
+            for path in self.event_store.file_paths
+            if isinstance(self.event_store.dataset(path), PreviewDataset)
+        ]
+        if previews:
+            for path in previews:
+                self.event_store.remove(path)
             self._update_channel_selectors()
             self.plot_data()
 
+    def _flush_log(self):
+        lines = self.log_handler.take()
+        if lines:
+            self.log_display.appendPlainText("\n".join(lines))
+
+    def closeEvent(self, event):
+        detach_handler(self.log_handler)
+        self.log_timer.stop()
+        if self.folder_watcher is not None:
+            self.folder_watcher.stop()
+        self.dataset_service.stop()
+        self.grid_view.shutdown()
+        self.loader.shutdown()
+        self.plot_worker.stop()
+        self.statistics_worker.stop()
+        trace_file = config.get("instrumentation", {}).get("trace_file")
+        if trace_file:
+            tracer.dump_chrome_trace(trace_file)
+        super().closeEvent(event)
+
+    def _start_watching(self):
+        """Watches the input folders, unless a server window does it for this one."""
+        if (
+            not self.watch_patterns
+            or self.folder_watcher is not None
+            or self.dataset_service.role == "client"
+        ):
+            return
+        watch_config = config.get("watch", {})
+        self.folder_watcher = FolderWatcher(
+            self.watch_patterns,
+            watch_config.get("poll_interval", 1.0),
+            watch_config.get("settle_time", 2.0),
+            self,
+        )
+        self.folder_watcher.files_ready.connect(self.dataset_service.load)
+        self.folder_watcher.start()
+
     def _update_channel_selectors(self):
-        if self.merged_df is not None and not self.merged_df.empty:
-            # Get channels from the merged dataframe, excluding 'file_path'
-            channels = [col for col in self.merged_df.columns if col != "file_path"]
+        channels = self.event_store.channels
+        self._update_grid_channels(channels)
+        if channels:
             current_x = self.x_channel_combo.currentText()
             current_y = self.y_channel_combo.currentText()
 
@@ -207,7 +597,12 @@ class MainWindow(QMainWindow):
             self.y_channel_combo.blockSignals(False)
 
     def plot_data(self):
-        if self.merged_df is None or self.merged_df.empty or self.plotter is None:
+        """Queues the current channels and data parameters for preparation."""
+        if not self.event_store or self.plotter is None:
+            self._update_grid()
+            self.plot_worker.cancel()
+            self.prepared_plot = None
+            self.render_progress.setVisible(False)
             if self.plotter:
                 self.plotter.clear()
             return
@@ -216,30 +611,256 @@ class MainWindow(QMainWindow):
         y_channel = self.y_channel_combo.currentText()
 
         if x_channel and y_channel:
-            spot_size = self.spot_size_spinbox.value()
-            spot_alpha = self.spot_alpha_spinbox.value()
-            quantile = self.quantile_spinbox.value()
-            range_margin = self.range_margin_spinbox.value()
-            ratio = self.ratio_spinbox.value()
+            request = PlotRequest(
+                x_channel=x_channel,
+                y_channel=y_channel,
+                quantile=self.quantile_spinbox.value(),
+                range_margin=self.range_margin_spinbox.value(),
+                ratio=self.ratio_spinbox.value(),
+                mode=self.render_mode_combo.currentText(),
+                density_bins=config["plotting"].get("density_bins", 256),
+                outlier_threshold=config["plotting"].get("outlier_threshold", 0),
+                transform=self._transform(),
+            )
+            # The worker reads a snapshot so files can keep arriving meanwhile
+            self.plot_worker.submit(self.event_store.snapshot(), request)
+        self._update_grid()
+
+    def _transform(self):
+        """The selected display transform with its configured parameters."""
+        name = self.transform_combo.currentText()
+        params = config["plotting"].get("transform_params", {}).get(name)
+        return make_transform(name, params)
+
+    def _on_plot_prepared(self, generation, prepared):
+        if generation != self.plot_worker.generation:
+            return  # a newer request is already on its way
+        self.prepared_plot = prepared
+        self.render_progress.setValue(round(1000 * prepared.fraction))
+        self.render_progress.setVisible(prepared.fraction < 1.0)
+        self._show_ratio_limit(prepared.ratio_limit)
+        self.render_plot()
+
+    def _show_ratio_limit(self, ratio_limit: float):
+        """Marks the ratio as capped when a file has more events than its stored sample."""
+        if ratio_limit == self._ratio_limit:
+            return
+        self._ratio_limit = ratio_limit
+        if ratio_limit < 1.0:
+            logger.info(
+                f"Ratios above {ratio_limit:.3f} plot the same points: files are sampled "
+                f"from at most {SUBSAMPLE_MAX_EVENTS} events (cache.subsample_max_events)"
+            )
+            self.ratio_label.setText(f"Ratio (max {ratio_limit:.2f}):")
+            self.ratio_label.setToolTip(
+                f"The largest file is sampled from at most {SUBSAMPLE_MAX_EVENTS} events "
+                "(cache.subsample_max_events)"
+            )
+        else:
+            self.ratio_label.setText("Ratio:")
+            self.ratio_label.setToolTip("")
 
+    def render_plot(self):
+        """Redraws the last prepared data with the current style settings."""
+        if self.plotter is None or self.prepared_plot is None:
+            return
+        with tracer.span("upload", events=len(self.prepared_plot)):
             self.plotter.plot_data(
-                self.merged_df,
+                self.prepared_plot,
+                self.spot_size_spinbox.value(),
+                self.spot_alpha_spinbox.value(),
+            )
+        # Repaints requested by the plotter run before a zero timeout fires
+        paint_start = time.perf_counter_ns()
+        QTimer.singleShot(0, lambda: tracer.record("paint", paint_start, time.perf_counter_ns()))
+        self._show_gates()
+
+    def _view(self):
+        """The (x channel, y channel, transform) of the plotted data."""
+        data = self.prepared_plot
+        return data.x_channel, data.y_channel, data.transform
+
+    def _show_gates(self):
+        """Hands the plotter the gates drawn on the current view, if they changed."""
+        if self.plotter is None or not self.plotter.supports_gates:
+            return
+        if self.prepared_plot is None:
+            return
+        view = self._view()
+        shown = (view, tuple(self.gate_tree.gates))
+        if shown == self._shown_gates:
+            return  # the ROIs already on the plot track their own edits
+        self._shown_gates = shown
+        gates = [
+            gate
+            for gate in self.gate_tree
+            if (gate.x_channel, gate.y_channel, gate.transform) == view
+        ]
+        self.plotter.show_gates(gates, self._on_gate_edited)
+
+    def _selected_gate(self):
+        items = self.gate_table.selectedItems()
+        return items[0].data(Qt.ItemDataRole.UserRole) if items else None
+
+    def _new_gate_name(self, prefix):
+        # Quadrant gates are named after their split, e.g. "Quadrants 1 ++"
+        taken = set(self.gate_tree.gates)
+        taken.update(gate.split for gate in self.gate_tree if isinstance(gate, QuadrantGate))
+        n = 1
+        while f"{prefix} {n}" in taken:
+            n += 1
+        return f"{prefix} {n}"
+
+    def _add_gates(self, gates):
+        for gate in gates:
+            self.gate_tree.add(gate)
+        self._show_gates()
+        self._update_gate_statistics()
+
+    def _gate_frame(self):
+        """The center third of the view, as ((x0, x1), (y0, y1))."""
+        (x0, x1), (y0, y1) = self.plotter.view_range()
+        dx, dy = (x1 - x0) / 3, (y1 - y0) / 3
+        return (x0 + dx, x1 - dx), (y0 + dy, y1 - dy)
+
+    def add_rectangle_gate(self):
+        if self.prepared_plot is None:
+            return
+        x_channel, y_channel, transform = self._view()
+        (x0, x1), (y0, y1) = self._gate_frame()
+        self._add_gates(
+            [
+                RectangleGate(
+                    self._new_gate_name("Rectangle"),
+                    x_channel,
+                    y_channel,
+                    transform,
+                    self._selected_gate(),
+                    x_min=x0,
+                    x_max=x1,
+                    y_min=y0,
+                    y_max=y1,
+                )
+            ]
+        )
+
+    def add_polygon_gate(self):
+        """Adds a hexagon; drag its corners or click an edge to add one."""
+        if self.prepared_plot is None:
+            return
+        x_channel, y_channel, transform = self._view()
+        (x0, x1), (y0, y1) = self._gate_frame()
+        angles = np.linspace(0, 2 * np.pi, 6, endpoint=False)
+        vertices = np.column_stack(
+            [
+                (x0 + x1) / 2 + (x1 - x0) / 2 * np.cos(angles),
+                (y0 + y1) / 2 + (y1 - y0) / 2 * np.sin(angles),
+            ]
+        )
+        self._add_gates(
+            [
+                PolygonGate(
+                    self._new_gate_name("Polygon"),
+                    x_channel,
+                    y_channel,
+                    transform,
+                    self._selected_gate(),
+                    vertices=vertices,
+                )
+            ]
+        )
+
+    def add_quadrant_gates(self):
+        if self.prepared_plot is None:
+            return
+        x_channel, y_channel, transform = self._view()
+        (x0, x1), (y0, y1) = self._gate_frame()
+        self._add_gates(
+            quadrant_gates(
+                self._new_gate_name("Quadrants"),
                 x_channel,
                 y_channel,
-                spot_size,
-                spot_alpha,
-                quantile,
-                range_margin,
-                ratio,
+                transform,
+                (x0 + x1) / 2,
+                (y0 + y1) / 2,
+                parent=self._selected_gate(),
             )
+        )
 
-
-class QtLogHandler(logging.Handler):
-    def __init__(self, widget):
+    def remove_selected_gate(self):
+        name = self._selected_gate()
+        if name is None:
+            return
+        self.gate_tree.remove(name)
+        self._show_gates()
+        self._update_gate_statistics()
+
+    def _on_gate_edited(self, name, **geometry):
+        if name in self.gate_tree:
+            self.gate_tree.update(name, **geometry)
+            self._update_gate_statistics()
+
+    def _update_gate_statistics(self):
+        """Schedules counting the events of every gate and file."""
+        self._statistics_timer.start()
+
+    def _submit_gate_statistics(self):
+        if not self.gate_tree:
+            self.statistics_worker.cancel()
+            self._show_gate_statistics([])
+            return
+        self.statistics_worker.submit(self.event_store.snapshot(), self.gate_tree.snapshot())
+
+    def _on_gate_statistics(self, generation, rows):
+        if generation != self.statistics_worker.generation or self._statistics_timer.isActive():
+            return  # the gates or files changed since
+        self._show_gate_statistics(rows)
+
+    def _show_gate_statistics(self, rows):
+        """Fills the gate table with the event counts of every gate and file."""
+        selected = self._selected_gate()
+        self.gate_table.setRowCount(len(rows))
+        for i, row in enumerate(rows):
+            indent = "    " * row.depth
+            cells = [
+                indent + row.gate,
+                row.file_path.split("/")[-1],
+                f"{row.count:,}",
+                f"{row.percent_of_parent:.2f}",
+                f"{row.percent_of_total:.2f}",
+            ]
+            for column, text in enumerate(cells):
+                item = QTableWidgetItem(text)
+                item.setData(Qt.ItemDataRole.UserRole, row.gate)
+                if column >= 2:
+                    item.setTextAlignment(
+                        Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+                    )
+                self.gate_table.setItem(i, column, item)
+            if row.gate == selected and self._selected_gate() is None:
+                self.gate_table.selectRow(i)
+
+
+class BufferedLogHandler(logging.Handler):
+    """
+    Collects formatted records from any thread for the GUI to take in
+    batches. Only the latest `max_lines` are kept, matching what the log
+    pane can show.
+    """
+
+    def __init__(self, max_lines: int):
         super().__init__()
-        self.widget = widget
-        self.widget.setReadOnly(True)
+        self._lines = deque(maxlen=max_lines)
 
     def emit(self, record):
-        msg = self.format(record)
-        self.widget.append(msg)
+        self._lines.append(self.format(record))
+
+    def take(self) -> list:
+        """Removes and returns the collected lines, oldest first."""
+        lines = []
+        while self._lines:
+            try:
+                lines.append(self._lines.popleft())
+            except IndexError:
+                break
+        return lines
@@ -1,3 +1,4 @@
+import glob
 from pathlib import Path
 
 
@@ -23,3 +24,16 @@ def get_cache_dir() -> Path:
     cache_dir = get_project_root() / "cache"
     cache_dir.mkdir(exist_ok=True)
     return cache_dir
+
+
+def expand_input_patterns(patterns) -> list[str]:
+    """Expands a glob pattern or list of patterns into a list of file paths."""
+    if not patterns:
+        return []
+    if isinstance(patterns, str):
+        patterns = [patterns]
+
+    input_files = []
+    for pattern in patterns:
+        input_files.extend(glob.glob(pattern, recursive=True))
+    return input_files
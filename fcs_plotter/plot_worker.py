@@ -0,0 +1,114 @@
+"""
+Background plot preparation.
+
+PlotWorker runs prepare_plot on its own QThread, and GateStatisticsWorker
+counts the events of every gate on another. Requests are coalesced: while
+one is being prepared only the most recent pending request is kept, and a
+request that is superseded mid-way is cancelled, so bursts of spinbox changes
+or gate drags cost at most one extra preparation.
+"""
+
+import threading
+
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from .logger_setup import logger
+from .preparation import Cancelled, prepare_plot
+
+
+class CoalescingWorker(QThread):
+    """
+    Runs the latest submitted request off the GUI thread.
+    ``prepared(generation, result)`` is delivered on the GUI thread; results
+    whose generation is not the latest are dropped before emitting.
+    Subclasses implement _work.
+    """
+
+    prepared = pyqtSignal(int, object)
+
+    # Named in the log when a request fails
+    description = "request"
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._condition = threading.Condition()
+        self._pending = None  # (generation, store, request)
+        self._generation = 0
+        self._stopping = False
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def submit(self, store, request) -> int:
+        """Queues a request, replacing any request that has not started yet."""
+        with self._condition:
+            self._generation += 1
+            self._pending = (self._generation, store, request)
+            self._condition.notify()
+            return self._generation
+
+    def cancel(self):
+        """Drops the pending request and the result of the one in progress."""
+        with self._condition:
+            self._generation += 1
+            self._pending = None
+
+    def stop(self):
+        with self._condition:
+            self._stopping = True
+            self._pending = None
+            self._generation += 1
+            self._condition.notify()
+        self.wait()
+
+    def _is_stale(self, generation) -> bool:
+        return generation != self._generation
+
+    def _work(self, store, request, is_cancelled):
+        raise NotImplementedError
+
+    def run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._stopping:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+                generation, store, request = self._pending
+                self._pending = None
+
+            try:
+                result = self._work(store, request, lambda: self._is_stale(generation))
+            except Cancelled:
+                continue
+            except Exception as e:
+                logger.error(f"Failed to prepare {self.description}: {e}")
+                continue
+
+            if not self._is_stale(generation):
+                self.prepared.emit(generation, result)
+
+
+class PlotWorker(CoalescingWorker):
+    """Prepares plot data; requests are PlotRequests."""
+
+    description = "plot"
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._last_prepared = None  # reused when only the axis ranges change
+
+    def _work(self, store, request, is_cancelled):
+        prepared = prepare_plot(store, request, is_cancelled, previous=self._last_prepared)
+        self._last_prepared = prepared
+        return prepared
+
+
+class GateStatisticsWorker(CoalescingWorker):
+    """Counts gate events; requests are GateTree snapshots."""
+
+    description = "gate statistics"
+
+    def _work(self, store, gate_tree, is_cancelled):
+        return gate_tree.statistics(store, is_cancelled)
@@ -1,11 +1,14 @@
 from abc import ABC, abstractmethod
 from PyQt6.QtWidgets import QWidget
-import pandas as pd
+from ..preparation import PreparedPlot
 
 
 class BasePlotter(ABC):
     """Abstract base class for plotters."""
 
+    # Backends that can draw and edit gates override show_gates and view_range
+    supports_gates = False
+
     @abstractmethod
     def get_widget(self) -> QWidget:
         """Return the plot widget."""
@@ -14,19 +17,28 @@ class BasePlotter(ABC):
     @abstractmethod
     def plot_data(
         self,
-        df: pd.DataFrame,
-        x_channel: str,
-        y_channel: str,
+        data: PreparedPlot,  # sampled, filtered float32 arrays, axis ranges and, in density mode, the density image
         spot_size: int,  # Size of the spots in pixels
         spot_alpha: float,  # 0 to 1, where 0 is fully transparent and 1 is fully opaque
-        quantile: float,  # 0 to 1, ratio of data to include in the quantile plot range, larger values include more data
-        range_margin: float,  # 0 to 1, increases plot around the quantile range by this factor (e.g. 0.1 means 10% of the range on each side is added to the plot limits)
-        ratio: float,  # 0 to 1, ratio of points to plot
     ):
-        """Plot the data from the dataframe."""
+        """
+        Plot prepared data. Called on the GUI thread; must not do heavy data work.
+        If data.density is set, show it as an image and the points as outliers on top.
+        """
         pass
 
     @abstractmethod
     def clear(self):
         """Clear the plot."""
         pass
+
+    def view_range(self) -> tuple:
+        """The visible ((x_min, x_max), (y_min, y_max)) in display coordinates."""
+        raise NotImplementedError
+
+    def show_gates(self, gates, on_edited):
+        """
+        Draws the given gates as editable shapes. After an edit,
+        ``on_edited(name, **geometry)`` is called with the gate's new geometry.
+        """
+        raise NotImplementedError
@@ -1,21 +1,37 @@
-from .matplotlib_plotter import MatplotlibPlotter
-from .pyqtgraph_plotter import PyQtGraphPlotter
-from .fastplotlib_plotter import FastplotlibPlotter
+import importlib
+import time
 
+from ..logger_setup import logger
+from ..startup import startup_timer
+
+# Backends are imported only when selected: each one pulls in its own heavy
+# dependencies (seaborn/matplotlib, pyqtgraph, fastplotlib/wgpu).
 PLOTTERS = {
-    "pyqtgraph": PyQtGraphPlotter,
-    "matplotlib": MatplotlibPlotter,
-    "fastplotlib": FastplotlibPlotter,
+    "pyqtgraph": ".pyqtgraph_plotter:PyQtGraphPlotter",
+    "matplotlib": ".matplotlib_plotter:MatplotlibPlotter",
+    "fastplotlib": ".fastplotlib_plotter:FastplotlibPlotter",
 }
 
 PLOTTER_NAMES = list(PLOTTERS.keys())
 
 
+def get_plotter_class(name: str):
+    """Imports a backend's module on first use and returns its plotter class."""
+    target = PLOTTERS.get(name)
+    if target is None:
+        raise ValueError(f"Unknown plotter: {name}")
+    module_name, class_name = target.split(":")
+    start = time.perf_counter()
+    module = importlib.import_module(module_name, __package__)
+    elapsed = time.perf_counter() - start
+    if elapsed > 0.01:
+        logger.info(f"Imported {name} backend in {elapsed:.2f} s")
+    startup_timer.mark(f"{name} backend import")
+    return getattr(module, class_name)
+
+
 def get_plotter(name: str = "pyqtgraph"):
     """
     Factory function to get a plotter instance.
     """
-    plotter_class = PLOTTERS.get(name)
-    if plotter_class:
-        return plotter_class()
-    raise ValueError(f"Unknown plotter: {name}")
+    return get_plotter_class(name)()
@@ -1,17 +1,59 @@
 # start of ./plotting/fastplotlib_plotter.py
+import colorsys
+
 import fastplotlib as fpl
 import numpy as np
-import pandas as pd
 from PyQt6.QtWidgets import QWidget
-from pandas.plotting import autocorrelation_plot
 
 from .base import BasePlotter
+from ..preparation import PreparedPlot
+
+
+class _FileScatter:
+    """
+    A persistent scatter graphic for one file.
+    The position buffer is allocated with spare capacity; points past `count`
+    are NaN, which the GPU does not draw.
+    """
+
+    def __init__(self, graphic, count: int, capacity: int):
+        self.graphic = graphic
+        self.count = count
+        self.capacity = capacity
+        self.size = None
+        self.alpha = None
+        self.color = None
+
+    def resize(self, points: np.ndarray):
+        """
+        Shows the first len(points) points. The prepared points of a file are a
+        prefix of the same permutation for every ratio, so only the slice
+        between the old and new count has to be uploaded.
+        """
+        count = len(points)
+        if count > self.count:
+            self.graphic.data[self.count : count] = _positions(points[self.count :])
+        elif count < self.count:
+            self.graphic.data[count : self.count] = np.nan
+        self.count = count
+
+
+def _positions(points: np.ndarray, capacity: int = None) -> np.ndarray:
+    """(n, 2) points -> (capacity, 3) float32 positions, NaN-padded."""
+    capacity = len(points) if capacity is None else capacity
+    positions = np.full((capacity, 3), np.nan, dtype=np.float32)
+    positions[: len(points), :2] = points
+    positions[: len(points), 2] = 0.0
+    return positions
 
 
 class FastplotlibPlotter(BasePlotter):
     """
     A minimal, high-performance plotter using fastplotlib.
-    This version plots all points as a single scatter graphic with a default color.
+    Each file is drawn by its own persistent scatter graphic. Redraws update the
+    existing GPU buffers in place instead of re-creating the graphics.
+    Graphics are placed in display coordinates (log10 for log axes), so the
+    rulers show display values rather than data values.
     """
 
     def __init__(self):
@@ -23,11 +65,17 @@ class FastplotlibPlotter(BasePlotter):
 
         # Get the first subplot to add graphics to.
         self.subplot = self.figure[0, 0]
-        self.scatter_graphic = None
-
-        # Set log scale for axes, which is common for FCS data.
-        self.subplot.axes.x.scale = "log"
-        self.subplot.axes.y.scale = "log"
+        self.file_scatters = {}  # {dataset source: _FileScatter}; previews are separate sources
+        self._scatter_channels = None
+        self._camera_ranges = None
+        self.scatter_graphic = None  # density mode outliers
+        self.density_graphic = None
+        self.density_pyramid = None
+        self.density_bins = 256
+        self._density_view = None
+
+        # Checked every frame; re-reads pyramid tiles when the camera moved
+        self.subplot.add_animations(self._update_density_tiles)
 
     def get_widget(self) -> QWidget:
         """Return the underlying PyQt widget for the plot."""
@@ -35,77 +83,171 @@ class FastplotlibPlotter(BasePlotter):
 
     def plot_data(
             self,
-            df: pd.DataFrame,
-            x_channel: str,
-            y_channel: str,
+            data: PreparedPlot,
             spot_size: int,
-            spot_alpha: float,  # Note: spot_alpha is ignored in this minimal version
-            quantile: float,
-            range_margin: float,
-            ratio: float,
+            spot_alpha: float,
     ):
-        """Plots scatter data using a single, simple fastplotlib scatter graphic."""
-        self.clear()
-
-        if df is None or df.empty:
+        """
+        Plots one persistent scatter graphic per file, or the density image.
+        Size, alpha and colour changes are applied in place, and a ratio
+        change only uploads the points that were added or hidden.
+        """
+        if data is None:
+            self.clear()
+            return
+        if data.density is not None:
+            self.clear()
+            self._plot_density(data, spot_size, spot_alpha)
             return
 
-        df_plot = df.copy()
-
-        # Downsample data if ratio is less than 1.0
-        if ratio < 1.0:
-            df_plot = df_plot.sample(frac=ratio, random_state=1)
-
-        # Filter out non-positive values which cannot be displayed on a log scale
-        df_plot = df_plot[(df_plot[x_channel] > 0) & (df_plot[y_channel] > 0)]
-        if df_plot.empty:
-            return  # No valid data to plot
-
-        # Prepare data for a single scatter plot. No grouping, no custom colors.
-        data = df_plot[[x_channel, y_channel]].values.astype(np.float32)
-
-        # Add the single scatter graphic. fastplotlib will use a default color.
-        self.scatter_graphic = self.subplot.add_scatter(data=data, sizes=spot_size, alpha=spot_alpha)
-        print(self.scatter_graphic.axes)
-
-
-        # Calculate and set plot ranges based on quantiles
-        lower_q = (1 - quantile) / 2
-        upper_q = 1 - lower_q
+        self._clear_density()
+        self._plot_scatter(data, spot_size, spot_alpha)
 
-        x_min_q = df_plot[x_channel].quantile(lower_q)
-        x_max_q = df_plot[x_channel].quantile(upper_q)
-        x_range = x_max_q - x_min_q
-        if x_range <= 0:
-            x_range = x_max_q * 0.1 if x_max_q > 0 else 1.0
-        x_min = x_min_q - x_range * range_margin
-        x_max = x_max_q + x_range * range_margin
+        ranges = (data.x_range, data.y_range)
+        if ranges != self._camera_ranges:
+            self._camera_ranges = ranges
+            # The prepared points and ranges are display coordinates
+            self._set_camera(*data.x_range, *data.y_range)
 
-        y_min_q = df_plot[y_channel].quantile(lower_q)
-        y_max_q = df_plot[y_channel].quantile(upper_q)
-        y_range = y_max_q - y_min_q
-        if y_range <= 0:
-            y_range = y_max_q * 0.1 if y_max_q > 0 else 1.0
-        y_min = y_min_q - y_range * range_margin
-        y_max = y_max_q + y_range * range_margin
+        # Set labels, title, and grid
+        # self.subplot.axes.x.set_label(data.x_channel)
+        # self.subplot.axes.y.set_label(data.y_channel)
+        # self.subplot.set_title(f"{data.y_channel} vs {data.x_channel}")
+        # self.subplot.axes.x.set_grid(True)
+        # self.subplot.axes.y.set_grid(True)
 
+    def _plot_scatter(self, data: PreparedPlot, spot_size: int, spot_alpha: float):
+        channels = (data.x_channel, data.y_channel, data.transform)
+        if channels != self._scatter_channels:
+            # Different channels or transforms share no points with the
+            # current buffers
+            self._remove_file_scatters()
+            self._scatter_channels = channels
+
+        for source in list(self.file_scatters):
+            if source not in data.sources:
+                self.subplot.remove_graphic(self.file_scatters.pop(source).graphic)
+
+        colors = self._get_colors(len(data.sources))
+        for i, source in enumerate(data.sources):
+            in_file = data.file_slice(i)
+            points = np.column_stack([data.x[in_file], data.y[in_file]])
+            scatter = self.file_scatters.get(source)
+
+            if scatter is not None and len(points) <= scatter.capacity:
+                scatter.resize(points)
+            elif len(points):
+                # Grow geometrically so raising the ratio step by step does
+                # not reallocate the buffer every time
+                capacity = len(points)
+                if scatter is not None:
+                    capacity = max(capacity, 2 * scatter.capacity)
+                    self.subplot.remove_graphic(scatter.graphic)
+                graphic = self.subplot.add_scatter(
+                    data=_positions(points, capacity),
+                    sizes=spot_size,
+                    alpha=spot_alpha,
+                    colors=colors[i],
+                )
+                scatter = _FileScatter(graphic, len(points), capacity)
+                scatter.size, scatter.alpha, scatter.color = spot_size, spot_alpha, colors[i]
+                self.file_scatters[source] = scatter
+            else:
+                continue
+
+            if scatter.size != spot_size:
+                scatter.graphic.sizes = spot_size
+                scatter.size = spot_size
+            if scatter.alpha != spot_alpha:
+                scatter.graphic.alpha = spot_alpha
+                scatter.alpha = spot_alpha
+            if scatter.color != colors[i]:
+                scatter.graphic.colors = colors[i]
+                scatter.color = colors[i]
+
+    def _get_colors(self, n):
+        """Generate N distinct colors as RGBA tuples."""
+        return [colorsys.hsv_to_rgb(i / n, 1.0, 1.0) + (1.0,) for i in range(n)]
+
+    def _plot_density(self, data: PreparedPlot, spot_size: int, spot_alpha: float):
+        """
+        Shows the density histogram as an image. The bins are regular in
+        display coordinates, like the prepared points, so the image, the
+        outliers and the camera share one coordinate system.
+        """
+        density = data.density
+        self.density_pyramid = data.pyramid
+        self.density_bins = data.request.density_bins if data.request else 256
+        self._show_density_image(density)
+
+        if len(data):
+            points = np.column_stack([data.x, data.y])
+            self.scatter_graphic = self.subplot.add_scatter(
+                data=points, sizes=spot_size, alpha=spot_alpha, colors="w"
+            )
+
+        self._set_camera(*density.x_log_range, *density.y_log_range)
+        self._density_view = self._camera_view()
+
+    def _show_density_image(self, density):
+        if self.density_graphic is not None:
+            self.subplot.remove_graphic(self.density_graphic)
+        n_rows, n_cols = density.shape
+        x0, x1 = density.x_log_range
+        y0, y1 = density.y_log_range
+
+        image = np.nan_to_num(density.display_image(), nan=0.0)
+        self.density_graphic = self.subplot.add_image(data=image, cmap="viridis")
+        self.density_graphic.offset = (x0, y0, -1)
+        self.density_graphic.scale = ((x1 - x0) / n_cols, (y1 - y0) / n_rows, 1)
+
+    def _camera_view(self):
+        camera = self.subplot.camera
+        return camera.local.x, camera.local.y, camera.width, camera.height
+
+    def _update_density_tiles(self):
+        """Fetches the pyramid tiles for the visible range at the current zoom."""
+        if self.density_pyramid is None or self.density_graphic is None:
+            return
+        view = self._camera_view()
+        if view == self._density_view:
+            return
+        self._density_view = view
+        x, y, width, height = view
+        self._show_density_image(
+            self.density_pyramid.query(
+                (x - width / 2, x + width / 2),
+                (y - height / 2, y + height / 2),
+                self.density_bins,
+            )
+        )
+
+    def _set_camera(self, x_min, x_max, y_min, y_max):
         # Set camera to frame the desired data range
         self.subplot.camera.width = x_max - x_min
         self.subplot.camera.local.x = (x_min + x_max) / 2
         self.subplot.camera.height = y_max - y_min
         self.subplot.camera.local.y = (y_min + y_max) / 2
 
-        # Set labels, title, and grid
-        # self.subplot.axes.x.set_label(x_channel)
-        # self.subplot.axes.y.set_label(y_channel)
-        # self.subplot.set_title(f"{y_channel} vs {x_channel}")
-        # self.subplot.axes.x.set_grid(True)
-        # self.subplot.axes.y.set_grid(True)
+    def _remove_file_scatters(self):
+        for scatter in self.file_scatters.values():
+            self.subplot.remove_graphic(scatter.graphic)
+        self.file_scatters.clear()
+        self._scatter_channels = None
 
-    def clear(self):
-        """Removes all graphics from the plot."""
+    def _clear_density(self):
         if self.scatter_graphic is not None:
             self.subplot.remove_graphic(self.scatter_graphic)
             self.scatter_graphic = None
+        if self.density_graphic is not None:
+            self.subplot.remove_graphic(self.density_graphic)
+            self.density_graphic = None
+        self.density_pyramid = None
+
+    def clear(self):
+        """Removes all graphics from the plot."""
+        self._remove_file_scatters()
+        self._clear_density()
+        self._camera_ranges = None
         # Reset the view after clearing the plot.
         self.subplot.auto_scale(maintain_aspect=False)
\ No newline at end of file
@@ -1,10 +1,15 @@
 from PyQt6.QtWidgets import QWidget, QVBoxLayout
+import numpy as np
 import pandas as pd
 import seaborn as sns
 from matplotlib.figure import Figure
+from matplotlib.ticker import FuncFormatter, MaxNLocator
 from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
 
 from .base import BasePlotter
+from ..instrumentation import tracer
+from ..preparation import PreparedPlot
+from ..transforms import LogTransform
 
 
 class MatplotlibPlotter(BasePlotter):
@@ -23,60 +28,72 @@ class MatplotlibPlotter(BasePlotter):
 
     def plot_data(
         self,
-        df: pd.DataFrame,
-        x_channel: str,
-        y_channel: str,
+        data: PreparedPlot,
         spot_size: int,
         spot_alpha: float,
-        quantile: float,
-        range_margin: float,
-        ratio: float,
     ):
         self.clear()
-        # Use a copy to avoid SettingWithCopyWarning
-        df_plot = df.copy()
+        if data is None:
+            return
 
-        if ratio < 1.0:
-            df_plot = df_plot.sample(frac=ratio)
+        x_channel, y_channel = data.x_channel, data.y_channel
+        if data.density is not None:
+            self._plot_density(data.density)
 
-        df_plot["filename"] = df_plot["file_path"].apply(lambda x: x.split("/")[-1])
-        sns.scatterplot(
-            data=df_plot,
-            x=x_channel,
-            y=y_channel,
-            hue="filename",
-            s=spot_size,
-            alpha=spot_alpha,
-            ax=self.ax,
-            linewidth=0,
+        df_plot = pd.DataFrame(
+            {
+                x_channel: data.x,
+                y_channel: data.y,
+                "filename": pd.Categorical.from_codes(
+                    data.file_index, categories=data.file_names
+                ),
+            },
+            copy=False,
         )
-
-        # Calculate and set plot ranges
-        if not df_plot.empty:
-            lower_q = (1 - quantile) / 2
-            upper_q = 1 - lower_q
-
-            x_min = df_plot[x_channel].quantile(lower_q)
-            x_max = df_plot[x_channel].quantile(upper_q)
-            x_range = x_max - x_min
-            self.ax.set_xlim(
-                x_min - x_range * range_margin, x_max + x_range * range_margin
+        if len(data):
+            sns.scatterplot(
+                data=df_plot,
+                x=x_channel,
+                y=y_channel,
+                hue="filename",
+                s=spot_size,
+                alpha=spot_alpha,
+                ax=self.ax,
+                linewidth=0,
             )
 
-            y_min = df_plot[y_channel].quantile(lower_q)
-            y_max = df_plot[y_channel].quantile(upper_q)
-            y_range = y_max - y_min
-            self.ax.set_ylim(
-                y_min - y_range * range_margin, y_max + y_range * range_margin
-            )
+        # Set the precomputed plot ranges; points and ranges are display coordinates
+        if len(data) or data.density is not None:
+            self.ax.set_xlim(*data.x_range)
+            self.ax.set_ylim(*data.y_range)
 
-        self.ax.set_xscale("log")
-        self.ax.set_yscale("log")
+        transform = data.transform
+        for axis in (self.ax.xaxis, self.ax.yaxis):
+            if isinstance(transform, LogTransform):
+                axis.set_major_locator(MaxNLocator(integer=True))
+                axis.set_major_formatter(FuncFormatter(lambda v, _: f"$10^{{{v:g}}}$"))
+            else:
+                axis.set_major_formatter(FuncFormatter(lambda v, _: transform.tick_label(v)))
         self.ax.set_xlabel(x_channel)
         self.ax.set_ylabel(y_channel)
         self.ax.set_title(f"{y_channel} vs {x_channel}")
         self.ax.grid(True)
-        self.canvas.draw()
+        # Agg rasterizes here; the Qt paint event only copies the buffer
+        with tracer.span("render"):
+            self.canvas.draw()
+
+    def _plot_density(self, density):
+        """Draws the density histogram as a mesh on its bin edges."""
+        n_rows, n_cols = density.shape
+        x_edges = np.linspace(*density.x_log_range, n_cols + 1)
+        y_edges = np.linspace(*density.y_log_range, n_rows + 1)
+        self.ax.pcolormesh(
+            x_edges,
+            y_edges,
+            np.ma.masked_invalid(density.display_image()),
+            cmap="viridis",
+            shading="flat",
+        )
 
     def clear(self):
         self.ax.clear()
@@ -1,97 +1,193 @@
+from functools import partial
+
 import pyqtgraph as pg
+from PyQt6.QtCore import QRectF, QTimer
 from PyQt6.QtWidgets import QWidget
-import pandas as pd
 import numpy as np
 from .base import BasePlotter
+from ..gating import PolygonGate, QuadrantGate, RectangleGate
+from ..preparation import PreparedPlot
+from ..transforms import LogTransform
+
+GATE_PEN = pg.mkPen("r", width=2)
+GATE_EDIT_INTERVAL_MS = 50  # while a gate is dragged, report its edits at most this often
+
+
+class TransformAxisItem(pg.AxisItem):
+    """
+    An axis over display coordinates that labels its ticks with data values.
+    Log transforms use pyqtgraph's own log mode, which labels powers of ten.
+    """
+
+    def __init__(self, orientation, **kwargs):
+        super().__init__(orientation, **kwargs)
+        self.transform = None
+
+    def set_transform(self, transform):
+        self.transform = transform
+        self.setLogMode(isinstance(transform, LogTransform))
+        self.picture = None
+        self.update()
+
+    def tickStrings(self, values, scale, spacing):
+        if self.transform is None or self.logMode:
+            return super().tickStrings(values, scale, spacing)
+        return [self.transform.tick_label(value) for value in values]
 
 
 class PyQtGraphPlotter(BasePlotter):
     """A plotter using pyqtgraph."""
 
+    supports_gates = True
+
     def __init__(self):
         pg.setConfigOption("imageAxisOrder", "row-major")
         pg.setConfigOption("background", "w")
         pg.setConfigOption("foreground", "k")
-        self.plot_widget = pg.PlotWidget()
+        # Points are plotted in display coordinates; only the axes know the
+        # transform, so they can label the ticks with data values.
+        self.axes = {
+            "bottom": TransformAxisItem("bottom"),
+            "left": TransformAxisItem("left"),
+        }
+        self.plot_widget = pg.PlotWidget(axisItems=self.axes)
         self.plot_widget.showGrid(x=True, y=True)
         self.legend = self.plot_widget.addLegend()
-        self.scatter_items = []
+        # A single item holds the points of every file; colors are per point
+        self.scatter_item = pg.ScatterPlotItem(pxMode=True, pen=None, useCache=True)
+        self.plot_widget.addItem(self.scatter_item)
+        self._scatter_x = None  # the PreparedPlot arrays loaded into scatter_item
+        self._scatter_style = None  # (file_names, spot_size, alpha) of the brushes and legend
+        self._legend_names = None  # the file names of the legend's sample items
+        self._legend_samples = []
+        self.density_item = None
+        self.density_pyramid = None
+        self.density_bins = 256
+        self.gate_items = []
+
+        # Gate drags report the latest geometry once per interval
+        self._edit_timer = QTimer()
+        self._edit_timer.setSingleShot(True)
+        self._edit_timer.setInterval(GATE_EDIT_INTERVAL_MS)
+        self._edit_timer.timeout.connect(self._apply_pending_edit)
+        self._pending_edit = None
+
+        # Re-read density tiles for the visible range once panning/zooming pauses
+        self._tile_timer = QTimer()
+        self._tile_timer.setSingleShot(True)
+        self._tile_timer.setInterval(30)
+        self._tile_timer.timeout.connect(self._update_density_tiles)
+        self.plot_widget.getViewBox().sigRangeChanged.connect(self._tile_timer.start)
 
     def get_widget(self) -> QWidget:
         return self.plot_widget
 
     def plot_data(
         self,
-        df: pd.DataFrame,
-        x_channel: str,
-        y_channel: str,
+        data: PreparedPlot,
         spot_size: int,
         spot_alpha: float,
-        quantile: float,
-        range_margin: float,
-        ratio: float,
     ):
-        self.clear()
-        self.plot_widget.setLogMode(x=True, y=True)
+        self._clear_density()
+        if data is None:
+            self._clear_scatter()
+            return
 
-        # pyqtgraph alpha is 0-255
-        alpha = int(spot_alpha * 255)
-        colors = self._get_colors(len(df["file_path"].unique()))
+        if data.density is not None:
+            self.density_pyramid = data.pyramid
+            self.density_bins = data.request.density_bins if data.request else 256
+            self._plot_density(data.density)
 
-        df_to_plot = df
-        if ratio < 1.0:
-            df_to_plot = df.sample(frac=ratio)
+        self._plot_scatter(data, spot_size, spot_alpha)
 
-        for i, (file_path, group) in enumerate(df_to_plot.groupby("file_path")):
-            # Filter out non-positive values for log scale
-            plot_group = group[(group[x_channel] > 0) & (group[y_channel] > 0)]
-            if plot_group.empty:
-                continue
+        for axis in self.axes.values():
+            if axis.transform != data.transform:
+                axis.set_transform(data.transform)
+        if len(data) or data.density is not None:
+            self.plot_widget.setXRange(*data.x_range, padding=0)
+            self.plot_widget.setYRange(*data.y_range, padding=0)
 
-            color = colors[i]
-            brush = pg.mkBrush(color=color + (alpha,))
-            # log how many points are being plotted
-            print(f"Plotting {len(plot_group)} points for {file_path}")
+        self.plot_widget.setLabel("bottom", data.x_channel)
+        self.plot_widget.setLabel("left", data.y_channel)
+        self.plot_widget.setTitle(f"{data.y_channel} vs {data.x_channel}")
+
+    def _plot_scatter(self, data: PreparedPlot, spot_size: int, spot_alpha: float):
+        """
+        Loads the points of all files into the single scatter item. The
+        prepared points are already display coordinates and are only uploaded
+        when they change; size or alpha changes only replace the brushes.
+        """
+        # pyqtgraph alpha is 0-255
+        alpha = int(spot_alpha * 255)
+        style = (tuple(data.file_names), spot_size, alpha)
+        new_points = self._scatter_x is not data.x
+        if not new_points and style == self._scatter_style:
+            return
 
-            scatter = pg.ScatterPlotItem(
-                x=plot_group[x_channel].values,
-                y=plot_group[y_channel].values,
+        colors = self._get_colors(len(data.file_names))
+        brushes = np.array([pg.mkBrush(color=c + (alpha,)) for c in colors], dtype=object)
+        # One shared QBrush per file, looked up for every point at once
+        point_brushes = brushes[data.file_index]
+        if new_points:
+            self.scatter_item.setData(
+                x=data.x,
+                y=data.y,
                 size=spot_size,
-                pxMode=True,  # Use pixel mode for size
-                brush=brush,  # filling
-                pen=None,  # no outline
-                name=file_path.split("/")[-1],
-                useCache=True,
-            )
-            self.plot_widget.addItem(scatter)
-            self.scatter_items.append(scatter)
-
-        # Calculate and set plot ranges
-        if not df.empty:
-            lower_q = (1 - quantile) / 2
-            upper_q = 1 - lower_q
-
-            x_min = df[x_channel].quantile(lower_q)
-            x_max = df[x_channel].quantile(upper_q)
-            x_range = x_max - x_min
-            self.plot_widget.setXRange(
-                np.log10(x_min - x_range * range_margin),
-                np.log10(x_max + x_range * range_margin),
-                padding=0,
+                brush=point_brushes,
             )
+            self._scatter_x = data.x
+        else:
+            self.scatter_item.setSize(spot_size)
+            self.scatter_item.setBrush(point_brushes)
 
-            y_min = df[y_channel].quantile(lower_q)
-            y_max = df[y_channel].quantile(upper_q)
-            y_range = y_max - y_min
-            self.plot_widget.setYRange(
-                np.log10(y_min - y_range * range_margin),
-                np.log10(y_max + y_range * range_margin),
-                padding=0,
-            )
+        if style != self._scatter_style:
+            self._update_legend(data.file_names, brushes, spot_size)
+            self._scatter_style = style
+
+    def _update_legend(self, file_names, brushes, spot_size):
+        """
+        Shows one legend entry per file with a sample item of its color. The
+        items are only created when the files change; size or alpha changes
+        restyle them.
+        """
+        if tuple(file_names) != self._legend_names:
+            self.legend.clear()
+            self._legend_samples = []
+            for file_name in file_names:
+                sample = pg.ScatterPlotItem(pen=None)
+                self.legend.addItem(sample, file_name)
+                self._legend_samples.append(sample)
+            self._legend_names = tuple(file_names)
+        for sample, brush in zip(self._legend_samples, brushes):
+            sample.setSize(spot_size)
+            sample.setBrush(brush)
+        self.legend.update()
 
-        self.plot_widget.setLabel("bottom", x_channel)
-        self.plot_widget.setLabel("left", y_channel)
-        self.plot_widget.setTitle(f"{y_channel} vs {x_channel}")
+    def _plot_density(self, density):
+        """Shows the density histogram as an image spanning its bins."""
+        self.density_item = pg.ImageItem()
+        self.density_item.setColorMap(pg.colormap.get("viridis"))
+        self.density_item.setZValue(-1)  # keep outliers on top
+        self._set_density_image(density)
+        self.plot_widget.addItem(self.density_item)
+
+    def _set_density_image(self, density):
+        image = density.display_image()
+        levels = (0.0, float(np.nanmax(image))) if np.isfinite(image).any() else (0.0, 1.0)
+        self.density_item.setImage(image, levels=levels)
+        # The view coordinates are display coordinates, like the bins
+        x0, x1 = density.x_log_range
+        y0, y1 = density.y_log_range
+        self.density_item.setRect(QRectF(x0, y0, x1 - x0, y1 - y0))
+
+    def _update_density_tiles(self):
+        """Fetches the pyramid tiles for the visible range at the current zoom."""
+        if self.density_item is None or self.density_pyramid is None:
+            return
+        x_range, y_range = self.plot_widget.getViewBox().viewRange()
+        self._set_density_image(
+            self.density_pyramid.query(tuple(x_range), tuple(y_range), self.density_bins)
+        )
 
     def _get_colors(self, n):
         """Generate N distinct colors."""
@@ -102,9 +198,132 @@ class PyQtGraphPlotter(BasePlotter):
             colors.append(color)
         return colors
 
-    def clear(self):
-        for item in self.scatter_items:
+    def view_range(self) -> tuple:
+        x_range, y_range = self.plot_widget.getViewBox().viewRange()
+        return tuple(x_range), tuple(y_range)
+
+    def show_gates(self, gates, on_edited):
+        """
+        Draws rectangle and polygon gates as ROIs and each quadrant split as a
+        movable crosshair. Edits are reported while a gate is dragged, at
+        most every GATE_EDIT_INTERVAL_MS, and when the drag finishes.
+        """
+        self._clear_gates()
+        splits = {}
+        for gate in gates:
+            if isinstance(gate, RectangleGate):
+                roi = pg.RectROI(
+                    [gate.x_min, gate.y_min],
+                    [gate.x_max - gate.x_min, gate.y_max - gate.y_min],
+                    pen=GATE_PEN,
+                )
+                self._connect_edits(
+                    roi.sigRegionChanged,
+                    roi.sigRegionChangeFinished,
+                    partial(self._rectangle_edited, gate.name, on_edited),
+                )
+                label_position = (0, gate.y_max - gate.y_min)
+            elif isinstance(gate, PolygonGate):
+                roi = pg.PolyLineROI(gate.vertices.tolist(), closed=True, pen=GATE_PEN)
+                self._connect_edits(
+                    roi.sigRegionChanged,
+                    roi.sigRegionChangeFinished,
+                    partial(self._polygon_edited, gate.name, on_edited),
+                )
+                label_position = tuple(gate.vertices[0])
+            elif isinstance(gate, QuadrantGate):
+                splits.setdefault(gate.split, []).append(gate)
+                continue
+            else:
+                continue
+            # Child of the ROI, so it follows the gate while it is dragged
+            label = pg.TextItem(gate.name, color="r", anchor=(0, 1))
+            label.setParentItem(roi)
+            label.setPos(*label_position)
+            self.plot_widget.addItem(roi)
+            self.gate_items.append(roi)
+
+        for split, quadrants in splits.items():
+            names = [gate.name for gate in quadrants]
+            lines = (
+                pg.InfiniteLine(quadrants[0].x, angle=90, movable=True, pen=GATE_PEN, label=split),
+                pg.InfiniteLine(quadrants[0].y, angle=0, movable=True, pen=GATE_PEN),
+            )
+            for line in lines:
+                self._connect_edits(
+                    line.sigPositionChanged,
+                    line.sigPositionChangeFinished,
+                    partial(self._split_moved, names, lines, on_edited),
+                )
+                self.plot_widget.addItem(line)
+                self.gate_items.append(line)
+
+    def _connect_edits(self, changed, finished, edited):
+        """Reports `changed` through the edit timer and `finished` right away."""
+        changed.connect(partial(self._queue_edit, edited))
+        finished.connect(partial(self._finish_edit, edited))
+
+    def _queue_edit(self, edited, item):
+        self._pending_edit = partial(edited, item)
+        if not self._edit_timer.isActive():
+            self._edit_timer.start()
+
+    def _finish_edit(self, edited, item):
+        self._edit_timer.stop()
+        self._pending_edit = None
+        edited(item)
+
+    def _apply_pending_edit(self):
+        edit, self._pending_edit = self._pending_edit, None
+        if edit is not None:
+            edit()
+
+    @staticmethod
+    def _rectangle_edited(name, on_edited, roi):
+        (x, y), (width, height) = roi.pos(), roi.size()
+        on_edited(
+            name,
+            x_min=min(x, x + width),
+            x_max=max(x, x + width),
+            y_min=min(y, y + height),
+            y_max=max(y, y + height),
+        )
+
+    @staticmethod
+    def _polygon_edited(name, on_edited, roi):
+        points = [roi.mapToParent(handle.pos()) for handle in roi.getHandles()]
+        on_edited(name, vertices=np.array([(p.x(), p.y()) for p in points]))
+
+    @staticmethod
+    def _split_moved(names, lines, on_edited, _line):
+        x, y = lines[0].value(), lines[1].value()
+        for name in names:
+            on_edited(name, x=x, y=y)
+
+    def _clear_gates(self):
+        # A drag in progress keeps the geometry it reached
+        self._edit_timer.stop()
+        self._apply_pending_edit()
+        for item in self.gate_items:
             self.plot_widget.removeItem(item)
-        self.scatter_items.clear()
+        self.gate_items = []
+
+    def _clear_scatter(self):
+        self.scatter_item.clear()
+        self._scatter_x = None
+        self._scatter_style = None
+        self._legend_names = None
+        self._legend_samples = []
         if self.legend:
             self.legend.clear()
+
+    def _clear_density(self):
+        if self.density_item is not None:
+            self.plot_widget.removeItem(self.density_item)
+            self.density_item = None
+        self.density_pyramid = None
+
+    def clear(self):
+        self._clear_scatter()
+        self._clear_density()
+        self._clear_gates()
@@ -0,0 +1,328 @@
+"""
+Plot data preparation.
+
+Turns an EventStore and a set of plot parameters into ready-to-upload float32
+arrays and axis ranges, both in the display coordinates of the requested
+transform. This module is free of Qt so it can run on a worker
+thread (see plot_worker) or headless.
+"""
+
+from dataclasses import dataclass, field, replace
+
+import numpy as np
+
+from .density import DensityImage, outlier_mask, pair_bins
+from .derived import derived_columns
+from .instrumentation import tracer
+from .pyramid import HistogramPyramid, grid_covers
+from .sketch import QuantileSketch
+from .transforms import LOG, LogTransform, Transform
+
+SCATTER = "scatter"
+DENSITY = "density"
+RENDER_MODES = [SCATTER, DENSITY]
+
+
+@dataclass(frozen=True)
+class PlotRequest:
+    """The parameters that change which events are drawn and where."""
+
+    x_channel: str
+    y_channel: str
+    quantile: float  # 0 to 1, ratio of data to include in the quantile plot range
+    range_margin: float  # increases the plot range around the quantile range by this factor
+    ratio: float  # 0 to 1, ratio of points to plot
+    mode: str = SCATTER  # SCATTER or DENSITY
+    density_bins: int = 256  # bins per axis in density mode
+    outlier_threshold: int = 0  # density mode: also draw events in bins with fewer events; 0 disables
+    transform: Transform = LOG  # display transform of both axes
+    pyramids: bool = True  # density mode: read log axes from cached pyramids, built on first use
+
+
+@dataclass
+class PreparedPlot:
+    """Everything a plotter needs to draw one channel pair."""
+
+    x_channel: str
+    y_channel: str
+    x: np.ndarray  # float32 display coordinates of the valid events; outliers only in density mode
+    y: np.ndarray  # float32 display coordinates of the valid events; outliers only in density mode
+    file_index: np.ndarray  # uint32 index into file_names for every point
+    file_names: list = field(default_factory=list)
+    x_range: tuple = (0.0, 1.0)  # display coordinates
+    y_range: tuple = (0.0, 1.0)
+    request: PlotRequest = None
+    file_paths: tuple = ()
+    sources: tuple = ()  # dataset directory per file; a preview differs from the full file
+    fraction: float = 1.0  # share of the files' events available (see EventStore.loaded_fraction)
+    density: DensityImage = None  # set in density mode
+    pyramid: HistogramPyramid = None  # density mode: re-query this when the view changes
+    ratio_limit: float = 1.0  # scatter mode: the largest ratio every file can show
+
+    def __len__(self):
+        return len(self.x)
+
+    @property
+    def transform(self) -> Transform:
+        return self.request.transform if self.request is not None else LOG
+
+    def file_slice(self, i: int) -> slice:
+        """The points of file i; points are grouped by file, in file order."""
+        start, stop = np.searchsorted(self.file_index, [i, i + 1])
+        return slice(int(start), int(stop))
+
+
+class Cancelled(Exception):
+    """Raised when a newer request superseded the one being prepared."""
+
+
+def axis_range(
+    sketch: QuantileSketch, quantile: float, range_margin: float, transform: Transform = LOG
+) -> tuple:
+    """
+    Returns the (min, max) plot range of a channel in display coordinates:
+    the central `quantile` of the values the transform can show, widened by
+    `range_margin` on each side. Read from the precomputed sketch, so this
+    never touches events. For transforms that only show positive values the
+    lower bound is kept positive.
+    """
+    lower_q = (1 - quantile) / 2
+    upper_q = 1 - lower_q
+    v_min, v_max = sketch.quantile([lower_q, upper_q], positive_only=transform.positive_only)
+    if np.isnan(v_min):
+        lower, upper = 1.0, 10.0
+    else:
+        v_range = v_max - v_min
+        if v_range <= 0:
+            v_range = abs(v_max) * 0.1 if v_max != 0 else 1.0
+        lower = v_min - v_range * range_margin
+        upper = v_max + v_range * range_margin
+        if transform.positive_only and lower <= 0:
+            lower = v_min
+    display = transform.forward(np.array([lower, upper], dtype=np.float64))
+    return float(display[0]), float(display[1])
+
+
+def channel_sketch(store, channel: str) -> QuantileSketch:
+    """Merges the sketches of a channel over every file that has it."""
+    return QuantileSketch.merged(
+        store.dataset(path).sketch(channel)
+        for path in store.file_paths
+        if channel in store.dataset(path).channels
+    )
+
+
+def _same_points(a: PlotRequest, b: PlotRequest) -> bool:
+    """True if both requests select the same events (ranges may differ)."""
+    if a is None or b is None or a.mode != SCATTER or b.mode != SCATTER:
+        # Density bins span the axis ranges, so they always need rebinning
+        return False
+    return (a.x_channel, a.y_channel, a.ratio, a.transform) == (
+        b.x_channel,
+        b.y_channel,
+        b.ratio,
+        b.transform,
+    )
+
+
+def _ranges(store, request: PlotRequest) -> tuple:
+    with tracer.span("quantile"):
+        return _axis_ranges(store, request)
+
+
+def _axis_ranges(store, request: PlotRequest) -> tuple:
+    return tuple(
+        axis_range(
+            channel_sketch(store, channel),
+            request.quantile,
+            request.range_margin,
+            request.transform,
+        )
+        for channel in (request.x_channel, request.y_channel)
+    )
+
+
+def _plotted_files(store, request: PlotRequest):
+    """Yields (index, dataset) for every file that has both channels."""
+    for i, file_path in enumerate(store.file_paths):
+        dataset = store.dataset(file_path)
+        if request.x_channel in dataset.channels and request.y_channel in dataset.channels:
+            yield i, dataset
+
+
+def _concat(parts, dtype):
+    return np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+
+
+def prepare_plot(
+    store, request: PlotRequest, is_cancelled=lambda: False, previous=None
+) -> PreparedPlot:
+    """
+    Samples, filters and converts the requested channels of every file, or
+    bins them in density mode.
+    If `previous` holds the same points and only the quantile or range margin
+    changed, only the axis ranges are recomputed; if files were only added
+    since, only the new files are sampled.
+    Raises Cancelled as soon as `is_cancelled()` returns True.
+    """
+    with tracer.span("prepare", events=store.n_events):
+        return _prepare(store, request, is_cancelled, previous)
+
+
+def _prepare(store, request, is_cancelled, previous) -> PreparedPlot:
+    x_range, y_range = _ranges(store, request)
+    sources = tuple(str(store.dataset(path).directory) for path in store.file_paths)
+    if (
+        previous is not None
+        and previous.sources == sources
+        and _same_points(previous.request, request)
+    ):
+        return replace(previous, request=request, x_range=x_range, y_range=y_range)
+    appended = (
+        previous is not None
+        and _same_points(previous.request, request)
+        and len(previous.sources) < len(sources)
+        and sources[: len(previous.sources)] == previous.sources
+    )
+
+    prepared = PreparedPlot(
+        x_channel=request.x_channel,
+        y_channel=request.y_channel,
+        x=np.empty(0, dtype=np.float32),
+        y=np.empty(0, dtype=np.float32),
+        file_index=np.empty(0, dtype=np.uint32),
+        file_names=[path.split("/")[-1] for path in store.file_paths],
+        x_range=x_range,
+        y_range=y_range,
+        request=request,
+        file_paths=tuple(store.file_paths),
+        sources=sources,
+        fraction=store.loaded_fraction,
+    )
+    if request.mode == DENSITY:
+        return _prepare_density(prepared, store, request, is_cancelled)
+    return _prepare_scatter(prepared, store, request, is_cancelled, previous if appended else None)
+
+
+def _prepare_scatter(prepared, store, request, is_cancelled, previous=None) -> PreparedPlot:
+    """Samples every file, or only the files added after those in `previous`."""
+    xs, ys, indices = [], [], []
+    first = 0
+    ratio_limit = 1.0
+    if previous is not None:
+        xs, ys, indices = [previous.x], [previous.y], [previous.file_index]
+        first = len(previous.sources)
+        ratio_limit = previous.ratio_limit
+    for i, dataset in _plotted_files(store, request):
+        if i < first:
+            continue
+        if is_cancelled():
+            raise Cancelled()
+
+        # Display values and validity masks, transformed once per channel
+        dx = derived_columns.get(dataset, request.x_channel, request.transform)
+        dy = derived_columns.get(dataset, request.y_channel, request.transform)
+        # A prefix of the per-file permutation, at every ratio including 1.0:
+        # stable between redraws, and a larger ratio only appends points
+        sample = dataset.subsample(request.ratio)
+        with tracer.span("subsample", events=len(sample)):
+            x, y = dx.values[sample], dy.values[sample]
+            valid = dx.valid[sample] & dy.valid[sample]
+        ratio_limit = min(ratio_limit, dataset.max_ratio)
+
+        # e.g. non-positive values cannot be displayed on a log scale
+        xs.append(x[valid])
+        ys.append(y[valid])
+        indices.append(np.full(len(xs[-1]), i, dtype=np.uint32))
+
+    if is_cancelled():
+        raise Cancelled()
+
+    return replace(
+        prepared,
+        x=_concat(xs, np.float32),
+        y=_concat(ys, np.float32),
+        file_index=_concat(indices, np.uint32),
+        ratio_limit=ratio_limit,
+    )
+
+
+def _prepare_density(prepared, store, request, is_cancelled) -> PreparedPlot:
+    """
+    Counts every event of the pair on the density grid, so ratio does not
+    apply. On log axes the image is read from the pair's histogram pyramids
+    (built on first use, then cached); other transforms, previews, requests
+    without `pyramids` and channels with values beyond the pyramid grid bin
+    the display values directly. A second pass picks the outlier events.
+    """
+    files = list(_plotted_files(store, request))
+    if not files:
+        return prepared
+
+    pyramid = None
+    if (
+        request.pyramids
+        and isinstance(request.transform, LogTransform)
+        and all(dataset.supports_pyramids for _, dataset in files)
+        and _pyramids_cover(store, request)
+    ):
+        directories = []
+        for _, dataset in files:
+            if is_cancelled():
+                raise Cancelled()
+            directories.append(dataset.pyramid(request.x_channel, request.y_channel))
+        pyramid = HistogramPyramid(directories)
+        image = pyramid.query(prepared.x_range, prepared.y_range, request.density_bins)
+    else:
+        with tracer.span("density", events=sum(dataset.n_events for _, dataset in files)):
+            image = _display_histogram(files, prepared, request, is_cancelled)
+
+    xs, ys, indices = [], [], []
+    if request.outlier_threshold > 0:
+        for i, dataset in files:
+            if is_cancelled():
+                raise Cancelled()
+            x = derived_columns.get(dataset, request.x_channel, request.transform).values
+            y = derived_columns.get(dataset, request.y_channel, request.transform).values
+            flat_bins = pair_bins(
+                x, y, image.x_log_range, image.y_log_range, image.shape, display=True
+            )
+            outliers = outlier_mask(image, flat_bins, request.outlier_threshold)
+            xs.append(x[outliers])
+            ys.append(y[outliers])
+            indices.append(np.full(len(xs[-1]), i, dtype=np.uint32))
+
+    if is_cancelled():
+        raise Cancelled()
+
+    return replace(
+        prepared,
+        x=_concat(xs, np.float32),
+        y=_concat(ys, np.float32),
+        file_index=_concat(indices, np.uint32),
+        density=image,
+        pyramid=pyramid,
+    )
+
+
+def _pyramids_cover(store, request) -> bool:
+    """Whether every positive value of both channels falls on the pyramid grid."""
+    for channel in (request.x_channel, request.y_channel):
+        low, high = channel_sketch(store, channel).quantile([0.0, 1.0], positive_only=True)
+        if not np.isnan(low) and not grid_covers(low, high):
+            return False
+    return True
+
+
+def _display_histogram(files, prepared, request, is_cancelled) -> DensityImage:
+    """Bins the cached display values of every file over the axis ranges."""
+    bins = request.density_bins
+    counts = np.zeros(bins * bins, dtype=np.int64)
+    for _, dataset in files:
+        if is_cancelled():
+            raise Cancelled()
+        x = derived_columns.get(dataset, request.x_channel, request.transform).values
+        y = derived_columns.get(dataset, request.y_channel, request.transform).values
+        flat = pair_bins(x, y, prepared.x_range, prepared.y_range, bins, display=True)
+        counts += np.bincount(flat[flat >= 0], minlength=bins * bins)
+    return DensityImage(counts.reshape(bins, bins), prepared.x_range, prepared.y_range)
@@ -0,0 +1,66 @@
+"""
+Preview datasets for progressive display.
+
+A preview holds the first events of a file, read straight from the DATA
+segment right after the header, while the whole file is still being parsed
+into the cache. It has the same interface as a CachedDataset, so it can stand
+in for the file in the EventStore until the cached dataset replaces it.
+Previews of a file are read with growing sizes; each one is the start of the
+next, so the points on screen stay put while more are added.
+"""
+
+from pathlib import Path
+
+import numpy as np
+
+from .cache import SUBSAMPLE_MAX_EVENTS
+from .sketch import QuantileSketch
+
+
+class PreviewDataset:
+    """The first `n_events` of the `total_events` events of a file, in memory."""
+
+    # Density plots bin previews directly instead of building pyramids
+    supports_pyramids = False
+
+    def __init__(self, file_path: str, columns: dict, total_events: int, metadata: dict):
+        self.file_path = str(file_path)
+        self.channels = list(columns)
+        self.n_events = len(next(iter(columns.values()))) if columns else 0
+        self.total_events = int(total_events)
+        self.metadata = metadata
+        # Never created on disk; only tells the caches keyed by directory
+        # (derived columns, gate masks) apart from the cached dataset
+        self.directory = Path(f"{self.file_path}.preview-{self.n_events}")
+        self._columns = columns
+        self._sketches = {}
+
+    def __len__(self):
+        return self.n_events
+
+    def column(self, channel: str) -> np.ndarray:
+        return self._columns[channel]
+
+    def sketch(self, channel: str) -> QuantileSketch:
+        if channel not in self._sketches:
+            self._sketches[channel] = QuantileSketch.from_values(self._columns[channel])
+        return self._sketches[channel]
+
+    def derived_directory(self, channel: str, transform):
+        """Previews are never written to disk; their derived columns stay in memory."""
+        return None
+
+    def subsample(self, ratio: float) -> np.ndarray:
+        """
+        The first events, as many as the whole file will show at `ratio`, so a
+        preview is as dense as the final plot rather than `ratio` of itself.
+        """
+        n_sample = min(int(round(self.total_events * ratio)), SUBSAMPLE_MAX_EVENTS, self.n_events)
+        return np.arange(n_sample)
+
+    @property
+    def max_ratio(self) -> float:
+        """The largest ratio the cached dataset of the whole file will honour."""
+        if not self.total_events:
+            return 1.0
+        return min(1.0, SUBSAMPLE_MAX_EVENTS / self.total_events)
@@ -0,0 +1,159 @@
+"""
+Multi-resolution 2D histogram pyramids for zooming density plots.
+
+A pyramid holds the event counts of one channel pair on a fixed log10 grid at
+several levels of detail, each level half the resolution of the one below.
+Levels are stored tile by tile, so a query for the visible part of the plot
+only reads the tiles it needs from the memory-mapped files. All pyramids share
+the same grid, which lets the pyramids of several files be summed per tile.
+The grid spans every value of 32-bit integer data; channels whose sketches
+reach beyond it are binned directly instead (see preparation).
+"""
+
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from .density import DensityImage, pair_bins
+from .instrumentation import tracer
+
+LOG_RANGE = (-2.0, 10.0)  # log10 extent of every pyramid, on both axes
+BASE_BINS = 2048  # bins per axis at the finest level
+TILE = 256  # tile edge in bins; the coarsest level is a single tile
+N_LEVELS = int(np.log2(BASE_BINS // TILE)) + 1
+
+# Events binned per block while building
+BUILD_CHUNK_EVENTS = 1 << 20
+
+
+def level_bins(level: int) -> int:
+    return BASE_BINS >> level
+
+
+def grid_covers(low: float, high: float) -> bool:
+    """Whether positive values from `low` to `high` all fall on the pyramid grid."""
+    return 10.0 ** LOG_RANGE[0] <= low and high < 10.0 ** LOG_RANGE[1]
+
+
+def _to_tiles(counts: np.ndarray) -> np.ndarray:
+    """(bins, bins) -> (tiles_y, tiles_x, TILE, TILE), each tile contiguous."""
+    n_tiles = counts.shape[0] // TILE
+    return counts.reshape(n_tiles, TILE, n_tiles, TILE).transpose(0, 2, 1, 3).copy()
+
+
+def _from_tiles(tiles: np.ndarray) -> np.ndarray:
+    """(tiles_y, tiles_x, TILE, TILE) -> (tiles_y * TILE, tiles_x * TILE)."""
+    n_y, n_x = tiles.shape[:2]
+    return tiles.transpose(0, 2, 1, 3).reshape(n_y * TILE, n_x * TILE)
+
+
+class PyramidBuilder:
+    """
+    Accumulates the finest level of one channel pair's pyramid block by
+    block, so a pyramid can be built while a file is streamed.
+    """
+
+    def __init__(self):
+        self.counts = np.zeros(BASE_BINS * BASE_BINS, dtype=np.int64)
+
+    def update(self, x: np.ndarray, y: np.ndarray):
+        """Adds a block of data values (not log10) of the pair."""
+        flat = pair_bins(x, y, LOG_RANGE, LOG_RANGE, BASE_BINS)
+        self.counts += np.bincount(flat[flat >= 0], minlength=BASE_BINS * BASE_BINS)
+
+    def write_levels(self, directory: Path):
+        """
+        Derives the coarser levels by 2x2 summation and writes every level as
+        a tiled ``.npy`` into an existing directory.
+        """
+        level = self.counts.reshape(BASE_BINS, BASE_BINS).astype(np.uint32)
+        for i in range(N_LEVELS):
+            np.save(Path(directory) / f"level{i}.npy", _to_tiles(level))
+            half = level.shape[0] // 2
+            level = level.reshape(half, 2, half, 2).sum(axis=(1, 3), dtype=np.uint32)
+
+
+def build_pyramid(directory: Path, x: np.ndarray, y: np.ndarray):
+    """
+    Bins one file's channel pair block by block and writes its pyramid.
+    Built in a temporary directory and renamed into place.
+    """
+    directory = Path(directory)
+    directory.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=f".{directory.name}-", dir=directory.parent))
+    try:
+        builder = PyramidBuilder()
+        for start in range(0, len(x), BUILD_CHUNK_EVENTS):
+            stop = start + BUILD_CHUNK_EVENTS
+            builder.update(x[start:stop], y[start:stop])
+        builder.write_levels(tmp_dir)
+
+        try:
+            os.rename(tmp_dir, directory)
+        except OSError:
+            # Built concurrently by someone else
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+class HistogramPyramid:
+    """The tiled levels of one or more files' pyramids for a channel pair."""
+
+    def __init__(self, directories):
+        self._levels = [
+            [np.load(Path(d) / f"level{i}.npy", mmap_mode="r") for i in range(N_LEVELS)]
+            for d in directories
+        ]
+
+    @staticmethod
+    def choose_level(visible_decades: float, target_bins: int) -> int:
+        """The coarsest level that still shows `target_bins` across the view."""
+        bins_per_decade = BASE_BINS / (LOG_RANGE[1] - LOG_RANGE[0])
+        for level in reversed(range(N_LEVELS)):
+            if visible_decades * (bins_per_decade / 2**level) >= target_bins:
+                return level
+        return 0
+
+    def query(self, x_log_range: tuple, y_log_range: tuple, target_bins: int = 256) -> DensityImage:
+        """
+        Returns the counts covering the given log10 view at the matching level
+        of detail. Only the tiles that intersect the view are read.
+        """
+        with tracer.span("pyramid query"):
+            return self._query(x_log_range, y_log_range, target_bins)
+
+    def _query(self, x_log_range, y_log_range, target_bins) -> DensityImage:
+        visible = min(x_log_range[1] - x_log_range[0], y_log_range[1] - y_log_range[0])
+        level = self.choose_level(visible, target_bins)
+        bins = level_bins(level)
+        scale = bins / (LOG_RANGE[1] - LOG_RANGE[0])
+
+        def bin_span(log_range):
+            low = int(np.floor((log_range[0] - LOG_RANGE[0]) * scale))
+            high = int(np.ceil((log_range[1] - LOG_RANGE[0]) * scale))
+            low, high = max(low, 0), min(high, bins)
+            return low, max(high, low + 1)
+
+        x0, x1 = bin_span(x_log_range)
+        y0, y1 = bin_span(y_log_range)
+        tx0, tx1 = x0 // TILE, (x1 - 1) // TILE + 1
+        ty0, ty1 = y0 // TILE, (y1 - 1) // TILE + 1
+
+        counts = None
+        for levels in self._levels:
+            tiles = _from_tiles(levels[level][ty0:ty1, tx0:tx1])
+            counts = tiles.astype(np.int64) if counts is None else counts + tiles
+        if counts is None:
+            counts = np.zeros(((ty1 - ty0) * TILE, (tx1 - tx0) * TILE), dtype=np.int64)
+
+        counts = counts[y0 - ty0 * TILE : y1 - ty0 * TILE, x0 - tx0 * TILE : x1 - tx0 * TILE]
+        return DensityImage(
+            counts,
+            (LOG_RANGE[0] + x0 / scale, LOG_RANGE[0] + x1 / scale),
+            (LOG_RANGE[0] + y0 / scale, LOG_RANGE[0] + y1 / scale),
+        )
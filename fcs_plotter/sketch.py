@@ -0,0 +1,130 @@
+"""
+Mergeable per-channel quantile sketches.
+
+A QuantileSketch is a log-linear histogram: the bin of a value is taken
+straight from the exponent and the top mantissa bits of its float32
+representation, so building one is a bit shift and a bincount, every bin has
+the same relative width (about 1.6%) and two sketches merge by adding counts.
+Quantiles are read from the cumulative counts with linear interpolation inside
+the bin, which is far below a pixel at any sensible plot size.
+"""
+
+import numpy as np
+
+MANTISSA_BITS = 6  # bins per power of two = 2**MANTISSA_BITS
+EXP_MIN = -16  # |values| below 2**EXP_MIN count as zero
+EXP_MAX = 48  # |values| above 2**EXP_MAX go to the outermost bin
+
+_SHIFT = 23 - MANTISSA_BITS
+_OFFSET = (127 + EXP_MIN) << MANTISSA_BITS
+_N_SIDE = (EXP_MAX - EXP_MIN) << MANTISSA_BITS  # bins per sign
+ZERO_BIN = _N_SIDE
+N_BINS = 2 * _N_SIDE + 1  # negative bins, the zero bin, positive bins
+
+
+def _bin_edges():
+    magnitude = np.arange(_N_SIDE, dtype=np.int32) + _OFFSET
+    lower = (magnitude << _SHIFT).view(np.float32).astype(np.float64)
+    upper = ((magnitude + 1) << _SHIFT).view(np.float32).astype(np.float64)
+    low = np.concatenate([-upper[::-1], [0.0], lower])
+    high = np.concatenate([-lower[::-1], [0.0], upper])
+    return low, high
+
+
+BIN_LOW, BIN_HIGH = _bin_edges()
+
+
+def bin_indices(values: np.ndarray) -> np.ndarray:
+    """Returns the sketch bin of every value (NaNs must be removed first)."""
+    bits = np.asarray(values, dtype=np.float32).view(np.int32)
+    index = ((bits & 0x7FFFFFFF) >> _SHIFT) - _OFFSET
+    np.clip(index, -1, _N_SIDE - 1, out=index)
+    zero = index < 0
+    position = np.where(bits < 0, ZERO_BIN - 1 - index, ZERO_BIN + 1 + index)
+    position[zero] = ZERO_BIN
+    return position
+
+
+class QuantileSketch:
+    """A mergeable approximate quantile summary of one channel."""
+
+    def __init__(self, counts=None, minimum=np.inf, maximum=-np.inf):
+        self.counts = (
+            np.zeros(N_BINS, dtype=np.int64) if counts is None else np.asarray(counts)
+        )
+        self.minimum = float(minimum)
+        self.maximum = float(maximum)
+
+    @classmethod
+    def from_values(cls, values) -> "QuantileSketch":
+        sketch = cls()
+        sketch.update(values)
+        return sketch
+
+    @classmethod
+    def merged(cls, sketches) -> "QuantileSketch":
+        """Combines sketches of several files without touching any events."""
+        result = cls()
+        for sketch in sketches:
+            result.merge(sketch)
+        return result
+
+    @property
+    def count(self) -> int:
+        return int(self.counts.sum())
+
+    def update(self, values):
+        """Adds a block of values; NaNs are ignored."""
+        values = np.asarray(values)
+        if values.dtype.kind == "f":
+            values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        if not self.counts.flags.writeable:
+            self.counts = self.counts.copy()
+        self.counts += np.bincount(bin_indices(values), minlength=N_BINS)
+        self.minimum = min(self.minimum, float(values.min()))
+        self.maximum = max(self.maximum, float(values.max()))
+
+    def merge(self, other: "QuantileSketch"):
+        self.counts = self.counts + other.counts
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+
+    def quantile(self, q, positive_only: bool = False):
+        """
+        Returns the approximate q-quantile (q may be an array).
+        With positive_only, only values > 0 are considered, which is what a
+        log axis can show. Returns NaN when there is no data.
+        """
+        start = ZERO_BIN + 1 if positive_only else 0
+        counts = self.counts[start:]
+        cumulative = np.cumsum(counts)
+        total = cumulative[-1] if len(cumulative) else 0
+        q = np.asarray(q, dtype=np.float64)
+        if total == 0:
+            return np.full(q.shape, np.nan)[()]
+
+        target = np.clip(q, 0.0, 1.0) * total
+        # A target of 0 would stop in the empty bins before the first value
+        index = np.where(
+            target > 0,
+            np.searchsorted(cumulative, target, side="left"),
+            np.searchsorted(cumulative, 0, side="right"),
+        )
+        index = np.minimum(index, len(counts) - 1)
+        before = cumulative[index] - counts[index]
+        fraction = np.where(
+            counts[index] > 0, (target - before) / np.maximum(counts[index], 1), 0.0
+        )
+        low = BIN_LOW[start:][index]
+        high = BIN_HIGH[start:][index]
+        # The outermost bins also hold the values beyond 2**EXP_MAX
+        if np.isfinite(self.minimum):
+            low = np.where(start + index == 0, min(BIN_LOW[0], self.minimum), low)
+        if np.isfinite(self.maximum):
+            high = np.where(start + index == N_BINS - 1, max(BIN_HIGH[-1], self.maximum), high)
+        value = low + np.clip(fraction, 0.0, 1.0) * (high - low)
+
+        lowest = max(self.minimum, 0.0) if positive_only else self.minimum
+        return np.clip(value, lowest, self.maximum)[()]
@@ -0,0 +1,38 @@
+"""
+Startup timing.
+
+The application marks the end of each startup stage (imports, Qt setup,
+window construction, first paint); the report lists how long each stage took
+so regressions in import cost are easy to spot in the log.
+"""
+
+import time
+
+
+class StartupTimer:
+    """Collects (stage, seconds) pairs until the report is taken."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self._last = self.start
+        self.stages = []
+        self.reported = False
+
+    def mark(self, stage: str):
+        """Ends a stage; marks after the report are ignored."""
+        if self.reported:
+            return
+        now = time.perf_counter()
+        self.stages.append((stage, now - self._last))
+        self._last = now
+
+    def report(self) -> str:
+        self.reported = True
+        total = sum(seconds for _, seconds in self.stages)
+        stages = ", ".join(f"{stage} {seconds:.2f} s" for stage, seconds in self.stages)
+        return f"Startup took {total:.2f} s: {stages}"
+
+
+# Created on the first import of the package's modules, which is close enough
+# to the start of the process for the stages that matter
+startup_timer = StartupTimer()
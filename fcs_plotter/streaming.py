@@ -0,0 +1,94 @@
+"""
+Load-time accumulators fed one block of events at a time.
+
+A file is read once, front to back (see FCSFile.iter_chunks and
+ColumnarCache.write); every summary the application needs later is built in
+that pass with memory that does not grow with the number of events:
+per-channel moments, the subsample reservoir and, next to them, the quantile
+sketches (see sketch) and histogram pyramids (see pyramid).
+"""
+
+import numpy as np
+
+KEY_LIMIT = 1 << 32  # subsample keys are drawn from [0, KEY_LIMIT)
+
+
+class ChannelMoments:
+    """Running count, positive count, sum and sum of squares of the finite values."""
+
+    def __init__(self, finite=0, positive=0, total=0.0, total_squares=0.0):
+        self.finite = int(finite)
+        self.positive = int(positive)
+        self.total = float(total)
+        self.total_squares = float(total_squares)
+
+    def update(self, values):
+        block = np.asarray(values, dtype=np.float64)
+        block = block[np.isfinite(block)]
+        self.finite += len(block)
+        self.positive += int(np.count_nonzero(block > 0))
+        self.total += float(block.sum())
+        self.total_squares += float(np.square(block).sum())
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.finite if self.finite else np.nan
+
+    @property
+    def std(self) -> float:
+        if not self.finite:
+            return np.nan
+        variance = self.total_squares / self.finite - self.mean**2
+        return float(np.sqrt(max(variance, 0.0)))
+
+    def to_list(self) -> list:
+        return [self.finite, self.positive, self.total, self.total_squares]
+
+
+class SubsampleReservoir:
+    """
+    Draws a random key for every event and keeps the `capacity` events with
+    the smallest keys. Ordered by key, these are the start of a uniformly
+    random permutation of all events, so a prefix of any length up to
+    `capacity` is a uniform random sample.
+    Candidates are buffered and merged once they reach half the reservoir,
+    which keeps the work per block proportional to the block. Memory use is
+    a few times `capacity` 32-bit keys and indices, whatever the file size.
+    """
+
+    def __init__(self, capacity: int, seed: int, index_dtype=np.uint32):
+        self.capacity = int(capacity)
+        self._rng = np.random.default_rng(seed)
+        self._index_dtype = index_dtype
+        self._keys = np.empty(0, dtype=np.uint32)
+        self._index = np.empty(0, dtype=index_dtype)
+        self._pending = []  # [(keys, index)] not merged yet
+        self._n_pending = 0
+        self._threshold = KEY_LIMIT  # keys at or above this can never be kept
+
+    def update(self, start: int, n_events: int):
+        """Offers the events start .. start + n_events - 1."""
+        keys = self._rng.integers(0, KEY_LIMIT, n_events, dtype=np.uint64)
+        keep = keys < self._threshold
+        keys = keys[keep].astype(np.uint32)
+        index = np.flatnonzero(keep).astype(self._index_dtype)
+        index += self._index_dtype(start)
+        self._pending.append((keys, index))
+        self._n_pending += len(keys)
+        if self._n_pending >= self.capacity // 2:
+            self._merge()
+
+    def _merge(self):
+        keys = np.concatenate([self._keys] + [keys for keys, _ in self._pending])
+        index = np.concatenate([self._index] + [index for _, index in self._pending])
+        self._pending, self._n_pending = [], 0
+        if len(keys) > self.capacity:
+            kept = np.argpartition(keys, self.capacity - 1)[: self.capacity]
+            keys, index = keys[kept], index[kept]
+            self._threshold = int(keys.max())
+        self._keys, self._index = keys, index
+
+    def permutation(self) -> np.ndarray:
+        """The kept event indices in key order."""
+        self._merge()
+        return self._index[np.argsort(self._keys, kind="stable")]
@@ -0,0 +1,221 @@
+"""
+Display transforms shared by plot preparation, the axis ranges and the plotters.
+
+A transform maps data values to the display coordinates that are binned and
+drawn, and back for tick labels. Transforms are frozen dataclasses, so a
+transform and its parameters can key the derived-column cache directly.
+
+- linear: the values themselves
+- log: log10; only positive events can be shown
+- arcsinh: arcsinh(x / cofactor), linear around zero and logarithmic beyond
+- logicle: the Parks/Moore biexponential, scaled so that T maps to 1
+"""
+
+from dataclasses import dataclass
+from functools import cached_property
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class Transform:
+    """Base class; subclasses set `name` and implement forward and inverse."""
+
+    name = ""
+    positive_only = False  # True if only values > 0 can be displayed
+
+    def forward(self, values: np.ndarray) -> np.ndarray:
+        """Data values -> float32 display coordinates."""
+        raise NotImplementedError
+
+    def inverse(self, display: np.ndarray) -> np.ndarray:
+        """Display coordinates -> data values."""
+        raise NotImplementedError
+
+    def valid(self, values: np.ndarray) -> np.ndarray:
+        """The events this transform can display: finite, and > 0 if positive_only."""
+        valid = np.isfinite(values)
+        if self.positive_only:
+            valid &= values > 0
+        return valid
+
+    def tick_label(self, display: float) -> str:
+        return f"{float(self.inverse(np.float64(display))):.3g}"
+
+
+@dataclass(frozen=True)
+class LinearTransform(Transform):
+    name = "linear"
+
+    def forward(self, values):
+        return np.asarray(values, dtype=np.float32)
+
+    def inverse(self, display):
+        return np.asarray(display, dtype=np.float64)
+
+
+@dataclass(frozen=True)
+class LogTransform(Transform):
+    name = "log"
+    positive_only = True
+
+    def forward(self, values):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.log10(values, dtype=np.float32)
+
+    def inverse(self, display):
+        return 10.0 ** np.asarray(display, dtype=np.float64)
+
+
+@dataclass(frozen=True)
+class ArcsinhTransform(Transform):
+    name = "arcsinh"
+    cofactor: float = 150.0
+
+    def forward(self, values):
+        return np.arcsinh(
+            np.asarray(values, dtype=np.float32) * np.float32(1.0 / self.cofactor)
+        )
+
+    def inverse(self, display):
+        return self.cofactor * np.sinh(np.asarray(display, dtype=np.float64))
+
+
+# Logicle lookup table: display values are interpolated on a grid that is
+# uniform in arcsinh(x / k), on which the logicle curve is close to linear.
+LOGICLE_TABLE_SIZE = 4097
+LOGICLE_MAX_DISPLAY = 1.25  # the table covers data up to inverse(1.25)
+LOGICLE_HALLEY_STEPS = 8
+# Events per block of LogicleTransform.forward; the scratch arrays of a block
+# stay in the CPU cache instead of making a dozen passes over memory
+LOGICLE_CHUNK_EVENTS = 1 << 18
+
+
+def _solve_logicle_d(b: float, w: float) -> float:
+    """Solves 2 (ln d - ln b) + w (b + d) = 0 for d in (0, b] by bisection."""
+    if w == 0:
+        return b
+    low, high = 0.0, b
+    for _ in range(100):
+        d = (low + high) / 2
+        if 2 * (np.log(d) - np.log(b)) + w * (b + d) > 0:
+            high = d
+        else:
+            low = d
+    return (low + high) / 2
+
+
+@dataclass(frozen=True)
+class LogicleTransform(Transform):
+    """
+    T: top of the data scale, W: width of the linear region in decades,
+    M: decades covered at full scale, A: additional negative decades.
+    """
+
+    name = "logicle"
+    T: float = 262144.0
+    W: float = 0.5
+    M: float = 4.5
+    A: float = 0.0
+
+    @cached_property
+    def _params(self) -> tuple:
+        w = self.W / (self.M + self.A)
+        x2 = self.A / (self.M + self.A)
+        x1 = x2 + w
+        x0 = x2 + 2 * w
+        b = (self.M + self.A) * np.log(10.0)
+        d = _solve_logicle_d(b, w)
+        c_a = np.exp(x0 * (b + d))
+        mf_a = np.exp(b * x1) - c_a / np.exp(d * x1)
+        a = self.T / (np.exp(b) - mf_a - c_a / np.exp(d))
+        return a, b, c_a * a, d, -mf_a * a, x1
+
+    def _biexponential(self, y: np.ndarray) -> np.ndarray:
+        """Data value for display values y >= x1."""
+        a, b, c, d, f, _ = self._params
+        return a * np.exp(b * y) - c * np.exp(-d * y) + f
+
+    def inverse(self, display):
+        x1 = self._params[5]
+        display = np.asarray(display, dtype=np.float64)
+        # The curve is point-symmetric around (x1, 0)
+        negative = display < x1
+        reflected = np.where(negative, 2 * x1 - display, display)
+        values = self._biexponential(reflected)
+        return np.where(negative, -values, values)
+
+    @cached_property
+    def _table(self) -> tuple:
+        """
+        Returns (k, u0, 1 / du, y, dy): display values y at the grid points
+        u0 + i du of u = arcsinh(x / k), solved by Halley iteration.
+        """
+        a, b, c, d, f, x1 = self._params
+        k = float(self._biexponential(np.float64(x1 + self.W / (self.M + self.A))))
+        k = k if k > 0 else 1.0
+        u_max = float(np.arcsinh(self.inverse(LOGICLE_MAX_DISPLAY) / k))
+        u = np.linspace(-u_max, u_max, LOGICLE_TABLE_SIZE)
+        target = np.abs(k * np.sinh(u))
+
+        # Start from a dense interpolation of the inverse, then refine the
+        # positive branch; negative data values mirror it around x1.
+        guess_y = np.linspace(x1, LOGICLE_MAX_DISPLAY, 65537)
+        y = np.interp(target, self._biexponential(guess_y), guess_y)
+        for _ in range(LOGICLE_HALLEY_STEPS):
+            exp_b, exp_d = a * np.exp(b * y), c * np.exp(-d * y)
+            residual = exp_b - exp_d + f - target
+            slope = b * exp_b + d * exp_d
+            curvature = b * b * exp_b - d * d * exp_d
+            y = y - 2 * residual * slope / (2 * slope * slope - residual * curvature)
+        y = np.where(u < 0, 2 * x1 - y, y)
+
+        y = y.astype(np.float32)
+        return (
+            np.float32(1.0 / k),
+            np.float32(-u_max),
+            np.float32((LOGICLE_TABLE_SIZE - 1) / (2 * u_max)),
+            y,
+            np.append(np.diff(y), np.float32(0.0)),
+        )
+
+    def forward(self, values):
+        inv_k, u0, inv_du, y, dy = self._table
+        values = np.asarray(values)
+        result = np.empty(values.shape, dtype=np.float32)
+        flat_values, flat_result = values.reshape(-1), result.reshape(-1)
+        n = min(len(flat_values), LOGICLE_CHUNK_EVENTS)
+        whole = np.empty(n, dtype=np.float32)
+        index = np.empty(n, dtype=np.intp)
+        entry = np.empty(n, dtype=np.float32)
+        for start in range(0, len(flat_values), LOGICLE_CHUNK_EVENTS):
+            # Table position of every value, computed in the result block
+            position = flat_result[start : start + LOGICLE_CHUNK_EVENTS]
+            m = len(position)
+            np.multiply(flat_values[start : start + m], inv_k, out=position, dtype=np.float32)
+            np.arcsinh(position, out=position)
+            position -= u0
+            position *= inv_du
+            # NaN stays NaN through the clip and the interpolation; its index
+            # is clipped to the table by take
+            np.clip(position, 0, LOGICLE_TABLE_SIZE - 1, out=position)
+            np.floor(position, out=whole[:m])
+            with np.errstate(invalid="ignore"):
+                np.copyto(index[:m], whole[:m], casting="unsafe")
+            position -= whole[:m]
+            position *= dy.take(index[:m], mode="clip", out=entry[:m])
+            position += y.take(index[:m], mode="clip", out=entry[:m])
+        return result
+
+
+TRANSFORMS = {
+    cls.name: cls
+    for cls in (LinearTransform, LogTransform, ArcsinhTransform, LogicleTransform)
+}
+TRANSFORM_NAMES = list(TRANSFORMS)
+LOG = LogTransform()
+
+
+def make_transform(name: str, params: dict = None) -> Transform:
+    """Creates a transform by name, e.g. from the configuration."""
+    return TRANSFORMS[name](**(params or {}))
@@ -0,0 +1,247 @@
+"""
+Watch mode for live acquisition directories.
+
+FolderWatcher follows the directories of the ``input_files`` patterns and
+reports ``.fcs`` files that appear or change there. On Linux the directories
+are watched with inotify (through ctypes, read from a QSocketNotifier, so
+nothing polls while nothing happens); elsewhere, or if inotify is not
+available, the patterns are re-expanded every ``poll_interval`` seconds.
+
+A cytometer writes a file over a while, so a reported file is only a
+candidate: it is handed on once its size and mtime have not changed for
+``settle_time`` seconds and it is as long as its HEADER and TEXT segments say
+(see fcs_reader.declared_size).
+"""
+
+import ctypes
+import ctypes.util
+import fnmatch
+import glob
+import os
+import struct
+import time
+from pathlib import Path
+
+from PyQt6.QtCore import QObject, QSocketNotifier, QTimer, pyqtSignal
+
+from .fcs_reader import HEADER_SIZE, declared_size
+from .logger_setup import logger
+from .path_utils import expand_input_patterns
+
+# inotify(7) event masks
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len; followed by the name
+
+
+class _Inotify:
+    """A non-blocking inotify instance; raises OSError if there is none."""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self._libc = libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._directories = {}  # {watch descriptor: directory}
+
+    def add_watch(self, directory: str):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"Cannot watch {directory}")
+        self._directories[wd] = directory
+
+    def read(self) -> list:
+        """Returns the pending (path, mask) events; path is None on overflow."""
+        try:
+            buffer = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = _EVENT.unpack_from(buffer, offset)
+            offset += _EVENT.size
+            name = buffer[offset : offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                events.append((None, mask))
+            elif wd in self._directories:
+                events.append((os.path.join(self._directories[wd], os.fsdecode(name)), mask))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _split_pattern(pattern: str) -> tuple[str, bool]:
+    """The directory a glob pattern starts in, and whether it spans subdirectories."""
+    parts = Path(pattern).parts
+    for i, part in enumerate(parts):
+        if glob.has_magic(part):
+            base = Path(*parts[:i]) if i else Path(".")
+            return str(base), i < len(parts) - 1
+    return str(Path(pattern).parent), False
+
+
+def _matches(path: str, patterns: list) -> bool:
+    for pattern in patterns:
+        # glob's "**/" also matches no directory at all
+        if fnmatch.fnmatch(path, pattern) or fnmatch.fnmatch(path, pattern.replace("**/", "")):
+            return True
+    return False
+
+
+def _stat(path: str):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class _SettleTracker:
+    """
+    The candidate files of a FolderWatcher. A candidate is ready once its
+    size and mtime have not changed for `settle_time` seconds and it is as
+    long as its HEADER and TEXT segments say (a file shorter than the HEADER
+    is never ready). Free of Qt; the caller passes the time.
+    """
+
+    def __init__(self, settle_time: float):
+        self.settle_time = settle_time
+        self.known = {}  # {path: (size, mtime_ns)} when last reported or seen at start
+        self.pending = {}  # {path: ((size, mtime_ns), monotonic time it was first seen so)}
+
+    def mark_known(self, path: str):
+        """Takes a file as already loaded; it is only reported again if it changes."""
+        self.known[path] = _stat(path)
+
+    def add(self, path: str):
+        self.pending.setdefault(path, (None, 0.0))
+
+    def scan(self, paths):
+        """Takes every file that is new or changed as a candidate."""
+        for path in paths:
+            if path not in self.pending and _stat(path) != self.known.get(path):
+                self.pending[path] = (None, 0.0)
+
+    def check(self, now: float) -> list:
+        """Returns the candidates that became ready by monotonic time `now`."""
+        ready = []
+        for path, (seen, since) in list(self.pending.items()):
+            stat = _stat(path)
+            if stat is None:
+                del self.pending[path]  # removed again
+            elif stat != seen:
+                self.pending[path] = (stat, now)
+            elif now - since >= self.settle_time:
+                size = declared_size(path)
+                if stat[0] < (HEADER_SIZE if size is None else size):
+                    continue  # still being written, only more slowly
+                del self.pending[path]
+                if stat != self.known.get(path):
+                    self.known[path] = stat
+                    ready.append(path)
+        return ready
+
+
+class FolderWatcher(QObject):
+    """
+    Emits ``files_ready(file_paths)`` on the GUI thread with files matching
+    `patterns` that were written completely since start(). Files present at
+    start() are taken as already loaded; they are reported again if they
+    change.
+    """
+
+    files_ready = pyqtSignal(list)
+
+    def __init__(self, patterns, poll_interval: float = 1.0, settle_time: float = 2.0, parent=None):
+        super().__init__(parent)
+        self.patterns = [patterns] if isinstance(patterns, str) else list(patterns)
+        self.patterns = [os.path.abspath(pattern) for pattern in self.patterns]
+        self._files = _SettleTracker(settle_time)
+        self._inotify = None
+        self._notifier = None
+        self._timer = QTimer(self)
+        self._timer.setInterval(int(poll_interval * 1000))
+        self._timer.timeout.connect(self._check)
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self._inotify is not None
+
+    def start(self):
+        for path in expand_input_patterns(self.patterns):
+            self._files.mark_known(path)
+        try:
+            self._start_inotify()
+        except OSError as e:
+            logger.info(f"Watching by polling every {self._timer.interval()} ms: {e}")
+            self._inotify = None
+            self._timer.start()
+            return
+        logger.info(f"Watching {len(self.patterns)} pattern(s) with inotify")
+
+    def _start_inotify(self):
+        self._inotify = _Inotify()
+        for pattern in self.patterns:
+            base, recursive = _split_pattern(pattern)
+            self._watch(base, recursive)
+        self._notifier = QSocketNotifier(self._inotify.fd, QSocketNotifier.Type.Read, self)
+        self._notifier.activated.connect(self._on_inotify)
+
+    def _watch(self, directory: str, recursive: bool):
+        self._inotify.add_watch(directory)
+        if recursive:
+            for root, subdirectories, _ in os.walk(directory):
+                for subdirectory in subdirectories:
+                    self._inotify.add_watch(os.path.join(root, subdirectory))
+
+    def stop(self):
+        self._timer.stop()
+        if self._inotify is not None:
+            self._notifier.setEnabled(False)
+            self._inotify.close()
+            self._inotify = None
+
+    def _on_inotify(self):
+        for path, mask in self._inotify.read():
+            if path is None:
+                logger.warning("inotify queue overflowed; rescanning the watched folders")
+                self._scan()
+            elif mask & IN_ISDIR:
+                # Files copied in with their folder raise no events of their own
+                try:
+                    self._watch(path, recursive=True)
+                except OSError:
+                    continue
+                self._scan()
+            elif _matches(path, self.patterns):
+                self._files.add(path)
+        if self._files.pending and not self._timer.isActive():
+            self._timer.start()
+
+    @property
+    def settle_time(self) -> float:
+        return self._files.settle_time
+
+    def _scan(self):
+        self._files.scan(expand_input_patterns(self.patterns))
+
+    def _check(self):
+        if self._inotify is None:
+            self._scan()
+        ready = self._files.check(time.monotonic())
+        if ready:
+            logger.info(f"{len(ready)} new or changed file(s) in the watched folders")
+            self.files_ready.emit(ready)
+        if self._inotify is not None and not self._files.pending:
+            self._timer.stop()
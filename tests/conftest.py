@@ -0,0 +1,51 @@
+import os
+import time
+
+import pytest
+
+from fcs_plotter import data_processing
+from fcs_plotter.cache import ColumnarCache
+from fcs_plotter.synthetic import write_fcs
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    """A columnar cache in a temporary directory, used by load_fcs_file."""
+    cache = ColumnarCache(tmp_path / "cache")
+    monkeypatch.setattr(data_processing, "cache", cache)
+    return cache
+
+
+@pytest.fixture
+def fcs_path(tmp_path):
+    """Writes a synthetic FCS file and returns its path."""
+
+    def write(name="sample.fcs", n_events=2000, n_channels=4, **kwargs):
+        path = tmp_path / name
+        write_fcs(path, n_events, n_channels, **kwargs)
+        return str(path)
+
+    return write
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    """The Qt application, for tests that need an event loop or widgets (offscreen)."""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication
+
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture
+def wait_until(qapp):
+    """Processes Qt events until `condition()` is true; fails after `timeout` seconds."""
+
+    def wait(condition, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            assert time.monotonic() < deadline, "timed out waiting for Qt events"
+            qapp.processEvents()
+            time.sleep(0.005)
+
+    return wait
@@ -0,0 +1,77 @@
+import json
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from fcs_plotter.batch import process_file, write_statistics
+from fcs_plotter.data_processing import load_fcs_file
+from fcs_plotter.derived import derived_columns
+
+OPTIONS = {
+    "pairs": [("FSC-A", "SSC-A")],
+    "all_pairs": False,
+    "transform": "log",
+    "transform_params": None,
+    "quantile": 0.99,
+    "range_margin": 0.1,
+    "bins": 64,
+}
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_batch_runs_without_qt(tmp_path, fcs_path):
+    path = fcs_path(n_events=3000)
+    script = textwrap.dedent(
+        f"""
+        import json, sys
+        from fcs_plotter import data_processing
+        from fcs_plotter.cache import ColumnarCache
+        from fcs_plotter.batch import process_file
+
+        data_processing.cache = ColumnarCache({str(tmp_path / "cache")!r})
+        options = json.loads({json.dumps(OPTIONS)!r})
+        options["all_pairs"] = True
+        rows = process_file({path!r}, "sample", {str(tmp_path / "out")!r}, options)
+        print(json.dumps({{"rows": len(rows), "qt": sorted(
+            name for name in sys.modules if name.split(".")[0] == "PyQt6"
+        )}}))
+        """
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    assert report == {"rows": 4, "qt": []}
+    assert len(list((tmp_path / "out" / "plots" / "sample").glob("*.png"))) == 6
+    # Binned directly: no pyramid for any pair was written to the cache entry
+    (entry,) = [path for path in (tmp_path / "cache").iterdir() if not path.name.startswith(".")]
+    assert sorted(path.name for path in (entry / "pyramids").iterdir()) == ["000_001"]
+    assert not (entry / "derived").exists()
+
+
+def test_statistics_table(cache, fcs_path, tmp_path, monkeypatch):
+    # process_file turns off persisting derived columns for its process
+    monkeypatch.setattr(derived_columns, "persist", True)
+    path = fcs_path(n_events=5000)
+    rows = process_file(path, "sample", str(tmp_path), OPTIONS)
+    assert (tmp_path / "plots" / "sample" / "FSC-A_vs_SSC-A.png").exists()
+
+    table = pd.read_csv(write_statistics(rows, tmp_path, "csv"))
+    assert list(table["channel"]) == ["FSC-A", "SSC-A", "FL1-A", "FL2-A"]
+    assert (table["events"] == 5000).all()
+
+    dataset, _ = load_fcs_file(path)
+    for row in table.itertuples():
+        values = np.asarray(dataset.column(row.channel), dtype=np.float64)
+        assert row.finite == np.isfinite(values).sum()
+        assert np.isclose(row.mean, values.mean(), rtol=1e-6)
+        assert np.isclose(row.std, values.std(), rtol=1e-4)
+        assert np.isclose(row.positive_fraction, (values > 0).mean())
+        assert row.min == values.min() and row.max == values.max()
+        # Sketch quantiles are within a bin (about 1.6 %) of the exact ones
+        assert np.isclose(row.median, np.median(values), rtol=0.02)
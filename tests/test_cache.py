@@ -0,0 +1,87 @@
+import shutil
+
+import numpy as np
+
+from fcs_plotter import cache as cache_module
+from fcs_plotter.data_processing import load_fcs_file
+from fcs_plotter.event_store import EventStore
+from fcs_plotter.preparation import PlotRequest, prepare_plot
+
+
+def test_subsample_is_a_prefix_of_one_permutation(cache, fcs_path):
+    dataset, _ = load_fcs_file(fcs_path(n_events=2000))
+    whole = np.asarray(dataset.subsample(1.0))
+    assert np.array_equal(np.sort(whole), np.arange(2000))
+    assert not np.array_equal(whole, np.arange(2000))
+    for ratio in (0.01, 0.3, 0.77):
+        sample = dataset.subsample(ratio)
+        assert len(sample) == round(2000 * ratio)
+        assert np.array_equal(sample, whole[: len(sample)])
+    assert dataset.max_ratio == 1.0
+
+
+def test_rebuilt_entry_has_the_same_permutation(cache, fcs_path):
+    path = fcs_path(n_events=2000)
+    dataset, _ = load_fcs_file(path)
+    first = np.array(dataset.subsample(1.0))
+    shutil.rmtree(dataset.directory)
+    assert np.array_equal(load_fcs_file(path)[0].subsample(1.0), first)
+
+
+def test_subsample_is_capped(cache, fcs_path, monkeypatch):
+    monkeypatch.setattr(cache_module, "SUBSAMPLE_MAX_EVENTS", 500)
+    dataset, _ = load_fcs_file(fcs_path(n_events=2000))
+    assert dataset.max_ratio == 0.25
+    assert len(dataset.subsample(1.0)) == 500
+    assert len(np.unique(dataset.subsample(1.0))) == 500
+
+
+def test_scatter_at_full_ratio_goes_through_the_permutation(cache, fcs_path):
+    dataset, metadata = load_fcs_file(fcs_path(n_events=2000))
+    store = EventStore()
+    store.add(dataset.file_path, dataset, metadata)
+    request = PlotRequest("FSC-A", "SSC-A", quantile=0.99, range_margin=0.1, ratio=1.0)
+    prepared = prepare_plot(store, request)
+    sample = dataset.subsample(1.0)
+    x = dataset.column("FSC-A")[sample]
+    y = dataset.column("SSC-A")[sample]
+    shown = (x > 0) & (y > 0)
+    assert np.allclose(prepared.x, np.log10(x[shown]), atol=1e-5)
+    assert prepared.ratio_limit == 1.0
+
+
+class _OneEvent:
+    """A dataset stub with a single event whose value is its file number."""
+
+    channels = ["FSC-A"]
+    n_events = 1
+
+    def __init__(self, number):
+        self.number = number
+
+    def column(self, channel):
+        return np.array([self.number], dtype=np.float32)
+
+
+def test_file_index_holds_more_than_65535_files():
+    n_files = 70_000
+    store = EventStore()
+    for number in range(n_files):
+        store.add(f"file{number}.fcs", _OneEvent(number))
+    file_index = store.file_index()
+    assert file_index[-1] == n_files - 1
+    assert np.array_equal(file_index, np.arange(n_files))
+    df = store.gather(["FSC-A"])
+    assert df["file_path"].iloc[-1] == f"file{n_files - 1}.fcs"
+    assert (df["file_path"].cat.codes.to_numpy() == df["FSC-A"].to_numpy()).all()
+
+
+def test_prepared_file_index_is_uint32(cache, fcs_path):
+    store = EventStore()
+    for name in ("a.fcs", "b.fcs"):
+        dataset, metadata = load_fcs_file(fcs_path(name, n_events=500))
+        store.add(dataset.file_path, dataset, metadata)
+    request = PlotRequest("FSC-A", "SSC-A", quantile=0.99, range_margin=0.1, ratio=1.0)
+    prepared = prepare_plot(store, request)
+    assert prepared.file_index.dtype == np.uint32
+    assert set(np.unique(prepared.file_index)) == {0, 1}
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+from fcs_plotter.cache import ColumnarCache, iter_column_blocks
+from fcs_plotter.compensation import Compensation, parse_spillover
+
+SPILLOVER = np.array([[1.0, 0.2, 0.05], [0.1, 1.0, 0.3], [0.0, 0.15, 1.0]])
+NAMES = ["FL1-A", "FL2-A", "FL3-A"]
+
+
+def spillover_text(names, matrix) -> str:
+    return ",".join([str(len(names)), *names, *(str(float(value)) for value in matrix.ravel())])
+
+
+def metadata(spillover, key="spillover", parameters=None, markers=()):
+    parameters = ("FSC-A", "SSC-A", *NAMES, "Time") if parameters is None else parameters
+    text = {"par": str(len(parameters)), key: spillover}
+    for n, name in enumerate(parameters, start=1):
+        text[f"p{n}n"] = name
+    for n, marker in markers:
+        text[f"p{n}s"] = marker
+    return {"meta": text}
+
+
+def test_parse_round_trip():
+    names, matrix = parse_spillover(spillover_text(NAMES, SPILLOVER))
+    assert names == NAMES
+    assert np.array_equal(matrix, SPILLOVER)
+
+
+def test_inverse_undoes_the_spillover():
+    compensation = Compensation.from_metadata(metadata(spillover_text(NAMES, SPILLOVER)))
+    assert compensation.channels == NAMES
+    assert compensation.names == ["Comp-FL1-A", "Comp-FL2-A", "Comp-FL3-A"]
+    assert np.allclose(compensation.inverse @ SPILLOVER, np.eye(3), atol=1e-6)
+
+    rng = np.random.default_rng(0)
+    true = rng.uniform(0, 1e4, (1000, 3))
+    measured = true @ SPILLOVER
+    columns = {name: measured[:, i] for i, name in enumerate(NAMES)}
+    compensated = compensation.apply(columns)
+    assert compensated.dtype == np.float32
+    assert np.allclose(compensated, true, rtol=1e-4, atol=0.1)
+
+
+def test_matrix_names_resolve_to_marker_columns():
+    compensation = Compensation.from_metadata(
+        metadata(spillover_text(NAMES, SPILLOVER), markers=[(3, "CD3"), (5, "CD8")])
+    )
+    assert compensation.channels == ["CD3", "FL2-A", "CD8"]
+
+
+def test_singular_matrix_is_rejected():
+    singular = np.array([[1.0, 0.5, 0.0], [2.0, 1.0, 0.0], [0.0, 0.0, 1.0]])
+    with pytest.raises(ValueError, match="singular"):
+        Compensation.from_metadata(metadata(spillover_text(NAMES, singular)))
+
+
+def test_unknown_parameter_is_rejected():
+    with pytest.raises(ValueError, match="unknown parameter 'FL9-A'"):
+        Compensation.from_metadata(
+            metadata(spillover_text(["FL1-A", "FL2-A", "FL9-A"], SPILLOVER))
+        )
+
+
+def test_malformed_matrix_is_rejected():
+    with pytest.raises(ValueError, match="fields"):
+        parse_spillover("3,FL1-A,FL2-A,FL3-A,1,0,0")
+
+
+def test_nameless_comp_applies_to_fluorescence_parameters():
+    nameless = ",".join(["3", *(str(float(value)) for value in SPILLOVER.ravel())])
+    compensation = Compensation.from_metadata(metadata(nameless, key="comp"))
+    assert compensation.channels == NAMES
+    assert np.allclose(compensation.inverse @ SPILLOVER, np.eye(3), atol=1e-6)
+
+    with pytest.raises(ValueError, match="fluorescence parameters"):
+        Compensation.from_metadata(
+            metadata(nameless, key="comp", parameters=("FSC-A", *NAMES[:2]))
+        )
+    # Only $COMP may leave the names out
+    with pytest.raises(ValueError, match="fields"):
+        Compensation.from_metadata(metadata(nameless))
+
+
+def test_existing_compensated_channels_are_not_replaced(tmp_path):
+    parameters = ("FSC-A", *NAMES, "Comp-FL2-A")
+    with pytest.raises(ValueError, match="already has compensated channels"):
+        Compensation.from_metadata(
+            metadata(spillover_text(NAMES, SPILLOVER), parameters=parameters)
+        )
+
+    compensation = Compensation(NAMES, np.eye(3, dtype=np.float32))
+    columns = {name: np.ones(10, dtype=np.float32) for name in parameters}
+    with pytest.raises(ValueError, match="would replace raw channels"):
+        ColumnarCache(tmp_path).write(
+            "0" * 32,
+            "file.fcs",
+            iter_column_blocks(columns),
+            {name: np.float32 for name in columns},
+            10,
+            {},
+            compensation,
+        )
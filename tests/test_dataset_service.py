@@ -0,0 +1,109 @@
+import pytest
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from fcs_plotter.config import config
+from fcs_plotter.data_processing import load_fcs_file
+from fcs_plotter.dataset_service import DatasetService, _split_messages
+
+
+class FakeLoader(QObject):
+    """Records load requests; tests emit its results by hand."""
+
+    file_loaded = pyqtSignal(str, object, object)
+    file_previewed = pyqtSignal(str, object, object)
+    file_failed = pyqtSignal(str)
+    finished = pyqtSignal()
+
+    def __init__(self):
+        super().__init__()
+        self.requested = []
+
+    def load(self, file_paths):
+        self.requested.extend(file_paths)
+
+    def is_pending(self, file_path):
+        return file_path in self.requested
+
+
+@pytest.fixture
+def services(cache, qapp, monkeypatch):
+    """Starts DatasetServices on the temporary cache's socket name."""
+    monkeypatch.setitem(config, "sharing", {**config.get("sharing", {}), "enabled": True})
+    started = []
+
+    def start():
+        service = DatasetService(FakeLoader())
+        service.start()
+        started.append(service)
+        return service
+
+    yield start
+    for service in started:
+        service.stop()
+
+
+def record(signal):
+    emitted = []
+    signal.connect(lambda *args: emitted.append(args))
+    return emitted
+
+
+def test_split_messages_keeps_partial_lines():
+    rest, messages = _split_messages(b'{"op": "load", "paths": ["a"]}\n{"op": "lo')
+    assert messages == [{"op": "load", "paths": ["a"]}]
+    assert rest == b'{"op": "lo'
+    rest, messages = _split_messages(rest + b'aded"}\n\n')
+    assert messages == [{"op": "loaded"}]
+    assert rest == b""
+
+
+def test_split_messages_skips_garbage_lines():
+    buffer = b'{"op": "a"}\n{"op": \n\xff\xfe\n[1, 2]\n{"op": "b"}\n'
+    rest, messages = _split_messages(buffer)
+    assert messages == [{"op": "a"}, {"op": "b"}]
+    assert rest == b""
+
+
+def test_clients_are_notified_of_files_the_server_loads(services, fcs_path, wait_until):
+    server, client = services(), services()
+    assert (server.role, client.role) == ("server", "client")
+    available = record(client.file_available)
+    path = fcs_path()
+
+    client.load([path])
+    wait_until(lambda: server.loader.requested == [path])
+    dataset, metadata = load_fcs_file(path)
+    server.loader.file_loaded.emit(path, dataset, metadata)
+    wait_until(lambda: available)
+    ((file_path, opened, _),) = available
+    assert file_path == path
+    assert opened.directory == dataset.directory
+
+    # A window started later is told about the files loaded so far
+    late = services()
+    late_available = record(late.file_available)
+    wait_until(lambda: late_available)
+    assert late_available[0][0] == path
+
+
+def test_a_client_takes_over_when_the_server_closes(services, fcs_path, wait_until):
+    server, client = services(), services()
+    roles = record(client.role_changed)
+    path = fcs_path()
+
+    client.load([path])
+    wait_until(lambda: server.loader.requested == [path])
+    server.stop()
+    wait_until(lambda: roles)
+    assert roles == [("server",)]
+    assert client.role == "server"
+    # The load the old server never answered is asked again, of its own loader
+    assert client.loader.requested == [path]
+
+    newcomer = services()
+    assert newcomer.role == "client"
+    available = record(newcomer.file_available)
+    dataset, metadata = load_fcs_file(path)
+    client.loader.file_loaded.emit(path, dataset, metadata)
+    wait_until(lambda: available)
+    assert available[0][1].directory == dataset.directory
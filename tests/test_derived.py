@@ -0,0 +1,70 @@
+from pathlib import Path
+
+import numpy as np
+
+from fcs_plotter.data_processing import load_fcs_file, load_preview
+from fcs_plotter.derived import DerivedColumnCache, derive_column
+from fcs_plotter.transforms import LOG, ArcsinhTransform
+
+
+def test_cached_dataset_columns_are_shared_through_the_cache(cache, fcs_path):
+    dataset, _ = load_fcs_file(fcs_path(n_events=5000))
+    first = DerivedColumnCache(1 << 30).get(dataset, "FL1-A", LOG)
+    directory = dataset.derived_directory("FL1-A", LOG)
+    assert isinstance(first.values, np.memmap)
+    assert Path(first.values.filename) == directory / "values.npy"
+
+    # Another process (a cache of its own) maps the same file
+    reopened = cache.open(dataset.directory.name)
+    second = DerivedColumnCache(1 << 30).get(reopened, "FL1-A", LOG)
+    assert second.values.filename == first.values.filename
+
+    expected = derive_column(np.asarray(dataset.column("FL1-A")), LOG)
+    assert np.array_equal(second.values, expected.values, equal_nan=True)
+    assert np.array_equal(second.valid, expected.valid)
+
+
+def test_transform_parameters_get_their_own_column(cache, fcs_path):
+    dataset, _ = load_fcs_file(fcs_path(n_events=1000))
+    directories = {
+        dataset.derived_directory("FL1-A", transform)
+        for transform in (LOG, ArcsinhTransform(cofactor=5.0), ArcsinhTransform(cofactor=150.0))
+    }
+    assert len(directories) == 3
+
+
+def test_previews_stay_in_memory(cache, fcs_path):
+    preview, _ = load_preview(fcs_path(n_events=5000), 1000)
+    derived = DerivedColumnCache(1 << 30).get(preview, "FL1-A", LOG)
+    assert not isinstance(derived.values, np.memmap)
+    assert len(derived.values) == 1000
+
+
+def test_least_recently_used_columns_are_evicted(cache, fcs_path):
+    dataset, _ = load_fcs_file(fcs_path(n_events=1000))
+    column_bytes = 1000 * (4 + 1)  # float32 values and bool valid
+    derived = DerivedColumnCache(3 * column_bytes, persist=False)
+    a = derived.get(dataset, "FSC-A")
+    derived.get(dataset, "SSC-A")
+    derived.get(dataset, "FL1-A")
+    assert derived.nbytes == 3 * column_bytes
+    assert derived.get(dataset, "FSC-A") is a  # now the most recently used
+
+    derived.get(dataset, "FL2-A")  # evicts SSC-A, the least recently used
+    assert derived.nbytes == 3 * column_bytes <= derived.max_bytes
+    assert derived.get(dataset, "FSC-A") is a
+    assert [key[1] for key in derived._columns] == ["FL1-A", "FL2-A", "FSC-A"]
+
+    # Another transform of the same channel is another column
+    derived.get(dataset, "FSC-A", ArcsinhTransform())
+    assert derived.nbytes <= derived.max_bytes
+    assert len(derived._columns) == 3
+
+
+def test_a_column_larger_than_the_bound_is_still_kept(cache, fcs_path):
+    dataset, _ = load_fcs_file(fcs_path(n_events=1000))
+    derived = DerivedColumnCache(100, persist=False)
+    derived.get(dataset, "FSC-A")
+    column = derived.get(dataset, "SSC-A")
+    assert list(derived._columns.values()) == [column]
+    assert derived.nbytes == column.nbytes
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("fastplotlib")
+
+from fcs_plotter.data_processing import load_fcs_file
+from fcs_plotter.event_store import EventStore
+from fcs_plotter.plotting.fastplotlib_plotter import _FileScatter, _positions
+from fcs_plotter.preparation import PlotRequest, prepare_plot
+
+
+class _Graphic:
+    """Stands in for a scatter graphic: only its position buffer is used."""
+
+    def __init__(self, data):
+        self.data = data
+
+
+def test_ratio_walk_shows_the_sampled_events(cache, fcs_path):
+    dataset, metadata = load_fcs_file(fcs_path(n_events=5000))
+    store = EventStore()
+    store.add(dataset.file_path, dataset, metadata)
+
+    def expected(ratio):
+        sample = dataset.subsample(ratio)
+        x = dataset.column("FSC-A")[sample]
+        y = dataset.column("SSC-A")[sample]
+        shown = (x > 0) & (y > 0)
+        return np.column_stack([np.log10(x[shown]), np.log10(y[shown])])
+
+    scatter = None
+    for ratio in (0.3, 1.0, 0.3):
+        request = PlotRequest("FSC-A", "SSC-A", quantile=0.99, range_margin=0.1, ratio=ratio)
+        prepared = prepare_plot(store, request)
+        points = np.column_stack([prepared.x, prepared.y])
+        if scatter is None:
+            scatter = _FileScatter(_Graphic(_positions(points, 5000)), len(points), 5000)
+        else:
+            scatter.resize(points)
+
+        shown = scatter.graphic.data
+        assert scatter.count == len(points)
+        assert np.allclose(shown[: scatter.count, :2], expected(ratio), atol=1e-5)
+        assert np.isnan(shown[scatter.count :]).all()
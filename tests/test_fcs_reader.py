@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+import readfcs
+
+from fcs_plotter.data_processing import load_fcs_file
+from fcs_plotter.fcs_reader import HEADER_SIZE, FCSFile, parse_header
+
+LAYOUTS = [("F", 32), ("D", 64), ("I", 16), ("I", 32)]
+
+
+def read_reference(path):
+    # readfcs.read needs $PnS, which synthetic files do not set; its parser
+    # alone is enough to compare the events
+    fcs = readfcs.ReadFCS(path)
+    return fcs.data.set_axis(list(fcs.channels["PnN"]), axis=1)
+
+
+def assert_matches_readfcs(path):
+    reference = read_reference(path)
+    fcs = FCSFile(path)
+    assert fcs.channels == list(reference.columns)
+    assert fcs.n_events == len(reference)
+    for channel in fcs.channels:
+        assert np.array_equal(fcs.events[channel], reference[channel].to_numpy())
+
+    dataset, metadata = load_fcs_file(path)
+    assert dataset.channels == fcs.channels
+    assert dataset.n_events == fcs.n_events
+    for channel in fcs.channels:
+        expected = reference[channel].to_numpy().astype(dataset.column(channel).dtype)
+        assert np.array_equal(dataset.column(channel), expected)
+    assert metadata["meta"]["tot"] == str(len(reference))
+
+
+@pytest.mark.parametrize("datatype, bits", LAYOUTS)
+def test_columns_match_readfcs(cache, fcs_path, datatype, bits):
+    assert_matches_readfcs(fcs_path(n_events=3000, datatype=datatype, bits=bits))
+
+
+def test_offsets_beyond_the_header_are_read_from_text(cache, fcs_path):
+    # 6.3 million events of two doubles end past byte 99,999,999, so $ENDDATA
+    # is only given in TEXT and the HEADER field is 0
+    path = fcs_path(n_events=6_300_000, n_channels=2, datatype="D")
+    with open(path, "rb") as f:
+        header = parse_header(f.read(HEADER_SIZE))
+    assert header["data_end"] == 0
+    assert int(FCSFile(path).text["enddata"]) > 99_999_999
+    assert_matches_readfcs(path)
@@ -0,0 +1,169 @@
+import numpy as np
+import pytest
+from matplotlib.path import Path
+
+from fcs_plotter.data_processing import load_fcs_file
+from fcs_plotter.event_store import EventStore
+from fcs_plotter.gating import (
+    GRID_INDEX_MIN_EVENTS,
+    QUADRANTS,
+    GateTree,
+    PolygonGate,
+    RectangleGate,
+    points_in_polygon,
+    quadrant_gates,
+)
+from fcs_plotter.transforms import LOG
+
+POLYGONS = {
+    "square": [(0.0, 0.0), (1.0, 0.0), (1.0, 1.0), (0.0, 1.0)],
+    "triangle": [(0.0, 0.0), (4.0, 1.0), (1.0, 3.0)],
+    "concave": [(0.0, 0.0), (4.0, 0.0), (4.0, 4.0), (2.0, 1.0), (0.0, 4.0)],
+    "clockwise": [(0.0, 0.0), (0.0, 2.0), (3.0, 2.0), (3.0, 0.0)],
+}
+
+
+def closed_path_contains(vertices, x, y):
+    """matplotlib's test, widened by a hair so the outline counts as inside."""
+    vertices = np.asarray(vertices)
+    x0, y0 = vertices.T
+    x1, y1 = np.roll(vertices, -1, axis=0).T
+    counterclockwise = np.sum(x0 * y1 - x1 * y0) > 0
+    radius = 1e-9 if counterclockwise else -1e-9
+    return Path(vertices).contains_points(np.column_stack([x, y]), radius=radius)
+
+
+def outline_points(vertices):
+    """The vertices and the midpoints of the edges."""
+    vertices = np.asarray(vertices)
+    midpoints = (vertices + np.roll(vertices, -1, axis=0)) / 2
+    return np.concatenate([vertices, midpoints]).T
+
+
+@pytest.mark.parametrize("name", POLYGONS)
+@pytest.mark.parametrize("n_points", [1000, 4 * GRID_INDEX_MIN_EVENTS])
+def test_random_points_match_matplotlib(name, n_points):
+    vertices = np.array(POLYGONS[name])
+    rng = np.random.default_rng(0)
+    low, high = vertices.min(axis=0) - 0.5, vertices.max(axis=0) + 0.5
+    x = rng.uniform(low[0], high[0], n_points)
+    y = rng.uniform(low[1], high[1], n_points)
+    assert np.array_equal(points_in_polygon(x, y, vertices), closed_path_contains(vertices, x, y))
+
+
+@pytest.mark.parametrize("name", POLYGONS)
+def test_edges_and_vertices_are_inside(name):
+    vertices = np.array(POLYGONS[name])
+    x, y = outline_points(vertices)
+    assert points_in_polygon(x, y, vertices).all()
+    assert closed_path_contains(vertices, x, y).all()
+
+
+@pytest.mark.parametrize("name", POLYGONS)
+def test_grid_index_matches_direct_test(name):
+    """Points on the outline, padded past the grid index threshold."""
+    vertices = np.array(POLYGONS[name])
+    x, y = outline_points(vertices)
+    rng = np.random.default_rng(1)
+    low, high = vertices.min(axis=0), vertices.max(axis=0)
+    # Coarse grid points also hit the edges of the axis-aligned polygons
+    grid_x, grid_y = np.meshgrid(
+        np.linspace(low[0], high[0], 17), np.linspace(low[1], high[1], 17)
+    )
+    x = np.concatenate([x, grid_x.ravel(), rng.uniform(low[0], high[0], GRID_INDEX_MIN_EVENTS)])
+    y = np.concatenate([y, grid_y.ravel(), rng.uniform(low[1], high[1], GRID_INDEX_MIN_EVENTS)])
+    indexed = points_in_polygon(x, y, vertices)
+    direct = np.concatenate(
+        [
+            points_in_polygon(x[i : i + 1000], y[i : i + 1000], vertices)
+            for i in range(0, len(x), 1000)
+        ]
+    )
+    assert np.array_equal(indexed, direct)
+    assert np.array_equal(indexed, closed_path_contains(vertices, x, y))
+
+
+def test_nan_is_never_inside():
+    vertices = np.array(POLYGONS["square"])
+    x = np.array([np.nan, 0.5, np.nan])
+    y = np.array([0.5, np.nan, np.nan])
+    assert not points_in_polygon(x, y, vertices).any()
+
+
+def test_polygon_matches_rectangle_gate():
+    rectangle = RectangleGate("R", "x", "y", x_min=0.0, x_max=1.0, y_min=0.0, y_max=1.0)
+    polygon = PolygonGate("P", "x", "y", vertices=np.array(POLYGONS["square"]))
+    grid = np.linspace(-0.5, 1.5, 9)
+    x, y = (values.ravel() for values in np.meshgrid(grid, grid))
+    assert np.array_equal(polygon.contains(x, y), rectangle.contains(x, y))
+
+
+@pytest.fixture
+def store(cache, fcs_path):
+    store = EventStore()
+    for name in ("a.fcs", "b.fcs"):
+        dataset, metadata = load_fcs_file(fcs_path(name, n_events=3000, seed=len(store)))
+        store.add(dataset.file_path, dataset, metadata)
+    return store
+
+
+def display_values(dataset, channel):
+    values = np.asarray(dataset.column(channel), dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(values > 0, np.log10(values), np.nan)
+
+
+def test_child_gates_only_hold_parent_events(store):
+    tree = GateTree()
+    tree.add(
+        RectangleGate("parent", "FSC-A", "SSC-A", LOG, x_min=3.0, x_max=5.0, y_min=3.0, y_max=5.0)
+    )
+    tree.add(
+        PolygonGate(
+            "child",
+            "FL1-A",
+            "FL2-A",
+            LOG,
+            "parent",
+            vertices=np.array([(2.0, 2.0), (5.0, 2.5), (4.0, 5.0)]),
+        )
+    )
+    for gate in quadrant_gates("split", "FSC-A", "FL1-A", LOG, 4.0, 4.0, parent="child"):
+        tree.add(gate)
+
+    for file_path in store.file_paths:
+        dataset = store.dataset(file_path)
+        fsc, ssc = display_values(dataset, "FSC-A"), display_values(dataset, "SSC-A")
+        fl1, fl2 = display_values(dataset, "FL1-A"), display_values(dataset, "FL2-A")
+        parent = (fsc >= 3.0) & (fsc <= 5.0) & (ssc >= 3.0) & (ssc <= 5.0)
+        child = parent & closed_path_contains(tree.gates["child"].vertices, fl1, fl2)
+        assert np.array_equal(tree.mask(dataset, "parent"), parent)
+        assert np.array_equal(tree.mask(dataset, "child"), child)
+        quadrants = [tree.mask(dataset, f"split {quadrant}") for quadrant in QUADRANTS]
+        # The quadrants split the child's events without overlap
+        assert np.array_equal(np.sum(quadrants, axis=0), child.astype(int))
+
+    rows = {(row.gate, row.file_path): row for row in tree.statistics(store)}
+    row = rows[("child", store.file_paths[0])]
+    parent = tree.mask(store.dataset(store.file_paths[0]), "parent")
+    assert row.parent_count == np.count_nonzero(parent)
+    assert row.depth == 1
+    assert rows[("split ++", store.file_paths[0])].depth == 2
+
+
+def test_editing_a_parent_updates_its_children(store):
+    tree = GateTree()
+    everything = dict(x_min=0.0, x_max=9.0, y_min=0.0, y_max=9.0)
+    tree.add(RectangleGate("parent", "FSC-A", "SSC-A", LOG, **everything))
+    tree.add(RectangleGate("child", "FSC-A", "SSC-A", LOG, "parent", **everything))
+    dataset = store.dataset(store.file_paths[0])
+    before = tree.mask(dataset, "child").copy()
+    snapshot = tree.snapshot()
+    tree.update("parent", x_max=4.0)
+    after = tree.mask(dataset, "child")
+    assert np.count_nonzero(after) < np.count_nonzero(before)
+    assert not np.any(after & ~tree.mask(dataset, "parent"))
+    # A snapshot taken before the edit keeps the old geometry
+    assert np.array_equal(snapshot.mask(dataset, "child"), before)
+    tree.remove("parent")
+    assert len(tree) == 0 and len(snapshot) == 2
@@ -0,0 +1,76 @@
+import numpy as np
+
+from fcs_plotter.grid import (
+    HISTOGRAM_COLOR,
+    LABEL_SIZE,
+    PANEL_SPACING,
+    POINT_COLOR,
+    GridRequest,
+    PreparedGrid,
+    grid_side,
+    panel_offset,
+    panel_rgba,
+    panels_in,
+)
+from fcs_plotter.preparation import DENSITY, SCATTER
+
+PANEL = 20
+STEP = PANEL + PANEL_SPACING
+
+
+def make_grid(mode=SCATTER):
+    # "a" is low everywhere and "b" high, in display coordinates over [0, 1)
+    request = GridRequest(("a", "b"), quantile=0.99, range_margin=0.1, ratio=1.0, mode=mode)
+    values = {
+        "a": np.array([0.1, 0.1, 0.1, np.nan], dtype=np.float32),
+        "b": np.array([0.9, 0.9, 0.9, 0.5], dtype=np.float32),
+    }
+    return PreparedGrid(request, {"a": (0.0, 1.0), "b": (0.0, 1.0)}, values)
+
+
+def test_panels_in_the_whole_grid():
+    side = grid_side(3, PANEL)
+    assert side == LABEL_SIZE + 3 * STEP
+    panels = panels_in(3, PANEL, 0, 0, side - 1, side - 1)
+    assert panels == [(row, column) for row in range(3) for column in range(3)]
+
+
+def test_panels_in_a_rectangle():
+    # One pixel into the second column, up to the last pixel of the second row
+    left = panel_offset(1, PANEL)
+    bottom = panel_offset(2, PANEL) - 1
+    assert panels_in(10, PANEL, left, 0, left + 1, bottom) == [(0, 1), (1, 1)]
+    # The labels hold no panel
+    assert panels_in(10, PANEL, 0, 0, LABEL_SIZE - 1, LABEL_SIZE - 1) == []
+    # Beyond the last panel
+    far = grid_side(10, PANEL) + 100
+    assert panels_in(10, PANEL, far, far, far + 50, far + 50) == []
+
+
+def test_scatter_panel_composites_points():
+    image = panel_rgba(make_grid(), row=1, column=0, shape=(10, 10), alpha=0.5)
+    assert image.shape == (10, 10, 4) and image.dtype == np.uint8
+    # x = a = 0.1 and y = b = 0.9: column 1, top row 0 as row 0 is drawn first
+    filled = np.argwhere(image[..., 3] > 0)
+    assert filled.tolist() == [[0, 1]]
+    assert image[0, 1, 3] == round(255 * (1 - 0.5**3))
+    assert tuple(image[0, 1, :3]) == POINT_COLOR
+    # The event without "a" is not drawn in either off-diagonal panel
+    assert np.argwhere(panel_rgba(make_grid(), 0, 1, (10, 10), 0.5)[..., 3]).tolist() == [[8, 9]]
+
+
+def test_density_panel_is_opaque_where_counted():
+    image = panel_rgba(make_grid(DENSITY), row=1, column=0, shape=(10, 10), alpha=0.5)
+    assert np.argwhere(image[..., 3]).tolist() == [[0, 1]]
+    assert image[0, 1, 3] == 255
+
+
+def test_diagonal_panel_is_a_histogram():
+    image = panel_rgba(make_grid(), row=1, column=1, shape=(10, 10), alpha=0.5)
+    bars = image[..., 3] > 0
+    # Three events in bin 9 and one in bin 5 of "b", as bars from the bottom;
+    # the tallest bar leaves the top row free
+    assert bars[1:, 9].all() and not bars[0, 9]
+    assert bars[:, 5].sum() == 3 and bars[-3:, 5].all()
+    assert not bars[:, [0, 1, 2, 3, 4, 6, 7, 8]].any()
+    assert tuple(image[-1, 9, :3]) == HISTOGRAM_COLOR
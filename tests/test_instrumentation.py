@@ -0,0 +1,65 @@
+import json
+import threading
+
+from fcs_plotter.instrumentation import Tracer
+
+
+def test_ring_buffer_keeps_the_latest_spans():
+    tracer = Tracer(capacity=5)
+    for i in range(12):
+        tracer.record(f"stage{i % 2}", 1000 * i, 1000 * i + 10 * i, events=i)
+    spans = tracer.spans()
+    assert [span.start_ns for span in spans] == [7000, 8000, 9000, 10000, 11000]
+    summary = {stage.name: stage for stage in tracer.summary()}
+    assert summary["stage1"].count == 3 and summary["stage0"].count == 2
+    assert summary["stage1"].last_ms == 110 / 1e6
+
+    tracer.clear()
+    assert tracer.spans() == [] and tracer.summary() == []
+
+
+def test_chrome_trace_export(tmp_path):
+    tracer = Tracer(capacity=8)
+
+    def work(name):
+        for _ in range(3):
+            with tracer.span(name, events=100):
+                with tracer.span(f"{name} inner"):
+                    pass
+
+    thread = threading.Thread(target=work, args=("worker",), name="worker thread")
+    thread.start()
+    thread.join()
+    work("main")  # 12 spans in all: the buffer wraps around
+
+    path = tmp_path / "trace.json"
+    tracer.dump_chrome_trace(path)
+    trace = json.loads(path.read_text())
+    events = trace["traceEvents"]
+    metadata = [event for event in events if event["ph"] == "M"]
+    complete = [event for event in events if event["ph"] == "X"]
+    assert len(metadata) + len(complete) == len(events)
+    assert {event["args"]["name"] for event in metadata} >= {"worker thread", "MainThread"}
+
+    assert len(complete) == 8
+    timestamps = [event["ts"] for event in complete]
+    assert timestamps == sorted(timestamps)
+    assert all(event["dur"] >= 0 for event in complete)
+    assert {event["tid"] for event in complete} <= {event["tid"] for event in metadata}
+    # Outer spans carry their event counts and contain their inner span
+    outer = [event for event in complete if event["name"] == "main"]
+    inner = [event for event in complete if event["name"] == "main inner"]
+    assert len(outer) == len(inner) == 3
+    for parent, child in zip(outer, inner):
+        assert parent["args"] == {"events": 100}
+        assert parent["ts"] <= child["ts"]
+        assert child["ts"] + child["dur"] <= parent["ts"] + parent["dur"]
+
+
+def test_a_disabled_tracer_records_nothing():
+    tracer = Tracer(enabled=False)
+    with tracer.span("stage"):
+        pass
+    tracer.record("stage", 0, 10)
+    assert tracer.spans() == []
+    assert tracer.chrome_trace()["traceEvents"] == []
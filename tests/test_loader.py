@@ -0,0 +1,98 @@
+from concurrent.futures import Future, wait
+
+import pytest
+
+from fcs_plotter.loader import ParallelLoader, _parse_into_cache
+
+
+def record(signal):
+    emitted = []
+    signal.connect(lambda *args: emitted.append(args))
+    return emitted
+
+
+@pytest.fixture
+def loader(qapp):
+    """A loader on a thread pool, without previews."""
+    loader = ParallelLoader()
+    loader.executor_kind = "thread"
+    loader.max_workers = 2
+    loader.preview_events = 0
+    yield loader
+    loader.shutdown()
+
+
+def test_parse_into_cache_returns_the_cache_key(cache, fcs_path, tmp_path):
+    key = _parse_into_cache(fcs_path())
+    dataset = cache.open(key)
+    assert dataset is not None and dataset.directory.name == key
+
+    broken = tmp_path / "broken.fcs"
+    broken.write_bytes(b"not an FCS file")
+    assert _parse_into_cache(str(broken)) is None
+
+
+def test_loaded_files_are_opened_by_their_key(cache, fcs_path, tmp_path, loader, wait_until):
+    loaded, failed = record(loader.file_loaded), record(loader.file_failed)
+    finished, progress = record(loader.finished), record(loader.progress)
+    broken = tmp_path / "broken.fcs"
+    broken.write_bytes(b"not an FCS file")
+    path = fcs_path()
+
+    loader.load([path, str(broken)])
+    assert loader.is_pending(path)
+    wait_until(lambda: finished)
+    ((file_path, dataset, metadata),) = loaded
+    assert file_path == path and dataset.n_events == 2000
+    assert dataset.directory.name == _parse_into_cache(path)
+    assert metadata == dataset.metadata
+    assert failed == [(str(broken),)]
+    assert progress[0] == (0, 2) and progress[-1] == (2, 2)
+    assert not loader.is_loading()
+
+
+def test_results_of_a_cancelled_generation_are_dropped(cache, fcs_path, loader, qapp, wait_until):
+    loaded, finished = record(loader.file_loaded), record(loader.finished)
+    path = fcs_path()
+    key = _parse_into_cache(path)
+
+    loader.load([path])
+    generation, future = loader._generation, loader._futures[path]
+    loader.cancel()
+    assert finished == [()] and not loader.is_pending(path)
+    # The worker's result, queued or late, belongs to the old generation
+    wait([future])
+    qapp.processEvents()
+    loader._on_file_done(generation, path, key)
+    assert loaded == []
+
+    # Loading again delivers the file once
+    loader.load([path])
+    wait_until(lambda: loaded)
+    assert [file_path for file_path, _, _ in loaded] == [path]
+    loader._on_file_done(loader._generation, path, key)  # already delivered
+    assert len(loaded) == 1
+
+
+class DoneExecutor:
+    """Runs each task at submission, as a worker that finished at once."""
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def test_a_file_done_at_submission_is_reported_after_load(cache, fcs_path, loader, wait_until):
+    progress, finished = record(loader.progress), record(loader.finished)
+    loaded = record(loader.file_loaded)
+    path = fcs_path()
+    loader._executor = DoneExecutor()
+
+    loader.load([path])
+    assert progress == [(0, 1)] and finished == [] and loader.is_pending(path)
+    wait_until(lambda: finished)
+    assert progress == [(0, 1), (1, 1)] and len(loaded) == 1
@@ -0,0 +1,63 @@
+import threading
+import time
+
+from fcs_plotter.logger_setup import attach_handler, detach_handler, logger
+from fcs_plotter.main_window import BufferedLogHandler
+
+
+def wait_for_lines(handler, count, timeout=5.0):
+    """Takes lines from the handler until `count` arrived (the listener is a thread)."""
+    lines = []
+    deadline = time.monotonic() + timeout
+    while len(lines) < count and time.monotonic() < deadline:
+        lines += handler.take()
+        time.sleep(0.005)
+    return lines
+
+
+def test_records_from_other_threads_reach_an_attached_handler():
+    handler = BufferedLogHandler(100)
+    attach_handler(handler)
+    try:
+        thread = threading.Thread(target=lambda: logger.warning("from the worker"))
+        thread.start()
+        thread.join()
+        lines = wait_for_lines(handler, 1)
+        assert len(lines) == 1 and "from the worker" in lines[0]
+    finally:
+        detach_handler(handler)
+    logger.warning("after detaching")
+    assert wait_for_lines(handler, 1, timeout=0.2) == []
+
+
+def test_attaching_while_other_threads_log():
+    kept = BufferedLogHandler(10_000)
+    attach_handler(kept)
+    stop = threading.Event()
+
+    def churn():
+        while not stop.is_set():
+            handler = BufferedLogHandler(10)
+            attach_handler(handler)
+            detach_handler(handler)
+
+    def log(name):
+        for i in range(200):
+            logger.warning(f"{name} {i}")
+
+    churner = threading.Thread(target=churn)
+    loggers = [threading.Thread(target=log, args=(f"thread{n}",)) for n in range(3)]
+    churner.start()
+    try:
+        for thread in loggers:
+            thread.start()
+        for thread in loggers:
+            thread.join()
+    finally:
+        stop.set()
+        churner.join()
+        lines = wait_for_lines(kept, 600)
+        detach_handler(kept)
+    # Every record arrived once, while handlers came and went
+    messages = sorted(line.rsplit(" - ", 1)[-1] for line in lines)
+    assert messages == sorted(f"thread{n} {i}" for n in range(3) for i in range(200))
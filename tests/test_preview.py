@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from fcs_plotter.data_processing import load_fcs_file, load_preview
+from fcs_plotter.event_store import EventStore
+from fcs_plotter.fcs_reader import FCSFile
+from fcs_plotter.loader import ParallelLoader
+
+
+def test_preview_holds_the_first_events(fcs_path):
+    path = fcs_path(n_events=2000, datatype="I", bits=16)
+    preview, metadata = load_preview(path, 500)
+    assert (preview.n_events, preview.total_events) == (500, 2000)
+    assert preview.metadata is metadata and metadata["meta"]["tot"] == "2000"
+    events = FCSFile(path).events
+    for channel in preview.channels:
+        assert np.array_equal(preview.column(channel), events[channel][:500])
+
+    whole, _ = load_preview(path, 10_000)
+    assert whole.n_events == whole.total_events == 2000
+
+
+def test_preview_subsample_is_as_dense_as_the_whole_file(fcs_path):
+    preview, _ = load_preview(fcs_path(n_events=2000), 500)
+    # A tenth of the file is 200 events, all of them in the preview
+    assert np.array_equal(preview.subsample(0.1), np.arange(200))
+    assert len(preview.subsample(0.5)) == 500
+    assert preview.max_ratio == 1.0
+
+
+def test_loaded_fraction_follows_the_previews(cache, fcs_path):
+    first, second = fcs_path("a.fcs", n_events=2000), fcs_path("b.fcs", n_events=2000)
+    store = EventStore()
+    store.add(first, load_preview(first, 500)[0])
+    assert store.loaded_fraction == 0.25
+    store.add(second, load_fcs_file(second)[0])
+    assert store.loaded_fraction == (500 + 2000) / 4000
+    store.add(first, load_fcs_file(first)[0])
+    assert store.loaded_fraction == 1.0
+
+
+@pytest.fixture
+def previewing_loader(qapp):
+    """A loader whose preview loop runs on the calling thread for one pending file."""
+    loader = ParallelLoader()
+    loader.preview_events = 100
+    loader.preview_max_events = 1000
+    sizes = []
+    loader.file_previewed.connect(lambda path, preview, _: sizes.append(preview.n_events))
+    return loader, sizes
+
+
+def test_previews_grow_up_to_the_limit(fcs_path, previewing_loader):
+    loader, sizes = previewing_loader
+    path = fcs_path(n_events=20_000)
+    loader._futures[path] = None  # still loading
+    loader._read_previews(loader._generation, path)
+    assert sizes == [100, 800, 1000]
+
+
+def test_previews_stop_at_the_whole_file(fcs_path, previewing_loader):
+    loader, sizes = previewing_loader
+    path = fcs_path(n_events=500)
+    loader._futures[path] = None
+    loader._read_previews(loader._generation, path)
+    assert sizes == [100, 500]
+
+
+def test_previews_stop_once_the_file_is_loaded(fcs_path, previewing_loader):
+    loader, sizes = previewing_loader
+    path = fcs_path(n_events=20_000)
+    loader._futures[path] = None
+    # The cached dataset arrives while the first preview is shown
+    loader.file_previewed.connect(lambda *_: loader._futures.pop(path))
+    loader._read_previews(loader._generation, path)
+    assert sizes == [100]
+    # A preview that was read before the file arrived is not shown after it
+    loader._on_preview_done(loader._generation, path, load_preview(path, 800)[0], {})
+    assert sizes == [100]
@@ -0,0 +1,37 @@
+import numpy as np
+
+from fcs_plotter.plotting.pyqtgraph_plotter import PyQtGraphPlotter
+from fcs_plotter.preparation import PreparedPlot
+
+
+def prepared(n_files):
+    rng = np.random.default_rng(0)
+    return PreparedPlot(
+        "FSC-A",
+        "SSC-A",
+        x=rng.uniform(1, 5, 1000).astype(np.float32),
+        y=rng.uniform(1, 5, 1000).astype(np.float32),
+        file_index=rng.integers(0, n_files, 1000).astype(np.uint32),
+        file_names=[f"file{i}.fcs" for i in range(n_files)],
+        x_range=(1.0, 5.0),
+        y_range=(1.0, 5.0),
+    )
+
+
+def test_style_changes_restyle_the_legend_in_place(qapp):
+    plotter = PyQtGraphPlotter()
+    data = prepared(96)
+    plotter.plot_data(data, spot_size=3, spot_alpha=0.5)
+    samples = list(plotter._legend_samples)
+    assert len(samples) == len(plotter.legend.items) == 96
+
+    plotter.plot_data(data, spot_size=7, spot_alpha=0.2)
+    assert plotter._legend_samples == samples
+    assert [sample.item for sample, _ in plotter.legend.items] == samples
+    assert samples[5].opts["size"] == 7
+    assert samples[5].opts["brush"].color().alpha() == int(0.2 * 255)
+
+    # Other files rebuild the entries
+    plotter.plot_data(prepared(3), spot_size=7, spot_alpha=0.2)
+    assert len(plotter.legend.items) == 3
+    assert not set(plotter._legend_samples) & set(samples)
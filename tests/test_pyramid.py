@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from fcs_plotter import pyramid
+from fcs_plotter.data_processing import load_fcs_file
+from fcs_plotter.event_store import EventStore
+from fcs_plotter.preparation import DENSITY, PlotRequest, prepare_plot
+from fcs_plotter.pyramid import BASE_BINS, LOG_RANGE, HistogramPyramid, build_pyramid, grid_covers
+
+DECADES = LOG_RANGE[1] - LOG_RANGE[0]
+
+
+def events(n_events, seed):
+    """Values on the centres of the finest bins, so no event sits on a bin edge."""
+    rng = np.random.default_rng(seed)
+    bins = np.clip(rng.normal(BASE_BINS * 0.55, BASE_BINS * 0.12, n_events), 0, BASE_BINS - 1)
+    return 10.0 ** (LOG_RANGE[0] + (bins.astype(np.int64) + 0.5) * DECADES / BASE_BINS)
+
+
+def histogram(xs, ys, image):
+    """np.histogram2d of the events over the image's range and shape."""
+    counts = np.zeros(image.shape, dtype=np.int64)
+    for x, y in zip(xs, ys):
+        shown = (x > 0) & (y > 0)
+        h, _, _ = np.histogram2d(
+            np.log10(y[shown]),
+            np.log10(x[shown]),
+            bins=image.shape,
+            range=[image.y_log_range, image.x_log_range],
+        )
+        counts += h.astype(np.int64)
+    return counts
+
+
+@pytest.fixture
+def pyramids(tmp_path):
+    """Two files' pyramids, with events beyond the grid and below zero."""
+    xs, ys, directories = [], [], []
+    for seed in range(2):
+        x, y = events(50_000, seed), events(50_000, seed + 10)
+        x[:5], y[5:10] = 1e12, -3.0
+        directories.append(tmp_path / f"file{seed}")
+        build_pyramid(directories[-1], x.astype(np.float32), y.astype(np.float32))
+        xs.append(x)
+        ys.append(y)
+    return HistogramPyramid(directories), xs, ys
+
+
+@pytest.mark.parametrize(
+    "x_range, y_range, target_bins",
+    [
+        ((0.5, 7.5), (1.0, 6.0), 256),  # inside the grid, coarse
+        ((3.0, 4.0), (3.5, 4.25), 256),  # zoomed in, finest level
+        ((-5.0, 4.0), (6.0, 14.0), 128),  # partly outside the grid on both sides
+        (LOG_RANGE, LOG_RANGE, 64),
+    ],
+)
+def test_query_counts_equal_a_direct_histogram(pyramids, x_range, y_range, target_bins):
+    pyramid, xs, ys = pyramids
+    image = pyramid.query(x_range, y_range, target_bins)
+    assert image.x_log_range[0] >= LOG_RANGE[0] and image.x_log_range[1] <= LOG_RANGE[1]
+    assert image.y_log_range[0] >= LOG_RANGE[0] and image.y_log_range[1] <= LOG_RANGE[1]
+    assert image.counts.sum() > 0
+    assert np.array_equal(image.counts, histogram(xs, ys, image))
+
+
+def test_grid_covers_32_bit_integer_data():
+    assert grid_covers(1.0, 2.0**32)
+    assert grid_covers(0.01, 262144.0)
+    assert not grid_covers(1.0, 1e12)
+    assert not grid_covers(1e-3, 10.0)
+
+
+def test_channels_beyond_the_grid_are_binned_directly(cache, fcs_path, monkeypatch):
+    dataset, metadata = load_fcs_file(fcs_path(n_events=5000))
+    store = EventStore()
+    store.add(dataset.file_path, dataset, metadata)
+    request = PlotRequest(
+        "FSC-A", "SSC-A", quantile=1.0, range_margin=0.1, ratio=1.0, mode=DENSITY
+    )
+    assert prepare_plot(store, request).pyramid is not None
+
+    # The synthetic events reach 10**5.4, past a grid that ends at 10**3
+    monkeypatch.setattr(pyramid, "LOG_RANGE", (-2.0, 3.0))
+    prepared = prepare_plot(store, request)
+    assert prepared.pyramid is None
+    x, y = dataset.column("FSC-A"), dataset.column("SSC-A")
+    shown = (x > 0) & (y > 0)
+    assert prepared.density.counts.sum() == np.count_nonzero(shown)
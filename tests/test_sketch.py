@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+from fcs_plotter.preparation import axis_range
+from fcs_plotter.sketch import EXP_MAX, EXP_MIN, N_BINS, ZERO_BIN, QuantileSketch, bin_indices
+
+# Bins are 1/64 of a power of two wide: at most 1/64 (about 1.6 %) of a value
+RELATIVE_BIN_WIDTH = 1 / 64
+
+QUANTILES = np.array([0.001, 0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99, 0.999])
+
+
+@pytest.mark.parametrize(
+    "values",
+    [
+        np.random.default_rng(0).lognormal(8, 2, 200_000),
+        np.random.default_rng(1).normal(0, 1000, 200_000),
+        -np.random.default_rng(2).exponential(50, 200_000),
+    ],
+    ids=["lognormal", "normal", "negative"],
+)
+def test_quantiles_are_within_a_bin(values):
+    values = values.astype(np.float32)
+    sketch = QuantileSketch.from_values(values)
+    exact = np.quantile(values.astype(np.float64), QUANTILES)
+    approx = sketch.quantile(QUANTILES)
+    assert np.all(np.abs(approx - exact) <= RELATIVE_BIN_WIDTH * np.abs(exact) + 1e-3)
+
+
+def test_positive_only_ignores_zero_and_negative_values():
+    rng = np.random.default_rng(3)
+    positive = rng.lognormal(3, 1, 50_000).astype(np.float32)
+    values = np.concatenate([positive, np.zeros(20_000), -positive])
+    sketch = QuantileSketch.from_values(values)
+    exact = np.quantile(positive.astype(np.float64), QUANTILES)
+    approx = sketch.quantile(QUANTILES, positive_only=True)
+    assert np.all(np.abs(approx - exact) <= RELATIVE_BIN_WIDTH * exact)
+
+
+def test_positive_extremes_of_mixed_sign_values():
+    rng = np.random.default_rng(5)
+    positive = rng.lognormal(8, 2, 50_000).astype(np.float32)
+    values = np.concatenate([positive, -rng.exponential(100, 10).astype(np.float32)])
+    sketch = QuantileSketch.from_values(values)
+    lowest, highest = sketch.quantile([0.0, 1.0], positive_only=True)
+    assert positive.min() * (1 - RELATIVE_BIN_WIDTH) <= lowest <= positive.min()
+    assert highest == positive.max()
+    low, high = axis_range(sketch, 1.0, 0.0)
+    assert low == pytest.approx(np.log10(positive.min()), abs=0.01)
+    assert high == pytest.approx(np.log10(positive.max()), abs=1e-6)
+
+
+def test_merge_equals_sketch_of_concatenation():
+    rng = np.random.default_rng(4)
+    a = rng.normal(100, 300, 10_000).astype(np.float32)
+    b = rng.lognormal(5, 1, 7_000).astype(np.float32)
+    whole = QuantileSketch.from_values(np.concatenate([a, b]))
+
+    merged = QuantileSketch.from_values(a)
+    merged.merge(QuantileSketch.from_values(b))
+    for sketch in (merged, QuantileSketch.merged([QuantileSketch.from_values(v) for v in (a, b)])):
+        assert np.array_equal(sketch.counts, whole.counts)
+        assert (sketch.minimum, sketch.maximum) == (whole.minimum, whole.maximum)
+        assert np.array_equal(sketch.quantile(QUANTILES), whole.quantile(QUANTILES))
+
+
+def test_merging_an_empty_sketch_changes_nothing():
+    sketch = QuantileSketch.from_values(np.arange(1, 100, dtype=np.float32))
+    merged = QuantileSketch.merged([sketch, QuantileSketch()])
+    assert np.array_equal(merged.counts, sketch.counts)
+    assert (merged.minimum, merged.maximum) == (1.0, 99.0)
+
+
+def test_zero_and_tiny_values_share_the_zero_bin():
+    tiny = np.float32(2.0 ** (EXP_MIN - 1))
+    index = bin_indices(np.array([0.0, -0.0, tiny, -tiny], dtype=np.float32))
+    assert (index == ZERO_BIN).all()
+
+
+def test_values_beyond_the_range_go_to_the_outermost_bins():
+    huge = np.float32(2.0 ** (EXP_MAX + 10))
+    index = bin_indices(np.array([huge, np.inf, -huge, -np.inf], dtype=np.float32))
+    assert list(index) == [N_BINS - 1, N_BINS - 1, 0, 0]
+
+
+def test_bins_follow_the_order_of_the_values():
+    magnitudes = np.geomspace(2.0**EXP_MIN, 2.0**EXP_MAX, 5000)
+    values = np.concatenate([-magnitudes[::-1], [0.0], magnitudes]).astype(np.float32)
+    index = bin_indices(values)
+    assert np.all(np.diff(index) >= 0)
+    assert index.min() == 0 and index.max() == N_BINS - 1
+
+
+def test_extreme_quantiles_are_the_extreme_values():
+    values = np.array([-1e20, -3.0, 0.0, 0.5, 1e20], dtype=np.float32)
+    sketch = QuantileSketch.from_values(values)
+    assert sketch.quantile(0.0) == sketch.minimum == np.float32(-1e20)
+    assert sketch.quantile(1.0) == sketch.maximum == np.float32(1e20)
+    assert sketch.count == 5
+
+
+def test_nan_is_ignored_and_empty_sketch_has_no_quantiles():
+    sketch = QuantileSketch.from_values(np.array([np.nan, np.nan], dtype=np.float32))
+    assert sketch.count == 0
+    assert np.isnan(sketch.quantile(0.5))
+    assert np.isnan(sketch.quantile([0.1, 0.9])).all()
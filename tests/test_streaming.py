@@ -0,0 +1,56 @@
+import numpy as np
+
+from fcs_plotter.streaming import SubsampleReservoir
+
+
+def permutation(n_events, capacity, seed=0, blocks=None):
+    reservoir = SubsampleReservoir(capacity, seed)
+    start = 0
+    for n_block in blocks or [n_events]:
+        reservoir.update(start, n_block)
+        start += n_block
+    assert start == n_events
+    return reservoir.permutation()
+
+
+def test_full_capacity_is_a_permutation():
+    kept = permutation(1000, 1000)
+    assert np.array_equal(np.sort(kept), np.arange(1000))
+
+
+def test_capped_sample_is_distinct_events():
+    kept = permutation(100_000, 1000)
+    assert len(kept) == 1000
+    assert len(np.unique(kept)) == 1000
+    assert kept.min() >= 0 and kept.max() < 100_000
+
+
+def test_prefix_is_uniform():
+    n_events, n_seeds = 20, 4000
+    first = np.bincount([permutation(n_events, 5, seed)[0] for seed in range(n_seeds)])
+    kept = np.bincount(
+        np.concatenate([permutation(n_events, 5, seed) for seed in range(n_seeds)]),
+        minlength=n_events,
+    )
+    # Each event leads the permutation in 1/20 and is kept in 5/20 of the seeds
+    assert np.all(np.abs(first - n_seeds / n_events) < 0.3 * n_seeds / n_events)
+    assert np.all(np.abs(kept - n_seeds * 5 / n_events) < 0.15 * n_seeds * 5 / n_events)
+
+
+def test_same_seed_gives_same_permutation():
+    assert np.array_equal(permutation(50_000, 2000, seed=7), permutation(50_000, 2000, seed=7))
+    assert not np.array_equal(permutation(50_000, 2000, seed=7), permutation(50_000, 2000, seed=8))
+
+
+def test_block_boundaries_do_not_change_the_sample():
+    whole = permutation(50_000, 2000, seed=3)
+    for blocks in ([1, 999, 1000, 48_000], [7] * 7000 + [1000], [25_000, 25_000]):
+        assert np.array_equal(permutation(50_000, 2000, seed=3, blocks=blocks), whole)
+
+
+def test_wide_index_dtype():
+    reservoir = SubsampleReservoir(10, 0, np.int64)
+    reservoir.update(2**33, 100)
+    kept = reservoir.permutation()
+    assert kept.dtype == np.int64
+    assert np.all((kept >= 2**33) & (kept < 2**33 + 100))
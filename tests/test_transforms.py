@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+
+from fcs_plotter.transforms import (
+    LOGICLE_MAX_DISPLAY,
+    ArcsinhTransform,
+    LinearTransform,
+    LogicleTransform,
+    LogTransform,
+    make_transform,
+)
+
+LOGICLE_PARAMETERS = [
+    {},
+    {"W": 0.0},
+    {"W": 1.0, "M": 4.0, "A": 1.0},
+    {"T": 10_000.0, "W": 0.25, "M": 4.0},
+    {"T": 2.0**32, "W": 2.0, "M": 9.0, "A": 0.5},
+]
+TRANSFORMS = [
+    LinearTransform(),
+    LogTransform(),
+    ArcsinhTransform(5.0),
+    ArcsinhTransform(),
+    ArcsinhTransform(1000.0),
+] + [LogicleTransform(**params) for params in LOGICLE_PARAMETERS]
+
+
+def shown_values(transform):
+    """Values over the whole range the transform is meant for, in increasing order."""
+    top = 262144.0
+    if isinstance(transform, LogicleTransform):
+        top = float(transform.inverse(LOGICLE_MAX_DISPLAY)) * 0.999
+    magnitudes = np.geomspace(1e-2, top, 20_000)
+    if transform.positive_only:
+        return magnitudes
+    return np.concatenate([-magnitudes[::-1], [0.0], magnitudes])
+
+
+@pytest.mark.parametrize("transform", TRANSFORMS, ids=repr)
+def test_inverse_undoes_forward(transform):
+    values = shown_values(transform)
+    display = transform.forward(values)
+    assert display.dtype == np.float32
+    back = transform.inverse(display)
+    # float32 display values hold about 7 digits; near zero the error is
+    # bounded by the scale of the linear region
+    scale = transform.T if isinstance(transform, LogicleTransform) else 1.0
+    assert np.all(np.abs(back - values) <= 2e-5 * np.abs(values) + 1e-6 * scale)
+
+
+@pytest.mark.parametrize("transform", TRANSFORMS, ids=repr)
+def test_forward_is_monotonic(transform):
+    display = transform.forward(shown_values(transform))
+    assert np.all(np.diff(display) >= 0)
+    assert display[-1] > display[0]
+
+
+@pytest.mark.parametrize("transform", TRANSFORMS, ids=repr)
+def test_nan_and_infinity(transform):
+    values = np.array([np.nan, np.inf, -np.inf, 1.0], dtype=np.float32)
+    display = transform.forward(values)
+    assert np.isnan(display[0])
+    assert list(transform.valid(values)) == [False, False, False, True]
+    if isinstance(transform, LogicleTransform):
+        # Beyond the table, values are pinned to its ends
+        assert display[1] == pytest.approx(LOGICLE_MAX_DISPLAY)
+        assert np.isfinite(display[2]) and display[2] < display[3]
+
+
+@pytest.mark.parametrize("transform", TRANSFORMS, ids=repr)
+def test_negative_values(transform):
+    values = np.geomspace(1.0, 1e5, 100)
+    valid = transform.valid(-values)
+    if transform.positive_only:
+        assert not valid.any() and not transform.valid(np.zeros(3)).any()
+        return
+    assert valid.all()
+    positive, negative = transform.forward(values), transform.forward(-values)
+    if isinstance(transform, LogicleTransform):
+        # Point-symmetric around the display value of 0
+        zero = transform.forward(np.zeros(1))[0]
+        assert np.allclose(negative - zero, zero - positive, atol=1e-5)
+    else:
+        assert np.allclose(negative, -positive)
+
+
+def test_only_log_is_positive_only():
+    assert [transform.positive_only for transform in TRANSFORMS] == [False, True] + [False] * 8
+
+
+def test_logicle_maps_the_top_of_scale_to_one():
+    for params in LOGICLE_PARAMETERS:
+        transform = LogicleTransform(**params)
+        assert transform.forward(np.array([transform.T]))[0] == pytest.approx(1.0, abs=1e-5)
+        assert transform.inverse(1.0) == pytest.approx(transform.T, rel=1e-9)
+
+
+def test_forward_accepts_any_numeric_input():
+    transform = LogicleTransform()
+    expected = transform.forward(np.arange(5, dtype=np.float32))
+    for dtype in (np.uint16, np.uint32, np.float64):
+        assert np.array_equal(transform.forward(np.arange(5, dtype=dtype)), expected)
+    # Several blocks give the same values as one
+    values = np.random.default_rng(0).normal(0, 1e4, 600_000).astype(np.float32)
+    assert np.array_equal(transform.forward(values)[-5:], transform.forward(values[-5:]))
+
+
+def test_make_transform():
+    assert make_transform("arcsinh", {"cofactor": 5}) == ArcsinhTransform(5.0)
+    assert make_transform("logicle") == LogicleTransform()
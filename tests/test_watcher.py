@@ -0,0 +1,133 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from fcs_plotter import watcher
+from fcs_plotter.fcs_reader import declared_size
+from fcs_plotter.synthetic import write_fcs
+from fcs_plotter.watcher import FolderWatcher, _matches, _SettleTracker, _split_pattern
+
+SETTLE = 2.0
+
+
+@pytest.mark.parametrize(
+    "pattern, expected",
+    [
+        ("/data/run1/*.fcs", ("/data/run1", False)),
+        ("/data/*/plate.fcs", ("/data", True)),
+        ("/data/**/*.fcs", ("/data", True)),
+        ("/data/run1/sample.fcs", ("/data/run1", False)),
+        ("*.fcs", (".", False)),
+    ],
+)
+def test_split_pattern(pattern, expected):
+    assert _split_pattern(pattern) == expected
+
+
+def test_matches():
+    patterns = ["/data/**/*.fcs", "/other/A?.fcs"]
+    assert _matches("/data/run1/a.fcs", patterns)
+    assert _matches("/data/a.fcs", patterns)  # "**/" also matches no directory
+    assert _matches("/other/A1.fcs", patterns)
+    assert not _matches("/other/A12.fcs", patterns)
+    assert not _matches("/data/run1/a.txt", patterns)
+
+
+@pytest.fixture
+def fcs_bytes(tmp_path):
+    """The bytes of a complete synthetic FCS file."""
+    path = tmp_path / "complete.fcs"
+    write_fcs(path, 2000, 4)
+    return path.read_bytes()
+
+
+def write_part(path, data, length):
+    with open(path, "wb") as f:
+        f.write(data[:length])
+
+
+def append_rest(path, data):
+    with open(path, "ab") as f:
+        f.write(data[os.path.getsize(path) :])
+    # A later mtime, as a filesystem with coarse timestamps would not give one
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+def test_a_half_written_file_is_not_ready(tmp_path, fcs_bytes):
+    path = str(tmp_path / "growing.fcs")
+    write_part(path, fcs_bytes, len(fcs_bytes) // 2)
+    assert declared_size(path) == len(fcs_bytes)
+
+    files = _SettleTracker(SETTLE)
+    files.scan([path])
+    assert files.check(0.0) == []  # first seen
+    assert files.check(1.0) == []  # not settled yet
+    # Settled, but shorter than its HEADER and TEXT say: the writer stalled
+    assert files.check(10.0) == []
+    assert path in files.pending
+
+    append_rest(path, fcs_bytes)
+    assert files.check(11.0) == []  # changed: settles again from here
+    assert files.check(11.0 + SETTLE - 0.1) == []
+    assert files.check(11.0 + SETTLE) == [path]
+    assert not files.pending
+
+
+def test_known_files_are_only_reported_when_they_change(tmp_path, fcs_bytes):
+    path = str(tmp_path / "old.fcs")
+    write_part(path, fcs_bytes, len(fcs_bytes))
+    files = _SettleTracker(SETTLE)
+    files.mark_known(path)
+    files.scan([path])
+    assert not files.pending
+
+    files.add(path)  # an event for an unchanged file
+    assert files.check(0.0) == [] and files.check(SETTLE) == []
+    assert not files.pending
+
+    append_rest(path, fcs_bytes + b"\0" * 16)
+    files.scan([path])
+    files.check(20.0)
+    assert files.check(20.0 + SETTLE) == [path]
+
+
+def test_a_removed_candidate_is_dropped(tmp_path, fcs_bytes):
+    path = str(tmp_path / "gone.fcs")
+    write_part(path, fcs_bytes, 100)
+    files = _SettleTracker(SETTLE)
+    files.add(path)
+    os.remove(path)
+    assert files.check(0.0) == [] and not files.pending
+
+
+def test_polling_never_reports_a_partial_file(tmp_path, fcs_bytes, qapp, monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(watcher, "time", SimpleNamespace(monotonic=lambda: clock[0]))
+    folder_watcher = FolderWatcher(str(tmp_path / "*.fcs"), settle_time=SETTLE)
+
+    def no_inotify():
+        raise OSError("disabled in this test")
+
+    monkeypatch.setattr(folder_watcher, "_start_inotify", no_inotify)
+    reported = []
+    folder_watcher.files_ready.connect(reported.extend)
+    folder_watcher.start()  # complete.fcs from the fixture is already there
+    try:
+        assert not folder_watcher.uses_inotify
+        path = str(tmp_path / "new.fcs")
+        # Starting with less than the HEADER, which gives no size to wait for
+        for length in [30] + list(range(1000, len(fcs_bytes), len(fcs_bytes) // 5)):
+            write_part(path, fcs_bytes, length)
+            for _ in range(3):  # each part stays long enough to settle
+                folder_watcher._check()
+                clock[0] += SETTLE
+            assert reported == []
+        append_rest(path, fcs_bytes)
+        for _ in range(3):
+            folder_watcher._check()
+            clock[0] += SETTLE
+        assert reported == [path]
+    finally:
+        folder_watcher.stop()